@@ -0,0 +1,99 @@
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+class BlobStore:
+    """Content-addressed files on disk, reference counted in a Mongo collection.
+
+    Each blob is stored once as ``<sha256>.<ext>`` in ``directory``; the
+    ``blobs`` document keeps the reference count so identical uploads share
+    the same bytes.
+    """
+
+    def __init__(self, collection, directory: Path, kind: str):
+        self.collection = collection
+        self.directory = Path(directory)
+        self.kind = kind
+
+    def _blob_id(self, sha256: str) -> str:
+        return f"{self.kind}:{sha256}"
+
+    async def acquire_existing(self, sha256: str) -> Optional[dict]:
+        """Take a reference on an existing blob, or return None if it is unknown"""
+        blob = await self.collection.find_one_and_update(
+            {"_id": self._blob_id(sha256), "refcount": {"$gt": 0}},
+            {"$inc": {"refcount": 1}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if blob is None:
+            return None
+        if not (self.directory / blob["saved_name"]).exists():
+            # Bytes went missing underneath us; give the reference back and let
+            # the caller rebuild them (adopt puts them back under the same name)
+            await self.collection.update_one({"_id": blob["_id"]}, {"$inc": {"refcount": -1}})
+            return None
+        return blob
+
+    async def adopt(self, tmp_path: Path, sha256: str, extension: str, content_type: str) -> dict:
+        """Move a freshly written file into the store and take a reference on it.
+
+        Identical bytes uploaded under another extension keep the name they
+        were first stored with, so they still share one file.
+        """
+        existing = await self.collection.find_one({"_id": self._blob_id(sha256)}, {"saved_name": 1})
+        saved_name = existing["saved_name"] if existing else f"{sha256}.{extension}"
+        final_path = self.directory / saved_name
+        if final_path.exists():
+            os.unlink(tmp_path)
+        else:
+            os.replace(tmp_path, final_path)
+
+        update = {
+            "$inc": {"refcount": 1},
+            "$setOnInsert": {
+                "kind": self.kind,
+                "sha256": sha256,
+                "saved_name": saved_name,
+                "file_path": str(final_path),
+                "file_size": final_path.stat().st_size,
+                "content_type": content_type,
+                "created_at": datetime.utcnow(),
+            },
+        }
+        try:
+            blob = await self.collection.find_one_and_update(
+                {"_id": self._blob_id(sha256)}, update, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Lost an upsert race with an identical upload; the document exists now
+            blob = await self.collection.find_one_and_update(
+                {"_id": self._blob_id(sha256)}, update, return_document=ReturnDocument.AFTER
+            )
+        if blob["saved_name"] != saved_name:
+            # The race was won under another extension; its file is the one kept
+            final_path.unlink(missing_ok=True)
+        return blob
+
+    async def release(self, sha256: str) -> bool:
+        """Drop a reference, deleting the bytes once nothing points at them.
+        Returns True if they were deleted"""
+        blob = await self.collection.find_one_and_update(
+            {"_id": self._blob_id(sha256), "refcount": {"$gt": 0}},
+            {"$inc": {"refcount": -1}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if blob is None or blob["refcount"] > 0:
+            return False
+        result = await self.collection.delete_one({"_id": blob["_id"], "refcount": {"$lte": 0}})
+        if not result.deleted_count:
+            return False
+        # An identical upload may have re-created the blob since; its file is the same one
+        if await self.collection.find_one({"_id": blob["_id"]}, {"_id": 1}) is not None:
+            return False
+        (self.directory / blob["saved_name"]).unlink(missing_ok=True)
+        return True
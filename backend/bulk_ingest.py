@@ -0,0 +1,187 @@
+import asyncio
+import logging
+from typing import AsyncIterator, Callable, List, Optional, Tuple, Type
+
+import orjson
+from fastapi import HTTPException, Request
+from pydantic import BaseModel, ValidationError
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+# A parsed record, or the reason it could not be parsed
+Record = Tuple[int, Optional[object], Optional[str]]
+
+
+class BulkIngestSummary:
+    """Per-record outcome of one bulk request, in input order"""
+
+    def __init__(self):
+        self.results: List[dict] = []
+        self.counts = {"inserted": 0, "duplicate": 0, "invalid": 0, "failed": 0}
+        self.truncated = False
+
+    def record(self, index: int, status: str, id: Optional[str] = None, errors=None):
+        result = {"index": index, "status": status}
+        if id is not None:
+            result["id"] = id
+        if errors:
+            result["errors"] = errors
+        self.results.append(result)
+        self.counts[status] += 1
+
+    def as_dict(self) -> dict:
+        self.results.sort(key=lambda result: result["index"])
+        return {
+            "received": len(self.results),
+            **self.counts,
+            "truncated": self.truncated,
+            "results": self.results,
+        }
+
+
+async def read_records(request: Request, max_records: int, max_bytes: int,
+                       summary: BulkIngestSummary) -> AsyncIterator[Record]:
+    """Yield (index, record, parse_error) from a JSON array or NDJSON body.
+
+    NDJSON is parsed line by line as it streams in, so a large import never
+    sits in memory whole; a JSON array has to be read completely first. Input
+    past ``max_records`` or ``max_bytes`` is not read and the summary is
+    marked truncated, so the client can resume from ``received``.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in NDJSON_MEDIA_TYPES:
+        index = 0
+        received = 0
+        pending = b""
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_bytes:
+                summary.truncated = True
+                # Anything after the last complete line is cut off mid-record
+                pending = b""
+                break
+            pending += chunk
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                if not line.strip():
+                    continue
+                if index >= max_records:
+                    summary.truncated = True
+                    return
+                yield _parse_line(index, line)
+                index += 1
+        if pending.strip():
+            if index >= max_records:
+                summary.truncated = True
+                return
+            yield _parse_line(index, pending)
+        return
+
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Request body exceeds {max_bytes} bytes; "
+                                                        f"send NDJSON to import in a stream")
+    try:
+        records = orjson.loads(body)
+    except orjson.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+    if not isinstance(records, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of records")
+    if len(records) > max_records:
+        summary.truncated = True
+        del records[max_records:]
+    for index, record in enumerate(records):
+        yield index, record, None
+
+
+def _parse_line(index: int, line: bytes) -> Record:
+    try:
+        return index, orjson.loads(line), None
+    except orjson.JSONDecodeError as e:
+        return index, None, f"Invalid JSON: {e}"
+
+
+def validate_chunk(model: Type[BaseModel], chunk: List[Record], summary: BulkIngestSummary):
+    """Validate records, recording the invalid ones. Returns [(index, document)]"""
+    valid = []
+    for index, record, parse_error in chunk:
+        if parse_error is not None:
+            summary.record(index, "invalid", errors=[{"loc": [], "msg": parse_error, "type": "json_invalid"}])
+            continue
+        try:
+            item = model.model_validate(record)
+        except ValidationError as e:
+            errors = [{"loc": list(err["loc"]), "msg": err["msg"], "type": err["type"]} for err in e.errors()]
+            summary.record(index, "invalid", id=record.get("id") if isinstance(record, dict) else None,
+                           errors=errors)
+            continue
+        valid.append((index, item.model_dump()))
+    return valid
+
+
+async def insert_chunk(collection, valid: List[Tuple[int, dict]], summary: BulkIngestSummary,
+                       on_insert: Optional[Callable[[dict], None]] = None):
+    """Unordered insert_many of validated documents, recording each outcome"""
+    if not valid:
+        return
+    documents = [document for _, document in valid]
+    failed = {}
+    try:
+        await collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        for err in e.details.get("writeErrors", []):
+            failed[err["index"]] = err
+    except PyMongoError as e:
+        logger.warning("Bulk insert of %d documents into %s failed", len(documents), collection.name,
+                       exc_info=True)
+        for index, document in valid:
+            summary.record(index, "failed", id=document.get("id"), errors=[{"msg": str(e)}])
+        return
+
+    for position, (index, document) in enumerate(valid):
+        err = failed.get(position)
+        if err is None:
+            summary.record(index, "inserted", id=document.get("id"))
+            if on_insert is not None:
+                on_insert(document)
+        elif err.get("code") == DUPLICATE_KEY:
+            summary.record(index, "duplicate", id=document.get("id"))
+        else:
+            summary.record(index, "failed", id=document.get("id"), errors=[{"msg": err.get("errmsg")}])
+
+
+async def ingest(records: AsyncIterator[Record], model: Type[BaseModel], collection,
+                 summary: BulkIngestSummary, chunk_size: int = 500,
+                 on_insert: Optional[Callable[[dict], None]] = None) -> BulkIngestSummary:
+    """Validate records in chunks and insert them, overlapping each chunk's
+    validation with the previous chunk's insert_many. ``on_insert`` is called
+    with each document that was written.
+    """
+    writing: Optional[asyncio.Task] = None
+    chunk: List[Record] = []
+
+    async def submit(chunk):
+        nonlocal writing
+        valid = validate_chunk(model, chunk, summary)
+        if writing is not None:
+            await writing
+        writing = asyncio.create_task(insert_chunk(collection, valid, summary, on_insert))
+
+    try:
+        async for record in records:
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                await submit(chunk)
+                chunk = []
+        if chunk:
+            await submit(chunk)
+    finally:
+        if writing is not None:
+            await writing
+    return summary
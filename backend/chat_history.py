@@ -0,0 +1,94 @@
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pymongo import DESCENDING
+
+from pagination import mongo_datetime
+
+
+class ChatHistoryCache:
+    """Ring buffer of the most recent chat messages, newest last.
+
+    Every message gets a sequence number as it is added, so "everything
+    after message X" is a slice rather than a scan. Lookups return None when
+    the buffer cannot answer authoritatively and the caller should fall back
+    to Mongo.
+
+    All rooms share the buffer, and lookups take the room to read. Because
+    the buffer always holds the newest messages without gaps, a room's
+    messages found in it are exactly that room's newest ones.
+    """
+
+    def __init__(self, capacity: int = 1000, default_room: str = "general"):
+        self.capacity = capacity
+        self.default_room = default_room
+        self._messages: deque = deque(maxlen=capacity)
+        self._seq_by_id: Dict[str, int] = {}
+        self._next_seq = 0
+        # True while the buffer holds the whole collection (nothing evicted yet)
+        self.complete = False
+
+    def __len__(self):
+        return len(self._messages)
+
+    async def load(self, collection, projection: Optional[dict] = None):
+        newest = await collection.find({}, projection).sort(
+            [("timestamp", DESCENDING), ("id", DESCENDING)]
+        ).limit(self.capacity).to_list(self.capacity)
+        self._messages.clear()
+        self._seq_by_id.clear()
+        for message in reversed(newest):
+            self.add(message)
+        self.complete = len(newest) < self.capacity
+
+    def add(self, message: dict):
+        if message["id"] in self._seq_by_id:
+            return
+        # Compared against, and paged on into, the timestamps stored in Mongo
+        message["timestamp"] = mongo_datetime(message["timestamp"])
+        if len(self._messages) == self.capacity:
+            evicted = self._messages.popleft()
+            self._seq_by_id.pop(evicted["id"], None)
+            self.complete = False
+        self._seq_by_id[message["id"]] = self._next_seq
+        self._next_seq += 1
+        self._messages.append(message)
+
+    def room_of(self, message: dict) -> str:
+        # Messages from before rooms existed belong to the default room
+        return message.get("room") or self.default_room
+
+    def latest(self, limit: int, room: str) -> Optional[List[dict]]:
+        found = []
+        if limit:
+            for message in reversed(self._messages):
+                if self.room_of(message) == room:
+                    found.append(message)
+                    if len(found) == limit:
+                        break
+        if len(found) < limit and not self.complete:
+            return None
+        found.reverse()
+        return found
+
+    def after_id(self, message_id: str, limit: int, room: str) -> Optional[List[dict]]:
+        seq = self._seq_by_id.get(message_id)
+        if seq is None:
+            return None
+        start = seq - self._seq_by_id[self._messages[0]["id"]] + 1
+        found = []
+        for i in range(start, len(self._messages)):
+            if len(found) == limit:
+                break
+            if self.room_of(self._messages[i]) == room:
+                found.append(self._messages[i])
+        return found
+
+    def since(self, timestamp: datetime, limit: int, room: str) -> Optional[List[dict]]:
+        if not self._messages:
+            return [] if self.complete else None
+        if timestamp < self._messages[0]["timestamp"] and not self.complete:
+            return None
+        missed = [m for m in self._messages if m["timestamp"] > timestamp and self.room_of(m) == room]
+        return missed[:limit]
@@ -0,0 +1,108 @@
+import json
+import struct
+from typing import List, Optional, Tuple
+
+from fastapi import WebSocket
+from starlette.websockets import WebSocketDisconnect
+
+try:
+    import msgpack
+except ImportError:  # msgpack-batch is simply not offered
+    msgpack = None
+
+
+class OutboundMessage:
+    """One chat frame on its way to many sockets.
+
+    The same instance is queued for every recipient, so the MessagePack
+    form is encoded once per message, not once per socket.
+    """
+
+    __slots__ = ("text", "_packed")
+
+    def __init__(self, text: str):
+        self.text = text
+        self._packed: Optional[bytes] = None
+
+    @property
+    def packed(self) -> bytes:
+        if self._packed is None:
+            self._packed = msgpack.packb(json.loads(self.text))
+        return self._packed
+
+
+class ChatProtocol:
+    """Wire format for frames sent to a chat socket.
+
+    ``batched`` protocols send everything queued within the flush window as
+    one frame holding an array of messages.
+    """
+
+    name = "json"
+    batched = False
+    binary = False
+
+    def encode(self, batch: List[OutboundMessage]):
+        return batch[0].text
+
+
+class JsonBatchProtocol(ChatProtocol):
+    """Text frames holding a JSON array; the messages are already JSON, so they are just joined"""
+
+    name = "json-batch"
+    batched = True
+
+    def encode(self, batch):
+        return "[" + ",".join(message.text for message in batch) + "]"
+
+
+class MsgpackBatchProtocol(ChatProtocol):
+    """Binary frames holding a MessagePack array of messages"""
+
+    name = "msgpack-batch"
+    batched = True
+    binary = True
+
+    def encode(self, batch):
+        # An array is its length header followed by its packed elements
+        count = len(batch)
+        if count < 16:
+            header = bytes((0x90 | count,))
+        elif count < 0x10000:
+            header = b"\xdc" + struct.pack(">H", count)
+        else:
+            header = b"\xdd" + struct.pack(">I", count)
+        return header + b"".join(message.packed for message in batch)
+
+
+PROTOCOLS = {protocol.name: protocol for protocol in (ChatProtocol(), JsonBatchProtocol())}
+if msgpack is not None:
+    PROTOCOLS["msgpack-batch"] = MsgpackBatchProtocol()
+# Sec-WebSocket-Protocol values, e.g. "chat.msgpack-batch"
+SUBPROTOCOL_PREFIX = "chat."
+
+
+def negotiate(websocket: WebSocket) -> Tuple[ChatProtocol, Optional[str]]:
+    """Pick the socket's protocol and the subprotocol to accept it with.
+
+    Browsers can offer ``chat.<name>`` subprotocols (the first supported one
+    wins); clients that cannot may pass ``?protocol=<name>`` instead.
+    Anything else gets plain JSON, one message per frame.
+    """
+    for offered in websocket.scope.get("subprotocols", []):
+        if offered.startswith(SUBPROTOCOL_PREFIX) and offered[len(SUBPROTOCOL_PREFIX):] in PROTOCOLS:
+            return PROTOCOLS[offered[len(SUBPROTOCOL_PREFIX):]], offered
+    requested = websocket.query_params.get("protocol")
+    return PROTOCOLS.get(requested, PROTOCOLS["json"]), None
+
+
+async def receive_frame(websocket: WebSocket) -> dict:
+    """Next inbound message: JSON in a text frame or MessagePack in a binary one"""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    if message.get("bytes") is not None:
+        if msgpack is None:
+            raise ValueError("Binary frames need the 'msgpack' package")
+        return msgpack.unpackb(message["bytes"])
+    return json.loads(message["text"])
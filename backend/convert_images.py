@@ -1,51 +1,163 @@
 #!/usr/bin/env python3
+"""Batch-convert a directory tree of images into resized JPEG/WebP/AVIF variants.
+
+Sources are converted in parallel across all cores. A manifest records each
+source's size, mtime and SHA-256 along with the settings used, so re-running
+after a deploy only touches new or changed images:
+
+    python convert_images.py images --widths 640 1280 0 --formats jpeg webp
+
+A width of 0 keeps the original size. Outputs go to ``<source>/converted``
+unless --output is given, named ``<name>-<width>w.<ext>`` (``<name>.<ext>``
+for original size) after the full source file name, so ``a.jpg`` and
+``a.png`` never share an output, mirroring the source tree.
+"""
+import argparse
+import json
 import os
-from PIL import Image
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
-def convert_to_jpeg(input_path, output_path, quality=90):
-    """Convert image to JPEG format"""
+from image_pipeline import FORMAT_EXTENSIONS, file_sha256, render_variants, supported_formats
+
+SOURCE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp", ".tif", ".tiff"}
+MANIFEST_NAME = ".manifest.json"
+
+
+def output_name(source_name, width, fmt):
+    suffix = f"-{width}w" if width else ""
+    return f"{source_name}{suffix}.{FORMAT_EXTENSIONS[fmt]}"
+
+
+def convert_source(source, output_dir, variants, previous):
+    """Convert one source in a worker process.
+
+    ``variants`` is a list of (width, quality, fmt); ``previous`` is the
+    manifest entry from the last run, if any. Returns the new manifest entry.
+    """
+    source = Path(source)
+    stat = source.stat()
+    outputs = [str(Path(output_dir) / output_name(source.name, w, fmt)) for w, q, fmt in variants]
+
+    # Touched but identical (e.g. a fresh checkout): skip the encode, refresh the mtime
+    sha256 = file_sha256(source)
+    if previous and previous.get("sha256") == sha256 and all(os.path.exists(o) for o in outputs):
+        return dict(previous, mtime_ns=stat.st_mtime_ns, size=stat.st_size), "unchanged"
+
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    render_variants(source, [(out, w, q, fmt) for out, (w, q, fmt) in zip(outputs, variants)])
+    entry = {
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "sha256": sha256,
+        "outputs": outputs,
+    }
+    return entry, "converted"
+
+
+def find_sources(source_dir, output_dir):
+    for root, dirs, files in os.walk(source_dir):
+        # Never feed our own outputs back in
+        dirs[:] = [d for d in dirs if (Path(root) / d).resolve() != output_dir]
+        for name in files:
+            path = Path(root) / name
+            if path.suffix.lower() in SOURCE_EXTENSIONS:
+                yield path
+
+
+def load_manifest(path, settings):
     try:
-        with Image.open(input_path) as img:
-            # Convert RGBA or P mode to RGB
-            if img.mode in ("RGBA", "P"):
-                img = img.convert("RGB")
-            
-            # Save as JPEG
-            img.save(output_path, "JPEG", quality=quality, optimize=True)
-            print(f"Converted {input_path} to {output_path}")
-            return True
-    except Exception as e:
-        print(f"Error converting {input_path}: {e}")
-        return False
+        with open(path) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    # Different widths/formats/quality invalidate everything
+    if manifest.get("settings") != settings:
+        return {}
+    return manifest.get("sources", {})
+
+
+def save_manifest(path, settings, sources):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"settings": settings, "sources": sources}, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
 
 def main():
-    images_dir = Path("/app/backend/images")
-    
-    # List of image files to convert
-    image_files = [
-        "modern-building.jpg",
-        "code-laptop.jpg", 
-        "team-collaboration.jpg",
-        "glowing-laptop.jpg",
-        "chat-bubble.jpg"
-    ]
-    
-    for image_file in image_files:
-        input_path = images_dir / image_file
-        if input_path.exists():
-            # Create output filename with .jpeg extension
-            output_name = input_path.stem + ".jpeg"
-            output_path = images_dir / output_name
-            
-            convert_to_jpeg(input_path, output_path)
-            
-            # Remove original if conversion successful and it's not already .jpeg
-            if output_path.exists() and input_path.suffix != ".jpeg":
-                os.remove(input_path)
-                print(f"Removed original {input_path}")
-        else:
-            print(f"File not found: {input_path}")
+    parser = argparse.ArgumentParser(description="Batch-convert images into resized variants")
+    parser.add_argument("source", nargs="?", default=str(Path(__file__).parent / "images"),
+                        help="directory to walk (default: backend/images)")
+    parser.add_argument("--output", help="where to write variants (default: <source>/converted)")
+    parser.add_argument("--widths", type=int, nargs="+", default=[640, 1280, 1920, 0],
+                        help="target widths in pixels, 0 for original size")
+    parser.add_argument("--formats", nargs="+", default=["jpeg", "webp"],
+                        help="output formats: jpeg, webp, avif")
+    parser.add_argument("--quality", type=int, default=85)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--force", action="store_true", help="ignore the manifest and rebuild everything")
+    parser.add_argument("--prune", action="store_true", help="delete variants of sources that no longer exist")
+    args = parser.parse_args()
+
+    source_dir = Path(args.source).resolve()
+    output_dir = Path(args.output).resolve() if args.output else source_dir / "converted"
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = output_dir / MANIFEST_NAME
+
+    formats = [f.upper().replace("JPG", "JPEG") for f in args.formats]
+    unsupported = [f for f in formats if f not in supported_formats()]
+    if unsupported:
+        parser.error(f"this Pillow build cannot write: {', '.join(unsupported)}")
+    variants = [(width or None, args.quality, fmt) for width in args.widths for fmt in formats]
+    settings = {"widths": sorted(set(args.widths)), "formats": sorted(set(formats)), "quality": args.quality}
+
+    previous = {} if args.force else load_manifest(manifest_path, settings)
+    sources = {}
+    counts = {"converted": 0, "unchanged": 0, "skipped": 0, "failed": 0}
+    started = time.perf_counter()
+
+    jobs = {}
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for path in find_sources(source_dir, output_dir):
+            relative = str(path.relative_to(source_dir))
+            entry = previous.get(relative)
+            stat = path.stat()
+            if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size \
+                    and all(os.path.exists(o) for o in entry["outputs"]):
+                sources[relative] = entry
+                counts["skipped"] += 1
+                continue
+            target_dir = output_dir / Path(relative).parent
+            future = executor.submit(convert_source, str(path), str(target_dir), variants, entry)
+            jobs[future] = relative
+
+        for future in as_completed(jobs):
+            relative = jobs[future]
+            try:
+                entry, outcome = future.result()
+            except Exception as e:
+                print(f"Error converting {relative}: {e}")
+                counts["failed"] += 1
+                continue
+            sources[relative] = entry
+            counts[outcome] += 1
+            if outcome == "converted":
+                print(f"Converted {relative} -> {len(entry['outputs'])} variants")
+
+    if args.prune:
+        for relative, entry in previous.items():
+            if relative not in sources and not (source_dir / relative).exists():
+                for output in entry["outputs"]:
+                    Path(output).unlink(missing_ok=True)
+                print(f"Pruned variants of {relative}")
+
+    save_manifest(manifest_path, settings, sources)
+    elapsed = time.perf_counter() - started
+    print(f"{counts['converted']} converted, {counts['unchanged'] + counts['skipped']} up to date, "
+          f"{counts['failed']} failed in {elapsed:.2f}s")
+    return 1 if counts["failed"] else 0
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    raise SystemExit(main())
@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from typing import List
+from xml.etree import ElementTree
+
+from pymongo.errors import PyMongoError
+
+from job_queue import RetryLater
+from job_search import tokenize
+from worker_pool import PoolRestarted, PoolSaturated
+
+logger = logging.getLogger(__name__)
+
+# Bump when extraction changes, including a newly supported file type, so
+# every CV (unsupported ones too) is processed again
+EXTRACTOR_VERSION = 1
+# Entries that need no more work; "unsupported" (e.g. .doc) stays settled
+# until the version changes
+CURRENT = {"version": EXTRACTOR_VERSION}
+MAX_TEXT_CHARS = 500_000
+MAX_PDF_PAGES = 50
+MAX_DOCX_XML_BYTES = 20 * 1024 * 1024
+
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+DOCX_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+class UnsupportedDocument(Exception):
+    """The file type cannot be turned into text here"""
+
+
+class UnreadableDocument(Exception):
+    """The file is corrupt or malformed; extracting it again cannot help"""
+
+
+# Parser errors that mean the document itself is bad. Anything else (a
+# missing file, a dead worker, a full disk) is retried.
+PARSE_ERRORS = (zipfile.BadZipFile, ElementTree.ParseError)
+
+
+def _extract_txt(path: str) -> str:
+    with open(path, "rb") as f:
+        data = f.read(MAX_TEXT_CHARS * 4)
+    return data.decode("utf-8-sig", errors="replace")
+
+
+def _extract_docx(path: str) -> str:
+    with zipfile.ZipFile(path) as archive:
+        try:
+            info = archive.getinfo("word/document.xml")
+        except KeyError:
+            raise UnsupportedDocument("DOCX has no word/document.xml")
+        if info.file_size > MAX_DOCX_XML_BYTES:
+            raise UnsupportedDocument(f"DOCX body is {info.file_size} bytes uncompressed")
+        paragraphs, current, size = [], [], 0
+        with archive.open(info) as xml:
+            for _, element in ElementTree.iterparse(xml):
+                tag = element.tag
+                if tag == f"{WORD_NAMESPACE}t" and element.text:
+                    current.append(element.text)
+                    size += len(element.text)
+                elif tag == f"{WORD_NAMESPACE}tab":
+                    current.append("\t")
+                elif tag in (f"{WORD_NAMESPACE}br", f"{WORD_NAMESPACE}cr"):
+                    current.append("\n")
+                elif tag == f"{WORD_NAMESPACE}p":
+                    paragraphs.append("".join(current))
+                    current = []
+                    # Paragraph subtrees are done with; keep memory flat on long documents
+                    element.clear()
+                if size > MAX_TEXT_CHARS:
+                    break
+        if current:
+            paragraphs.append("".join(current))
+    return "\n".join(paragraphs)
+
+
+def _extract_pdf(path: str) -> str:
+    try:
+        from pypdf import PdfReader
+        from pypdf.errors import PyPdfError
+    except ImportError:
+        raise UnsupportedDocument("PDF extraction requires the 'pypdf' package")
+    pages, size = [], 0
+    try:
+        reader = PdfReader(path)
+        for page in reader.pages[:MAX_PDF_PAGES]:
+            text = page.extract_text() or ""
+            pages.append(text)
+            size += len(text)
+            if size > MAX_TEXT_CHARS:
+                break
+    except PyPdfError as e:
+        raise UnreadableDocument(f"{type(e).__name__}: {e}") from None
+    return "\n".join(pages)
+
+
+def extract_text(path: str, content_type: str) -> str:
+    """Plain text of a CV. Runs in a worker process"""
+    suffix = Path(path).suffix.lower()
+    if content_type == "text/plain" or suffix == ".txt":
+        text = _extract_txt(path)
+    elif content_type == DOCX_TYPE or suffix == ".docx":
+        try:
+            text = _extract_docx(path)
+        except PARSE_ERRORS as e:
+            raise UnreadableDocument(f"{type(e).__name__}: {e}") from None
+    elif content_type == "application/pdf" or suffix == ".pdf":
+        text = _extract_pdf(path)
+    else:
+        raise UnsupportedDocument(f"No text extractor for {content_type or suffix}")
+    return text[:MAX_TEXT_CHARS]
+
+
+def index_tokens(text: str) -> List[str]:
+    """Distinct tokens for the multikey ``tokens`` index"""
+    return sorted(set(tokenize(text)))
+
+
+class CvTextIndexer:
+    """Extracts text from uploaded CVs through the background job queue.
+
+    Results live in ``cv_texts``, keyed by the file's SHA-256 and so linked
+    to every ``uploaded_files`` record with that hash; a CV uploaded twice is
+    only read once. At startup every upload on this node without current
+    text is queued, in the background, which picks up uploads from before the indexer
+    existed and re-runs everything after an ``EXTRACTOR_VERSION`` bump.
+    """
+
+    job_type = "cv.extract_text"
+
+    def __init__(self, files, texts, pool, jobs):
+        self.files = files
+        self.texts = texts
+        self.pool = pool
+        self.jobs = jobs
+        self.processed = 0
+        self._scan: asyncio.Task = None
+        jobs.handler(self.job_type)(self.process)
+
+    async def start(self):
+        try:
+            await self.texts.create_index("tokens")
+            await self.files.create_index("sha256")
+        except Exception:
+            logger.exception("Could not create CV text indexes")
+        # One enqueue per upload; never hold up startup for it
+        if self._scan is None or self._scan.done():
+            self._scan = asyncio.create_task(self.scan())
+
+    async def stop(self):
+        if self._scan is not None:
+            self._scan.cancel()
+            await asyncio.gather(self._scan, return_exceptions=True)
+            self._scan = None
+
+    async def submit(self, uploaded_file: dict) -> dict:
+        """Queue extraction for an upload; returns the job"""
+        payload = {key: uploaded_file[key] for key in ("id", "sha256", "file_path", "file_type")}
+        # One active job per content hash, however many times it is uploaded;
+        # file_path is on this node's disk, so this node runs it
+        return await self.jobs.enqueue(
+            self.job_type, payload, dedupe_key=f"{self.job_type}:{uploaded_file['sha256']}:{EXTRACTOR_VERSION}",
+            local=True,
+        )
+
+    async def scan(self):
+        """Queue uploads whose content has no text at the current version"""
+        try:
+            current = set(await self.texts.distinct("_id", CURRENT))
+            queued = 0
+            async for uploaded_file in self.files.find(
+                {"sha256": {"$ne": None}}, {"_id": 0, "id": 1, "sha256": 1, "file_path": 1, "file_type": 1}
+            ):
+                # Another node holds the file (or it is gone); that node queues it
+                if uploaded_file["sha256"] in current or not Path(uploaded_file["file_path"]).exists():
+                    continue
+                await self.submit(uploaded_file)
+                current.add(uploaded_file["sha256"])
+                queued += 1
+            if queued:
+                logger.info("Queued %d CVs for text extraction", queued)
+        except PyMongoError:
+            logger.exception("Could not scan for CVs awaiting text extraction")
+
+    async def process(self, uploaded_file: dict) -> dict:
+        sha256 = uploaded_file["sha256"]
+        # Same bytes already extracted, e.g. the same CV uploaded again
+        existing = await self.texts.find_one({"_id": sha256, **CURRENT}, {"_id": 0, "status": 1})
+        if existing is not None:
+            return {"sha256": sha256, "status": existing["status"]}
+
+        try:
+            text = await self.pool.run(extract_text, uploaded_file["file_path"], uploaded_file["file_type"])
+            entry = {"status": "done", "text": text, "tokens": index_tokens(text), "error": None}
+        except PoolRestarted:
+            # The document itself may have killed the worker, so this uses up an attempt
+            raise
+        except PoolSaturated as e:
+            raise RetryLater(e.retry_after)
+        except UnsupportedDocument as e:
+            entry = {"status": "unsupported", "text": "", "tokens": [], "error": str(e)}
+        except UnreadableDocument as e:
+            # Corrupt file; record it so it is not retried forever
+            entry = {"status": "failed", "text": "", "tokens": [], "error": str(e)}
+
+        entry.update({"sha256": sha256, "version": EXTRACTOR_VERSION, "extracted_at": datetime.utcnow()})
+        await self.texts.update_one({"_id": sha256}, {"$set": entry}, upsert=True)
+        self.processed += 1
+        return {"sha256": sha256, "status": entry["status"]}
+
+    def stats(self):
+        return {"processed": self.processed}
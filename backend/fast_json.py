@@ -0,0 +1,59 @@
+from typing import Dict, Iterable, Optional, Type
+
+import orjson
+from fastapi import Response
+from pydantic import BaseModel
+from pydantic_core import PydanticUndefined
+
+
+def projection_for(model: Type[BaseModel]) -> Dict[str, int]:
+    """Mongo projection returning just the model's fields, without _id"""
+    projection = {name: 1 for name in model.model_fields}
+    projection["_id"] = 0
+    return projection
+
+
+def defaults_for(model: Type[BaseModel]) -> Dict[str, object]:
+    """Plain (non-factory) field defaults, to fill in on documents written before a field existed"""
+    return {
+        name: field.default
+        for name, field in model.model_fields.items()
+        if field.default is not PydanticUndefined and field.default_factory is None
+    }
+
+
+class ReadModel:
+    """Projection and defaults for serving a model's documents without validating them"""
+
+    def __init__(self, model: Type[BaseModel]):
+        self.model = model
+        self.projection = projection_for(model)
+        self.defaults = defaults_for(model)
+
+    def fill(self, document: dict) -> dict:
+        for name, default in self.defaults.items():
+            if name not in document:
+                document[name] = default
+        return document
+
+
+class ORJSONRowsResponse(Response):
+    """JSON response for documents that came straight from Mongo.
+
+    Documents are projected to the response model's fields already, so they
+    are dumped with orjson as-is instead of being rebuilt as models and
+    validated again against ``response_model``.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
+
+def rows_response(rows: Iterable[dict], read_model: ReadModel, headers: Optional[dict] = None) -> Response:
+    return ORJSONRowsResponse([read_model.fill(row) for row in rows], headers=headers)
+
+
+def row_response(row: dict, read_model: ReadModel) -> Response:
+    return ORJSONRowsResponse(read_model.fill(row))
@@ -0,0 +1,321 @@
+import asyncio
+import hashlib
+import io
+import os
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageOps, features
+
+# Widths we are willing to render. Requests are snapped up to the nearest
+# bucket so a handful of derivatives cover every viewport.
+DERIVATIVE_WIDTHS = (320, 640, 960, 1280, 1920, 2560)
+
+FORMAT_EXTENSIONS = {"JPEG": "jpeg", "WEBP": "webp", "AVIF": "avif"}
+FORMAT_MEDIA_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "AVIF": "image/avif"}
+
+# EXIF orientations that swap width and height once applied
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+class ImageTooLarge(ValueError):
+    """The image header declares more pixels than the configured budget"""
+
+
+def file_sha256(path) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _touch(path) -> bool:
+    """Bump a file's mtime; False if it has gone. The mtime persists LRU order across restarts"""
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def supported_formats():
+    """Output formats the installed Pillow build can encode"""
+    Image.init()
+    formats = {"JPEG"}
+    if features.check_module("webp"):
+        formats.add("WEBP")
+    if "AVIF" in Image.SAVE:
+        formats.add("AVIF")
+    return formats
+
+
+def snap_width(width: int) -> int:
+    """Round a requested width up to the nearest derivative bucket"""
+    for bucket in DERIVATIVE_WIDTHS:
+        if width <= bucket:
+            return bucket
+    return DERIVATIVE_WIDTHS[-1]
+
+
+def check_dimensions(img, max_pixels: Optional[int]):
+    """Reject an opened (not yet decoded) image whose header is over ``max_pixels``.
+
+    Decoding needs about width x height x bands bytes, so this bounds the
+    memory a single image can take before any of it is spent.
+    """
+    if max_pixels and img.width * img.height > max_pixels:
+        raise ImageTooLarge(f"{img.width}x{img.height} image is over the {max_pixels} pixel limit")
+
+
+def _draft(img, width: Optional[int] = None, max_dimension: Optional[int] = None):
+    """Have the JPEG decoder scale down by up to 8x while decoding.
+
+    Only reduces as far as still covers the requested output (``width``, or
+    a ``max_dimension`` bounding box), so quality is unchanged and the final
+    resize has far fewer pixels to read. No-op for other formats.
+    """
+    if img.format != "JPEG":
+        return
+    # Work in displayed orientation, as the requested size is
+    swap = img.getexif().get(0x0112) in TRANSPOSED_ORIENTATIONS
+    shown_width, shown_height = (img.height, img.width) if swap else img.size
+    scale = 1.0
+    if width:
+        scale = min(scale, width / shown_width)
+    if max_dimension:
+        scale = min(scale, max_dimension / max(shown_width, shown_height))
+    if scale < 1.0:
+        img.draft(img.mode, (max(1, round(img.width * scale)), max(1, round(img.height * scale))))
+
+
+def _replace(old, new):
+    """Free ``old``'s pixel buffer as soon as ``new`` has been derived from it"""
+    if new is not old:
+        old.close()
+    return new
+
+
+def _resized(img, width: Optional[int]):
+    # Never upscale
+    if width and width < img.width:
+        height = max(1, round(img.height * width / img.width))
+        return img.resize((width, height), Image.LANCZOS)
+    return img
+
+
+def _save(img, output_path, quality: int, fmt: str):
+    # Convert modes the target encoder cannot store
+    if fmt == "JPEG" and img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    elif img.mode == "P":
+        img = img.convert("RGBA")
+
+    options = {"quality": quality}
+    if fmt == "JPEG":
+        options.update(optimize=True, progressive=True)
+    elif fmt == "WEBP":
+        options.update(method=4)
+    img.save(output_path, fmt, **options)
+
+
+def render_derivative(source_path, output_path, width: Optional[int], quality: int, fmt: str,
+                      max_pixels: Optional[int] = None):
+    """Resize and re-encode an image, convert_to_jpeg style"""
+    with Image.open(source_path) as img:
+        check_dimensions(img, max_pixels)
+        _draft(img, width)
+        img = _replace(img, ImageOps.exif_transpose(img))
+        _save(_resized(img, width), output_path, quality, fmt)
+        img.close()
+
+
+def render_variants(source_path, variants, max_pixels: Optional[int] = None):
+    """Decode an image once and write every (output_path, width, quality, fmt) variant of it"""
+    with Image.open(source_path) as img:
+        check_dimensions(img, max_pixels)
+        widths = [v[1] for v in variants]
+        # A full-size variant needs a full decode; otherwise only the largest width
+        if all(widths):
+            _draft(img, max(widths))
+        img = _replace(img, ImageOps.exif_transpose(img))
+        if img.mode == "P":
+            img = _replace(img, img.convert("RGBA"))
+        # Largest first, so each smaller size is resampled from the previous one
+        by_width = sorted(variants, key=lambda v: v[1] or img.width, reverse=True)
+        current = img
+        for output_path, width, quality, fmt in by_width:
+            if width and width < current.width:
+                current = _replace(current, _resized(current, width))
+            _save(current, output_path, quality, fmt)
+        current.close()
+
+
+def probe_image(content, max_pixels: Optional[int] = None) -> Tuple[str, Tuple[int, int]]:
+    """Format and size of uploaded bytes, or an image file at a path, from the header alone.
+
+    Raises UnidentifiedImageError for anything Pillow cannot open and
+    ImageTooLarge for anything over ``max_pixels``; nothing is decoded.
+    """
+    source = io.BytesIO(content) if isinstance(content, bytes) else content
+    with Image.open(source) as image:
+        check_dimensions(image, max_pixels)
+        return image.format, image.size
+
+
+def convert_upload_to_jpeg(content, output_path, quality: int = 90, max_pixels: Optional[int] = None,
+                           max_dimension: Optional[int] = None):
+    """Convert uploaded image bytes, or an image file at a path, to a JPEG file.
+
+    Images over ``max_pixels`` are rejected before decoding; ones larger
+    than ``max_dimension`` on their long edge are scaled down to fit, JPEGs
+    partly while decoding. Peak memory is therefore bounded by ``max_pixels``:
+    about 10 bytes per pixel across decode, colour conversion and resize
+    (roughly 260MB at 25 megapixels), and far less for JPEGs that draft
+    decoding shrinks first.
+    """
+    source = io.BytesIO(content) if isinstance(content, bytes) else content
+    with Image.open(source) as image:
+        check_dimensions(image, max_pixels)
+        if max_dimension:
+            _draft(image, max_dimension=max_dimension)
+        if image.mode in ("RGBA", "P"):
+            image = _replace(image, image.convert("RGB"))
+        if max_dimension and max(image.size) > max_dimension:
+            image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+        image.save(output_path, "JPEG", quality=quality, optimize=True)
+        image.close()
+
+
+class DerivativeCache:
+    """Content-addressed disk cache for image derivatives with LRU eviction"""
+
+    def __init__(self, directory: Path, max_bytes: int, max_digests: int = 4096):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_digests = max_digests
+        self.total_bytes = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._source_digests: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def load(self):
+        """Rebuild the LRU index from whatever is already on disk"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        files = []
+        for path in self.directory.iterdir():
+            if path.name.startswith(".tmp-"):
+                # Left behind by a render that was interrupted
+                path.unlink()
+            elif path.is_file():
+                files.append(path)
+        for path in sorted(files, key=lambda p: p.stat().st_mtime):
+            size = path.stat().st_size
+            self._entries[path.name] = size
+            self.total_bytes += size
+        self._unlink(self._evict())
+
+    async def source_digest(self, source_path: Path) -> str:
+        """SHA-256 of a source image, memoised on path, mtime and size.
+
+        Hashing runs in a thread; the memo keeps the ``max_digests`` most
+        recently used sources.
+        """
+        stat = source_path.stat()
+        memo_key = (str(source_path), stat.st_mtime_ns, stat.st_size)
+        digest = self._source_digests.get(memo_key)
+        if digest is None:
+            digest = await asyncio.to_thread(file_sha256, source_path)
+        self._source_digests[memo_key] = digest
+        self._source_digests.move_to_end(memo_key)
+        while len(self._source_digests) > self.max_digests:
+            self._source_digests.popitem(last=False)
+        return digest
+
+    def entry_name(self, source_digest: str, width: Optional[int], quality: int, fmt: str) -> str:
+        key = hashlib.sha256(f"{source_digest}:{width}:{quality}:{fmt}".encode()).hexdigest()
+        return f"{key}.{FORMAT_EXTENSIONS[fmt]}"
+
+    async def lookup(self, name: str) -> Optional[Path]:
+        if name not in self._entries:
+            return None
+        # Most recent straight away, so an eviction while we touch the file passes it over
+        self._entries.move_to_end(name)
+        path = self.directory / name
+        if not await asyncio.to_thread(_touch, path):
+            if name in self._entries:
+                self.total_bytes -= self._entries.pop(name)
+            return None
+        return path
+
+    async def store(self, name: str, path: Path):
+        size = (await asyncio.to_thread(path.stat)).st_size
+        if name in self._entries:
+            self.total_bytes -= self._entries.pop(name)
+        self._entries[name] = size
+        self.total_bytes += size
+        victims = self._evict()
+        if victims:
+            await asyncio.to_thread(self._unlink, victims)
+
+    def _evict(self) -> List[str]:
+        """Drop least recently used entries until under ``max_bytes``; returns their names"""
+        victims = []
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            victims.append(name)
+        return victims
+
+    def _unlink(self, names: List[str]):
+        for name in names:
+            try:
+                (self.directory / name).unlink()
+            except FileNotFoundError:
+                pass
+
+    async def get_or_render(self, source_path: Path, width: Optional[int], quality: int, fmt: str, render) -> Path:
+        """Return the cached derivative, building it once if it is missing.
+
+        ``render`` is an awaitable factory taking (source, output, width,
+        quality, fmt); concurrent requests for the same derivative share a
+        single render.
+        """
+        name = self.entry_name(await self.source_digest(source_path), width, quality, fmt)
+        path = await self.lookup(name)
+        if path is not None:
+            return path
+
+        pending = self._inflight.get(name)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[name] = future
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            fd, tmp_name = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+            os.close(fd)
+            try:
+                await render(str(source_path), tmp_name, width, quality, fmt)
+                path = self.directory / name
+                os.replace(tmp_name, path)
+            except BaseException:
+                if os.path.exists(tmp_name):
+                    os.unlink(tmp_name)
+                raise
+            await self.store(name, path)
+            future.set_result(path)
+            return path
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Mark retrieved so an unawaited failure is not logged twice
+            future.exception()
+            raise
+        finally:
+            del self._inflight[name]
@@ -0,0 +1,261 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class RetryLater(Exception):
+    """Raised by a handler to run the job again after ``delay`` seconds
+    without using up one of its attempts (e.g. a saturated worker pool)"""
+
+    def __init__(self, delay: float):
+        super().__init__(f"Retry in {delay}s")
+        self.delay = delay
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying cannot help (e.g. a corrupt file)"""
+
+
+class JobQueue:
+    """Durable background jobs stored in a Mongo collection.
+
+    Workers claim a job by leasing it for ``visibility_timeout`` seconds and
+    renew the lease while the handler runs. If a worker dies, its lease
+    expires and another worker picks the job up again. Failed jobs are retried
+    with exponential backoff until ``max_attempts``. Jobs with a
+    ``dedupe_key`` are only queued once while an earlier one is still active.
+
+    Jobs queued with ``local=True`` read files from this node's disk, so only
+    workers on the same node claim them. Once such a job has waited
+    ``pin_timeout`` seconds any node may claim it, so a job whose node is gone
+    fails instead of staying queued forever.
+    """
+
+    def __init__(self, collection, workers: int = 4, visibility_timeout: float = 60.0,
+                 max_attempts: int = 5, poll_interval: float = 1.0, retention: float = 7 * 24 * 3600,
+                 pin_timeout: float = 600.0, node: Optional[str] = None):
+        self.collection = collection
+        self.workers = workers
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.pin_timeout = pin_timeout
+        # Workers sharing a filesystem share a node name; the hostname by default
+        self.node = node or socket.gethostname()
+        self.handlers: Dict[str, Callable[[dict], Awaitable[Optional[dict]]]] = {}
+        self.worker_id = f"{self.node}:{os.getpid()}"
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def handler(self, job_type: str):
+        """Decorator registering the coroutine that runs jobs of ``job_type``"""
+        def register(fn):
+            self.handlers[job_type] = fn
+            return fn
+        return register
+
+    async def start(self):
+        if self._tasks:
+            return
+        try:
+            await self.collection.create_index([("status", ASCENDING), ("available_at", ASCENDING)])
+            await self.collection.create_index([("status", ASCENDING), ("locked_until", ASCENDING)])
+            # Only jobs that have a dedupe_key are indexed; keyless jobs never conflict
+            await self.collection.create_index(
+                "dedupe_key", unique=True,
+                partialFilterExpression={"active": True, "dedupe_key": {"$type": "string"}},
+            )
+            # Finished jobs expire on their own; unfinished ones have no finished_at
+            await self.collection.create_index("finished_at", expireAfterSeconds=int(self.retention))
+        except Exception:
+            logger.exception("Could not create indexes on %s", self.collection.name)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def enqueue(self, job_type: str, payload: dict, dedupe_key: Optional[str] = None,
+                      delay: float = 0.0, local: bool = False) -> dict:
+        """Queue a job and return its document (the existing one for a duplicate ``dedupe_key``)"""
+        now = datetime.utcnow()
+        job_id = str(uuid.uuid4())
+        job = {
+            "_id": job_id,
+            "id": job_id,
+            "type": job_type,
+            "payload": payload,
+            "status": QUEUED,
+            "active": True,
+            "attempts": 0,
+            "max_attempts": self.max_attempts,
+            "available_at": now + timedelta(seconds=delay),
+            "locked_until": None,
+            "created_at": now,
+            "updated_at": now,
+            "error": None,
+            "result": None,
+        }
+        if dedupe_key is not None:
+            job["dedupe_key"] = dedupe_key
+        if local:
+            job["node"] = self.node
+        try:
+            await self.collection.insert_one(job)
+        except DuplicateKeyError:
+            if dedupe_key is None:
+                raise
+            existing = await self.collection.find_one({"dedupe_key": dedupe_key, "active": True})
+            if existing is not None:
+                return existing
+            # The duplicate finished in between; queue this one after all
+            return await self.enqueue(job_type, payload, dedupe_key, delay, local)
+        self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await self.collection.find_one({"_id": job_id}, {"_id": 0, "payload": 0, "active": 0})
+
+    async def claim(self) -> Optional[dict]:
+        """Lease the next due job: queued ones, or running ones whose lease expired"""
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {
+                "type": {"$in": list(self.handlers)},
+                "$and": [
+                    {"$or": [
+                        {"status": QUEUED, "available_at": {"$lte": now}},
+                        {"status": RUNNING, "locked_until": {"$lte": now}},
+                    ]},
+                    {"$or": [
+                        {"node": {"$in": [None, self.node]}},
+                        {"created_at": {"$lte": now - timedelta(seconds=self.pin_timeout)}},
+                    ]},
+                ],
+            },
+            {
+                "$set": {
+                    "status": RUNNING,
+                    "locked_by": self.worker_id,
+                    "lease": str(uuid.uuid4()),
+                    "locked_until": now + timedelta(seconds=self.visibility_timeout),
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("available_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _worker(self):
+        claim_failing = False
+        while True:
+            try:
+                job = await self.claim()
+                claim_failing = False
+            except PyMongoError as e:
+                # Mongo is down or failing over; say so once, then keep polling
+                if not claim_failing:
+                    logger.warning("Could not claim a job: %s", e)
+                claim_failing = True
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            try:
+                await self.run(job)
+            except PyMongoError:
+                # Could not record the outcome; the lease expires and the job runs again
+                logger.warning("Could not record the outcome of job %s", job["id"], exc_info=True)
+
+    async def run(self, job: dict):
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            result = await self.handlers[job["type"]](job["payload"])
+        except asyncio.CancelledError:
+            # Shutting down: leave the lease to expire so another worker retries
+            raise
+        except RetryLater as e:
+            self.retried += 1
+            await self._finish(job, QUEUED, available_in=e.delay, attempts=-1)
+        except PermanentJobError as e:
+            self.failed += 1
+            logger.warning("Job %s (%s) failed permanently: %s", job["id"], job["type"], e)
+            await self._finish(job, FAILED, error=str(e))
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if job["attempts"] >= job["max_attempts"]:
+                self.failed += 1
+                logger.exception("Job %s (%s) failed after %d attempts", job["id"], job["type"], job["attempts"])
+                await self._finish(job, FAILED, error=error)
+            else:
+                self.retried += 1
+                logger.warning("Job %s (%s) failed, retrying: %s", job["id"], job["type"], error)
+                await self._finish(job, QUEUED, error=error, available_in=min(2 ** job["attempts"], 300))
+        else:
+            self.completed += 1
+            await self._finish(job, DONE, result=result)
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, job: dict):
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            try:
+                await self.collection.update_one(
+                    {"_id": job["_id"], "lease": job["lease"]},
+                    {"$set": {"locked_until": datetime.utcnow() + timedelta(seconds=self.visibility_timeout)}},
+                )
+            except PyMongoError:
+                logger.warning("Could not extend the lease on job %s", job["id"], exc_info=True)
+
+    async def _finish(self, job: dict, status: str, result=None, error=None, available_in: float = 0.0,
+                      attempts: int = 0):
+        now = datetime.utcnow()
+        update = {"$set": {"status": status, "updated_at": now, "locked_until": None, "error": error}}
+        if status == QUEUED:
+            update["$set"]["available_at"] = now + timedelta(seconds=available_in)
+        else:
+            update["$set"].update({"result": result, "finished_at": now})
+            update["$unset"] = {"active": ""}
+        if attempts:
+            update["$inc"] = {"attempts": attempts}
+        # Matching the lease means a worker whose lease expired cannot clobber the retry
+        outcome = await self.collection.update_one({"_id": job["_id"], "lease": job["lease"]}, update)
+        if not outcome.matched_count:
+            logger.warning("Job %s was re-leased before it finished here", job["id"])
+
+    async def counts(self) -> Dict[str, int]:
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        async for row in self.collection.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+            counts[row["_id"]] = row["count"]
+        return counts
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried,
+        }
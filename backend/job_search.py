@@ -0,0 +1,341 @@
+import asyncio
+import bisect
+import logging
+import re
+import time
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING, TEXT
+
+from pagination import decode_cursor, encode_cursor, fetch_page, naive_utc
+
+logger = logging.getLogger(__name__)
+
+SORT_FIELD = "submitted_at"
+# Facet name -> document field; skills is a list, the others are scalars
+FACET_FIELDS = {"position": "position", "skills": "skills", "status": "status"}
+TEXT_WEIGHTS = {"position": 5, "skills": 5, "motivation": 1, "projects": 1}
+TOKEN = re.compile(r"[\w+#]+")
+
+# (documents, next_cursor, facets) as returned by every backend
+SearchResult = Tuple[List[dict], Optional[str], Optional[Dict[str, List[dict]]]]
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN.findall(text.lower()) if text else []
+
+
+def facet_list(counts: Counter, limit: int) -> List[dict]:
+    top = sorted(counts.items(), key=lambda item: (-item[1], str(item[0])))[:limit]
+    return [{"value": value, "count": count} for value, count in top]
+
+
+class JobSearch:
+    """Filtered, full-text job-application search with facet counts.
+
+    Results are newest first and paged with the same (submitted_at, id)
+    cursors as the list endpoints. Filters within one field are ORed
+    (``position=a&position=b``), across fields ANDed, and every word of
+    ``q`` must match. Facet counts are over the whole filtered result set.
+    """
+
+    def __init__(self, collection, projection: dict, facet_limit: int = 50):
+        self.collection = collection
+        self.projection = projection
+        self.facet_limit = facet_limit
+
+    async def start(self):
+        pass
+
+    def add(self, document: dict):
+        """Called after an application is inserted"""
+
+    async def search(self, q: str = "", positions: Iterable[str] = (), skills: Iterable[str] = (),
+                     statuses: Iterable[str] = (), limit: int = 20, cursor: Optional[str] = None,
+                     facets: bool = True) -> SearchResult:
+        raise NotImplementedError
+
+
+class MongoJobSearch(JobSearch):
+    """Search with a Mongo text index, compound filter indexes and $facet.
+
+    ``$facet`` only ever sees the documents matched by the filters. With no
+    filters that would be the whole collection, so those counts are
+    aggregated once, kept current by ``add`` and re-aggregated every
+    ``total_facets_ttl`` seconds to pick up other processes' inserts.
+    """
+
+    total_facets_ttl = 60.0
+
+    def __init__(self, collection, projection: dict, facet_limit: int = 50):
+        super().__init__(collection, projection, facet_limit)
+        self.total_facets: Optional[Dict[str, Counter]] = None
+        self._total_facets_expires = 0.0
+
+    def add(self, document: dict):
+        if self.total_facets is None:
+            return
+        for name, field in FACET_FIELDS.items():
+            value = document.get(field)
+            # Same buckets as the aggregation: $unwind skips a missing list
+            self.total_facets[name].update((value or []) if field == "skills" else [value])
+
+    async def start(self):
+        indexes = [
+            [(field, TEXT) for field in TEXT_WEIGHTS],
+            [("status", ASCENDING), (SORT_FIELD, DESCENDING), ("id", DESCENDING)],
+            [("position", ASCENDING), (SORT_FIELD, DESCENDING), ("id", DESCENDING)],
+            [("skills", ASCENDING), (SORT_FIELD, DESCENDING), ("id", DESCENDING)],
+        ]
+        for keys in indexes:
+            options = {"weights": TEXT_WEIGHTS, "name": "job_applications_text"} if keys[0][1] == TEXT else {}
+            try:
+                await self.collection.create_index(keys, **options)
+            except Exception:
+                logger.exception("Could not create search index %s on %s", keys, self.collection.name)
+
+    @staticmethod
+    def build_query(q, positions, skills, statuses) -> dict:
+        query = {}
+        words = tokenize(q)
+        if words:
+            # Quoting each word makes $text require all of them instead of any
+            query["$text"] = {"$search": " ".join(f'"{word}"' for word in words)}
+        for field, values in (("position", positions), ("skills", skills), ("status", statuses)):
+            values = list(values)
+            if values:
+                query[field] = {"$in": values}
+        return query
+
+    async def search(self, q="", positions=(), skills=(), statuses=(), limit=20, cursor=None, facets=True):
+        query = self.build_query(q, positions, skills, statuses)
+        page = fetch_page(self.collection, SORT_FIELD, limit, cursor, query=query, projection=self.projection)
+        if not facets:
+            documents, next_cursor = await page
+            return documents, next_cursor, None
+        # The page and the facet aggregation are independent queries
+        counts = self.facet_counts(query, self.facet_limit) if query else self.collection_facet_counts()
+        (documents, next_cursor), facet_counts = await asyncio.gather(page, counts)
+        return documents, next_cursor, facet_counts
+
+    async def collection_facet_counts(self) -> Dict[str, List[dict]]:
+        if self.total_facets is None or time.monotonic() >= self._total_facets_expires:
+            # Every value, not just the top ones, so add() can keep them current
+            buckets = await self.facet_counts({}, None)
+            self.total_facets = {
+                name: Counter({bucket["value"]: bucket["count"] for bucket in buckets[name]})
+                for name in FACET_FIELDS
+            }
+            self._total_facets_expires = time.monotonic() + self.total_facets_ttl
+        return {name: facet_list(self.total_facets[name], self.facet_limit) for name in FACET_FIELDS}
+
+    async def facet_counts(self, query: dict, limit: Optional[int]) -> Dict[str, List[dict]]:
+        """Top ``limit`` values per facet over the documents matching ``query``"""
+        def group(field):
+            stages = [
+                {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1, "_id": 1}},
+            ]
+            return stages + ([{"$limit": limit}] if limit is not None else [])
+
+        pipeline = [{"$match": query}, {"$facet": {
+            name: ([{"$unwind": f"${field}"}] if field == "skills" else []) + group(field)
+            for name, field in FACET_FIELDS.items()
+        }}]
+        result = await self.collection.aggregate(pipeline).to_list(1)
+        buckets = result[0] if result else {}
+        return {
+            name: [{"value": bucket["_id"], "count": bucket["count"]} for bucket in buckets.get(name, [])]
+            for name in FACET_FIELDS
+        }
+
+
+def to_bitmap(ordinals: Iterable[int], size: int) -> int:
+    """Set of small ints as an int bitmap, built in one pass"""
+    buffer = bytearray((size + 7) // 8)
+    for ordinal in ordinals:
+        buffer[ordinal >> 3] |= 1 << (ordinal & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def iter_bits(bitmap_bytes: bytes) -> Iterator[int]:
+    for i, byte in enumerate(bitmap_bytes):
+        if byte:
+            base = i << 3
+            for bit in range(8):
+                if byte >> bit & 1:
+                    yield base + bit
+
+
+class InMemoryJobSearch(JobSearch):
+    """Inverted index over applications, for when Mongo text search is unavailable.
+
+    Each application gets an ordinal and every posting list is an int bitmap
+    over ordinals, so AND/OR of filters and facet counts are single big-int
+    operations rather than Python-level set walks. New applications are
+    buffered and folded into the bitmaps at the next search.
+
+    Holds only ids, sort keys, tokens and facet values; the page itself is
+    fetched from Mongo by id. The index is per process and sees the inserts
+    made through this process only, so run it with a single worker.
+    """
+
+    # Above this many distinct values, count a facet by visiting the matches
+    max_bitmap_facet_values = 1024
+
+    def __init__(self, collection, projection: dict, facet_limit: int = 50):
+        super().__init__(collection, projection, facet_limit)
+        self.postings: Dict[str, int] = {}
+        self.facet_postings: Dict[str, Dict[str, int]] = {name: {} for name in FACET_FIELDS}
+        self.total_facets = {name: Counter() for name in FACET_FIELDS}
+        self.ordinals: Dict[str, int] = {}
+        # Per ordinal: (submitted_at, id) and one set of values per facet
+        self.sort_keys: List[Tuple] = []
+        self.facet_values: List[Tuple] = []
+        # All sort keys ascending; newest first means walking it backwards
+        self.keys: List[Tuple] = []
+        self._pending_words: Dict[str, List[int]] = {}
+        self._pending_facets: Dict[str, Dict[str, List[int]]] = {name: {} for name in FACET_FIELDS}
+
+    async def start(self):
+        fields = {"_id": 0, "id": 1, SORT_FIELD: 1, **{field: 1 for field in FACET_FIELDS.values()},
+                  **{field: 1 for field in TEXT_WEIGHTS}}
+        async for document in self.collection.find({}, fields):
+            self.add(document)
+        self._fold()
+        logger.info("Indexed %d job applications for search", len(self.ordinals))
+
+    def add(self, document: dict):
+        doc_id = document.get("id")
+        sort_value = document.get(SORT_FIELD)
+        if doc_id is None or sort_value is None or doc_id in self.ordinals:
+            return
+        ordinal = len(self.sort_keys)
+        self.ordinals[doc_id] = ordinal
+        # Keys loaded from Mongo are naive UTC; an aware one from a request would not compare
+        key = (naive_utc(sort_value), doc_id)
+        self.sort_keys.append(key)
+        if not self.keys or key > self.keys[-1]:
+            self.keys.append(key)
+        else:
+            bisect.insort(self.keys, key)
+
+        text = " ".join(
+            " ".join(value) if isinstance(value, list) else str(value or "")
+            for value in (document.get(field) for field in TEXT_WEIGHTS)
+        )
+        for word in set(tokenize(text)):
+            self._pending_words.setdefault(word, []).append(ordinal)
+
+        values = []
+        for name, field in FACET_FIELDS.items():
+            value = document.get(field)
+            field_values = set(value) if isinstance(value, list) else ({value} if value is not None else set())
+            for item in field_values:
+                self._pending_facets[name].setdefault(item, []).append(ordinal)
+                self.total_facets[name][item] += 1
+            values.append(field_values)
+        self.facet_values.append(tuple(values))
+
+    def _fold(self):
+        """OR buffered additions into the bitmaps, one rebuild per touched posting"""
+        size = len(self.sort_keys)
+        for postings, pending in [(self.postings, self._pending_words)] + [
+            (self.facet_postings[name], self._pending_facets[name]) for name in FACET_FIELDS
+        ]:
+            for value, ordinals in pending.items():
+                postings[value] = postings.get(value, 0) | to_bitmap(ordinals, size)
+            pending.clear()
+
+    def candidates(self, q, positions, skills, statuses) -> Optional[int]:
+        """Bitmap of applications matching every condition, or None when nothing filters"""
+        self._fold()
+        bitmaps = []
+        for word in tokenize(q):
+            bitmaps.append(self.postings.get(word, 0))
+        for name, values in (("position", positions), ("skills", skills), ("status", statuses)):
+            values = list(values)
+            if values:
+                postings = self.facet_postings[name]
+                union = 0
+                for value in values:
+                    union |= postings.get(value, 0)
+                bitmaps.append(union)
+        if not bitmaps:
+            return None
+        matches = bitmaps[0]
+        for bitmap in bitmaps[1:]:
+            matches &= bitmap
+        return matches
+
+    async def search(self, q="", positions=(), skills=(), statuses=(), limit=20, cursor=None, facets=True):
+        matches = self.candidates(q, positions, skills, statuses)
+        after = decode_cursor(cursor) if cursor else None
+
+        if matches is None:
+            page = self._walk(after, limit, lambda key: True)
+        else:
+            match_bytes = matches.to_bytes((len(self.sort_keys) + 7) // 8, "little")
+            if matches.bit_count() * 8 < len(self.keys):
+                # Narrow query: sorting the matches beats scanning past non-matches
+                keys = sorted((self.sort_keys[ordinal] for ordinal in iter_bits(match_bytes)), reverse=True)
+                if after is not None:
+                    keys = [key for key in keys if key < after]
+                page = keys[:limit + 1]
+            else:
+                ordinals = self.ordinals
+
+                def matched(key):
+                    ordinal = ordinals[key[1]]
+                    return match_bytes[ordinal >> 3] >> (ordinal & 7) & 1
+
+                page = self._walk(after, limit, matched)
+
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            next_cursor = encode_cursor(*page[-1])
+
+        ids = [doc_id for _, doc_id in page]
+        documents = []
+        if ids:
+            found = {doc["id"]: doc async for doc in self.collection.find({"id": {"$in": ids}}, self.projection)}
+            documents = [found[doc_id] for doc_id in ids if doc_id in found]
+        return documents, next_cursor, (self.facet_counts(matches) if facets else None)
+
+    def _walk(self, after, limit: int, matched) -> List[Tuple]:
+        """Up to limit + 1 keys older than ``after``, newest first"""
+        position = len(self.keys) if after is None else bisect.bisect_left(self.keys, after)
+        page = []
+        while position > 0 and len(page) <= limit:
+            position -= 1
+            key = self.keys[position]
+            if matched(key):
+                page.append(key)
+        return page
+
+    def facet_counts(self, matches: Optional[int]) -> Dict[str, List[dict]]:
+        if matches is None:
+            return {name: facet_list(self.total_facets[name], self.facet_limit) for name in FACET_FIELDS}
+
+        facets = {}
+        for position, name in enumerate(FACET_FIELDS):
+            postings = self.facet_postings[name]
+            if len(postings) <= self.max_bitmap_facet_values:
+                counts = Counter({value: (bitmap & matches).bit_count() for value, bitmap in postings.items()})
+            else:
+                match_bytes = matches.to_bytes((len(self.sort_keys) + 7) // 8, "little")
+                counts = Counter()
+                for ordinal in iter_bits(match_bytes):
+                    counts.update(self.facet_values[ordinal][position])
+            facets[name] = facet_list(+counts, self.facet_limit)
+        return facets
+
+
+def create_job_search(name: str, collection, projection: dict) -> JobSearch:
+    if name == "mongo":
+        return MongoJobSearch(collection, projection)
+    if name == "memory":
+        return InMemoryJobSearch(collection, projection)
+    raise ValueError(f"Unknown job search backend: {name!r}")
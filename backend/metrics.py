@@ -0,0 +1,182 @@
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from pymongo import monitoring
+from starlette.requests import Request
+from starlette.responses import Response
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
+MONGO_OPERATION_LATENCY = Histogram(
+    "mongo_operation_duration_seconds", "MongoDB command latency by collection",
+    ["collection", "command", "outcome"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+WEBSOCKET_CONNECTIONS = Gauge(
+    "chat_websocket_connections", "Open chat websocket connections in this process",
+    multiprocess_mode="livesum",
+)
+BROADCAST_DURATION = Histogram(
+    "chat_broadcast_duration_seconds", "Time to hand one chat message to every local connection",
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+)
+CHAT_MESSAGES_PER_FRAME = Histogram(
+    "chat_messages_per_frame", "Chat messages coalesced into each websocket frame sent", ["protocol"],
+    buckets=(1, 2, 5, 10, 25, 50, 100),
+)
+UPLOAD_BYTES = Counter("upload_bytes_total", "Bytes received by upload endpoints", ["kind"])
+WORKER_QUEUE_WAIT = Histogram(
+    "worker_pool_queue_wait_seconds", "Time jobs wait for a worker pool process", ["pool", "operation"],
+)
+WORKER_PROCESSING = Histogram(
+    "worker_pool_processing_seconds", "Processing time per worker pool job", ["pool", "operation"],
+)
+
+MONGO_POOL_CONNECTIONS = Gauge(
+    "mongo_pool_connections", "MongoDB pool connections by state", ["state"], multiprocess_mode="livesum",
+)
+MONGO_POOL_CHECKOUT_FAILURES = Counter(
+    "mongo_pool_checkout_failures_total", "Failed MongoDB connection checkouts", ["reason"],
+)
+MONGO_POOL_CLEARED = Counter(
+    "mongo_pool_cleared_total", "MongoDB pools cleared, e.g. after a failover or network error",
+)
+RESPONSE_CACHE_REQUESTS = Counter(
+    "response_cache_requests_total", "Cached GET endpoint lookups by outcome", ["namespace", "result"],
+)
+RATE_LIMITED = Counter("rate_limited_total", "Requests and chat frames over a client's budget", ["policy"])
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total", "Expensive requests turned away by the concurrency cap",
+)
+
+
+def observe_worker_job(pool: str, operation: str, queue_wait: float, processing: float):
+    WORKER_QUEUE_WAIT.labels(pool, operation).observe(queue_wait)
+    WORKER_PROCESSING.labels(pool, operation).observe(processing)
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """Records every MongoDB command's duration against its collection"""
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        value = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            value = event.command.get("collection")
+        self._collections[(event.connection_id, event.request_id)] = value if isinstance(value, str) else "-"
+
+    def _observe(self, event, outcome):
+        collection = self._collections.pop((event.connection_id, event.request_id), "-")
+        MONGO_OPERATION_LATENCY.labels(collection, event.command_name, outcome).observe(
+            event.duration_micros / 1e6
+        )
+
+    def succeeded(self, event):
+        self._observe(event, "success")
+
+    def failed(self, event):
+        self._observe(event, "failure")
+
+
+class MongoPoolMonitor(monitoring.ConnectionPoolListener):
+    """Tracks connection pool state per server for metrics and the readiness check"""
+
+    def __init__(self):
+        self.pools = {}
+
+    def _pool(self, address):
+        return self.pools.setdefault(f"{address[0]}:{address[1]}", {
+            "ready": False, "open": 0, "in_use": 0, "cleared": 0, "checkout_failures": 0,
+        })
+
+    def snapshot(self):
+        return {address: dict(pool) for address, pool in self.pools.items()}
+
+    def pool_created(self, event):
+        self._pool(event.address)
+
+    def pool_ready(self, event):
+        self._pool(event.address)["ready"] = True
+
+    def pool_cleared(self, event):
+        pool = self._pool(event.address)
+        pool["ready"] = False
+        pool["cleared"] += 1
+        MONGO_POOL_CLEARED.inc()
+
+    def pool_closed(self, event):
+        self.pools.pop(f"{event.address[0]}:{event.address[1]}", None)
+
+    def connection_created(self, event):
+        self._pool(event.address)["open"] += 1
+        MONGO_POOL_CONNECTIONS.labels("open").inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._pool(event.address)["open"] -= 1
+        MONGO_POOL_CONNECTIONS.labels("open").dec()
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._pool(event.address)["checkout_failures"] += 1
+        MONGO_POOL_CHECKOUT_FAILURES.labels(str(event.reason)).inc()
+
+    def connection_checked_out(self, event):
+        self._pool(event.address)["in_use"] += 1
+        MONGO_POOL_CONNECTIONS.labels("in_use").inc()
+
+    def connection_checked_in(self, event):
+        self._pool(event.address)["in_use"] -= 1
+        MONGO_POOL_CONNECTIONS.labels("in_use").dec()
+
+
+class PrometheusMiddleware:
+    """Times each HTTP request, labelled by route template rather than raw path"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Routing fills in the matched route (or mount) on the shared scope
+            route = scope.get("route")
+            if route is not None:
+                label = route.path
+            else:
+                label = scope.get("root_path") or "<unmatched>"
+            REQUEST_LATENCY.labels(scope["method"], label, str(status)).observe(time.perf_counter() - started)
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # uvicorn --workers N: aggregate what every worker process has written
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
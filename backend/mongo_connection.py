@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import os
+import time
+from typing import List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+
+def client_options_from_env() -> dict:
+    """Pool and timeout settings for the Motor client, from MONGO_* variables"""
+    return {
+        "maxPoolSize": int(os.environ.get('MONGO_MAX_POOL_SIZE', 100)),
+        "minPoolSize": int(os.environ.get('MONGO_MIN_POOL_SIZE', 10)),
+        "maxIdleTimeMS": int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', 300000)),
+        # Fail fast rather than hang when no server is reachable (e.g. mid-failover)
+        "serverSelectionTimeoutMS": int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+        "connectTimeoutMS": int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 5000)),
+        "socketTimeoutMS": int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', 30000)),
+        # Bound how long a request waits for a free pooled connection
+        "waitQueueTimeoutMS": int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000)),
+        "retryWrites": True,
+        "retryReads": True,
+    }
+
+
+class MongoConnection:
+    """Owns the Motor client: creates it at startup, warms the pool, closes it at shutdown"""
+
+    def __init__(self, url: str, db_name: str, options: dict, event_listeners: Optional[List] = None,
+                 pool_monitor=None):
+        self.url = url
+        self.db_name = db_name
+        self.options = options
+        self.event_listeners = list(event_listeners or [])
+        self.pool_monitor = pool_monitor
+        if pool_monitor is not None:
+            self.event_listeners.append(pool_monitor)
+        self.client: Optional[AsyncIOMotorClient] = None
+
+    @property
+    def db(self):
+        return self.client[self.db_name]
+
+    async def connect(self, startup_timeout: float = 10.0) -> bool:
+        """Create the client and wait (up to ``startup_timeout``) for a warm pool.
+
+        If Mongo is still unreachable the app starts anyway and this returns
+        False; the readiness check reports it and the driver keeps trying in
+        the background.
+        """
+        self.client = AsyncIOMotorClient(self.url, event_listeners=self.event_listeners, **self.options)
+        if not await self.wait_for_server(startup_timeout):
+            logger.error("MongoDB not reachable after %.0fs, starting anyway", startup_timeout)
+            return False
+
+        # Concurrent pings check out separate connections, so the first
+        # requests find minPoolSize sockets already open and authenticated
+        warm = max(self.options.get("minPoolSize", 0), 1)
+        results = await asyncio.gather(*(self.ping() for _ in range(warm)), return_exceptions=True)
+        failures = [r for r in results if isinstance(r, Exception)]
+        if failures:
+            logger.warning("%d of %d MongoDB warm-up pings failed: %s", len(failures), warm, failures[0])
+        logger.info("MongoDB connected, %d connections warmed", warm - len(failures))
+        return True
+
+    async def wait_for_server(self, timeout: Optional[float] = None) -> bool:
+        """Ping with backoff until MongoDB answers; False if ``timeout`` seconds pass first"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        delay = 0.1
+        while True:
+            try:
+                await self.ping()
+                return True
+            except PyMongoError as e:
+                if deadline is not None and time.monotonic() + delay > deadline:
+                    return False
+                logger.info("Waiting for MongoDB: %s", e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 2.0)
+
+    async def ping(self) -> float:
+        """Round-trip a ping, returning its latency in seconds"""
+        started = time.perf_counter()
+        await self.client.admin.command("ping")
+        return time.perf_counter() - started
+
+    async def health(self, timeout: float = 1.0) -> dict:
+        """Ping with a hard timeout plus the pool state, for readiness checks"""
+        status = {"ok": False, "latency_ms": None, "error": None}
+        if self.client is None:
+            status["error"] = "not connected"
+        else:
+            try:
+                latency = await asyncio.wait_for(self.ping(), timeout)
+                status.update(ok=True, latency_ms=round(latency * 1000, 2))
+            except asyncio.TimeoutError:
+                status["error"] = f"ping timed out after {timeout}s"
+            except PyMongoError as e:
+                status["error"] = str(e)
+        if self.pool_monitor is not None:
+            status["pools"] = self.pool_monitor.snapshot()
+        return status
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
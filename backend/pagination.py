@@ -0,0 +1,97 @@
+import base64
+import json
+import logging
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from pymongo import ASCENDING, DESCENDING
+
+logger = logging.getLogger(__name__)
+
+# Response header carrying the cursor for the next page, if there is one
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def naive_utc(value: datetime) -> datetime:
+    """``value`` as a naive UTC datetime, the form Mongo returns; naive values are assumed UTC already"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def mongo_datetime(value: datetime) -> datetime:
+    """``value`` as it reads back from Mongo: naive UTC, truncated to BSON's millisecond precision"""
+    value = naive_utc(value)
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+
+def encode_cursor(sort_value: datetime, doc_id: str) -> str:
+    payload = json.dumps({"t": sort_value.isoformat(), "id": doc_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return naive_utc(datetime.fromisoformat(payload["t"])), str(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_filter(sort_field: str, cursor: Optional[str], direction: int = DESCENDING) -> dict:
+    """Mongo filter for the rows after ``cursor`` in (sort_field, id) order"""
+    if not cursor:
+        return {}
+    sort_value, doc_id = decode_cursor(cursor)
+    op = "$lt" if direction == DESCENDING else "$gt"
+    return {"$or": [
+        {sort_field: {op: sort_value}},
+        {sort_field: sort_value, "id": {op: doc_id}},
+    ]}
+
+
+async def fetch_page(collection, sort_field: str, limit: int, cursor: Optional[str] = None,
+                     direction: int = DESCENDING, query: Optional[dict] = None,
+                     projection: Optional[dict] = None) -> Tuple[List[dict], Optional[str]]:
+    """Fetch one keyset page, returning (documents, next_cursor).
+
+    Rows are ordered by ``sort_field`` with ``id`` as the tie breaker, which
+    the (sort_field, id) compound indexes created at startup cover.
+    """
+    filters = keyset_filter(sort_field, cursor, direction)
+    if query:
+        filters = {"$and": [query, filters]} if filters else query
+    documents = await collection.find(filters, projection).sort(
+        [(sort_field, direction), ("id", direction)]
+    ).limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        last = documents[-1]
+        next_cursor = encode_cursor(last[sort_field], last["id"])
+    return documents, next_cursor
+
+
+# (collection, sort field) pairs served by keyset pagination
+PAGINATED_COLLECTIONS = (
+    ("status_checks", "timestamp"),
+    ("chat_messages", "timestamp"),
+    ("uploaded_files", "upload_timestamp"),
+    ("uploaded_images", "upload_timestamp"),
+    ("job_applications", "submitted_at"),
+)
+
+
+async def ensure_indexes(db):
+    """Create the lookup and sort indexes the list endpoints rely on"""
+    for collection_name, sort_field in PAGINATED_COLLECTIONS:
+        collection = db[collection_name]
+        try:
+            await collection.create_index([("id", ASCENDING)], unique=True)
+            await collection.create_index([(sort_field, DESCENDING), ("id", DESCENDING)])
+        except Exception:
+            # Keep serving even if an index cannot be built (e.g. legacy duplicate ids)
+            logger.exception("Could not create indexes on %s", collection_name)
@@ -0,0 +1,380 @@
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+from metrics import ADMISSION_REJECTED, RATE_LIMITED
+from redis_client import get_client
+
+logger = logging.getLogger(__name__)
+
+
+class Policy:
+    """A token bucket: ``rate`` tokens per second, holding at most ``burst``"""
+
+    __slots__ = ("name", "rate", "burst")
+
+    def __init__(self, name: str, rate: float, burst: float):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+
+
+class RateLimitBackend:
+    async def take(self, key: str, policy: Policy, cost: float) -> float:
+        """Take ``cost`` tokens from ``key``'s bucket; 0 if allowed, else seconds until it would be"""
+        raise NotImplementedError
+
+    async def stop(self):
+        pass
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """Buckets for this process only; the least recently used are dropped past ``max_keys``"""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self.buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key, policy, cost):
+        key = f"{policy.name}:{key}"
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(key, (policy.burst, now))
+        tokens = min(policy.burst, tokens + (now - updated) * policy.rate)
+        if tokens >= cost:
+            tokens -= cost
+            wait = 0.0
+        else:
+            wait = (cost - tokens) / policy.rate
+        self.buckets[key] = (tokens, now)
+        self.buckets.move_to_end(key)
+        # A dropped bucket was idle longest, so it is (nearly) full anyway
+        while len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
+        return wait
+
+
+# KEYS[1] bucket; ARGV rate, burst, cost. Uses the server clock so every
+# app process agrees on elapsed time.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= cost then
+  tokens = tokens - cost
+else
+  wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """Buckets shared by every worker and node, updated atomically by a Lua script"""
+
+    def __init__(self, url: str, prefix: str = "hotbeans:ratelimit", client=None):
+        self.url = url
+        self.prefix = prefix
+        self._client = client
+        self._script = None
+
+    def _get_script(self):
+        if self._script is None:
+            if self._client is None:
+                self._client = get_client(self.url, "RATE_LIMIT_BACKEND")
+            self._script = self._client.register_script(TOKEN_BUCKET_SCRIPT)
+        return self._script
+
+    async def take(self, key, policy, cost):
+        wait = await self._get_script()(
+            keys=[f"{self.prefix}:{policy.name}:{key}"], args=[policy.rate, policy.burst, cost]
+        )
+        return float(wait)
+
+
+class RateLimiter:
+    """Per-client token buckets over a shared backend.
+
+    Clients are keyed by IP. User names are not used as keys because
+    nothing verifies them, so anyone could drain another user's bucket. If
+    the backend is unreachable, requests are let through.
+    """
+
+    def __init__(self, backend: RateLimitBackend, policies: Iterable[Policy]):
+        self.backend = backend
+        self.policies: Dict[str, Policy] = {policy.name: policy for policy in policies}
+        self.limited: Dict[str, int] = {name: 0 for name in self.policies}
+        self.errors = 0
+        self._failing = False
+
+    async def take(self, policy_name: str, key: str, cost: float = 1.0) -> float:
+        """Charge ``cost`` to ``key``; 0 if allowed, else seconds to wait before retrying"""
+        policy = self.policies[policy_name]
+        # A cost above the burst could never be paid; require a full bucket instead
+        cost = min(cost, policy.burst)
+        try:
+            wait = await self.backend.take(key, policy, cost)
+            self._failing = False
+        except Exception as e:
+            self.errors += 1
+            if not self._failing:
+                logger.warning("Rate limit backend failed, not limiting: %s", e)
+            self._failing = True
+            return 0.0
+        if wait:
+            self.limited[policy_name] += 1
+            RATE_LIMITED.labels(policy_name).inc()
+        return wait
+
+    async def throttle(self, policy_name: str, key: str, cost: float = 1.0):
+        """Wait until the bucket allows ``cost``.
+
+        Used on websockets and streamed bodies: while a flooding client's
+        handler sleeps it stops reading, so TCP backpressure slows that
+        client and no one else.
+        """
+        while wait := await self.take(policy_name, key, cost):
+            await asyncio.sleep(wait)
+
+    async def stop(self):
+        await self.backend.stop()
+
+    def stats(self):
+        return {
+            "backend": type(self.backend).__name__,
+            "policies": {
+                name: {"rate": policy.rate, "burst": policy.burst, "limited": self.limited[name]}
+                for name, policy in self.policies.items()
+            },
+            "errors": self.errors,
+        }
+
+
+def client_key(host: Optional[str]) -> str:
+    return f"ip:{host or 'unknown'}"
+
+
+def create_rate_limiter(name: str, policies: Iterable[Policy], redis_url: str = None) -> RateLimiter:
+    if name == "memory":
+        return RateLimiter(InMemoryRateLimitBackend(), policies)
+    if name == "redis":
+        return RateLimiter(RedisRateLimitBackend(redis_url), policies)
+    raise ValueError(f"Unknown rate limit backend: {name!r}")
+
+
+class Rule:
+    """Routes matching ``method`` and ``path_prefix`` are charged to ``policy``.
+
+    ``cost="content-length"`` charges the request body size, so upload
+    budgets are in bytes; a body streamed without a Content-Length is
+    charged chunk by chunk as it is read. ``max_bytes`` turns away larger
+    bodies with 413 before the app reads any of it. ``expensive`` routes
+    also count against the concurrency cap. A rule with no policy and not
+    expensive exempts its routes from the rules after it.
+    """
+
+    __slots__ = ("method", "path_prefix", "policy", "cost", "expensive", "max_bytes")
+
+    def __init__(self, method: str, path_prefix: str, policy: Optional[str], cost="request",
+                 expensive: bool = False, max_bytes: Optional[int] = None):
+        self.method = method
+        self.path_prefix = path_prefix
+        self.policy = policy
+        self.cost = cost
+        self.expensive = expensive
+        self.max_bytes = max_bytes
+
+
+class ConcurrencyCap:
+    """Bounds how many expensive requests this process runs at once.
+
+    Beyond ``max_concurrency``, requests wait up to ``queue_timeout`` for a
+    slot and are then turned away, so a burst of uploads or imports cannot
+    starve cheap requests of the event loop and database.
+    """
+
+    def __init__(self, max_concurrency: int = 8, queue_timeout: float = 2.0):
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.rejected = 0
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+    async def acquire(self) -> bool:
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            ADMISSION_REJECTED.inc()
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+        self._slots.release()
+
+    def stats(self):
+        return {"max_concurrency": self.max_concurrency, "in_flight": self.in_flight, "rejected": self.rejected}
+
+
+class RateLimitMiddleware:
+    """Admission control for HTTP requests, applied before the body is read.
+
+    The first matching rule decides the bucket and whether the request is
+    expensive. Over-budget clients get 429 with Retry-After; expensive
+    requests the concurrency cap turns away get 503.
+    """
+
+    def __init__(self, app, limiter: RateLimiter, rules: List[Rule], cap: ConcurrencyCap):
+        self.app = app
+        self.limiter = limiter
+        self.rules = rules
+        self.cap = cap
+
+    def match(self, scope) -> Optional[Rule]:
+        for rule in self.rules:
+            if scope["method"] == rule.method and scope["path"].startswith(rule.path_prefix):
+                return rule
+        return None
+
+    async def __call__(self, scope, receive, send):
+        rule = self.match(scope) if scope["type"] == "http" else None
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        length = None
+        if rule.cost == "content-length" or rule.max_bytes is not None:
+            try:
+                length = content_length(scope)
+            except ValueError:
+                response = JSONResponse({"detail": "Invalid Content-Length"}, status_code=400)
+                await response(scope, receive, send)
+                return
+
+        limit = None
+        if rule.max_bytes is not None:
+            if length is not None and length > rule.max_bytes:
+                response = too_large(rule.max_bytes)
+                await response(scope, receive, send)
+                return
+            if length is None:
+                limit = BodyLimit(scope, receive, send, rule.max_bytes)
+                receive, send = limit.receive, limit.send
+
+        if rule.policy is not None:
+            client = scope.get("client")
+            key = client_key(client[0] if client else None)
+            cost = 1.0
+            if rule.cost == "content-length":
+                if length is None:
+                    # Streamed (chunked): charge 1 now to turn away a drained client, the rest as it arrives
+                    receive = self._metered(receive, rule.policy, key)
+                else:
+                    cost = max(length, 1)
+            wait = await self.limiter.take(rule.policy, key, cost)
+            if wait:
+                response = JSONResponse(
+                    {"detail": "Rate limit exceeded"}, status_code=429,
+                    headers={"Retry-After": str(math.ceil(wait))},
+                )
+                await response(scope, receive, send)
+                return
+
+        if not rule.expensive:
+            await self._call_app(scope, receive, send, limit)
+            return
+        if not await self.cap.acquire():
+            response = JSONResponse({"detail": "Server busy, try again shortly"}, status_code=503,
+                                    headers={"Retry-After": "1"})
+            await response(scope, receive, send)
+            return
+        try:
+            await self._call_app(scope, receive, send, limit)
+        finally:
+            self.cap.release()
+
+    async def _call_app(self, scope, receive, send, limit: Optional["BodyLimit"]):
+        try:
+            await self.app(scope, receive, send)
+        except Exception:
+            # The app failing on the cut-off body is expected; the client already has its 413
+            if limit is None or not limit.tripped:
+                raise
+
+    def _metered(self, receive, policy: str, key: str):
+        """``receive`` charging each body chunk to ``key``, pausing the read while over budget"""
+        async def metered_receive():
+            message = await receive()
+            if message["type"] == "http.request" and message.get("body"):
+                await self.limiter.throttle(policy, key, len(message["body"]))
+            return message
+        return metered_receive
+
+
+def content_length(scope) -> Optional[int]:
+    """The request's Content-Length, None if it has none; ValueError if it is malformed"""
+    raw = dict(scope["headers"]).get(b"content-length")
+    if raw is None:
+        return None
+    length = int(raw)
+    if length < 0:
+        raise ValueError(f"Negative Content-Length: {length}")
+    return length
+
+
+def too_large(max_bytes: int) -> JSONResponse:
+    return JSONResponse({"detail": f"Request body too large. Maximum size is {max_bytes} bytes."},
+                        status_code=413)
+
+
+class BodyLimit:
+    """Cuts off a body streamed without a Content-Length once it passes ``max_bytes``.
+
+    The 413 goes out as soon as the limit is crossed; the app is then told
+    the client disconnected, and anything it sends afterwards is dropped.
+    """
+
+    def __init__(self, scope, receive, send, max_bytes: int):
+        self.scope = scope
+        self.max_bytes = max_bytes
+        self.received = 0
+        self.tripped = False
+        self._receive = receive
+        self._send = send
+        self._response_started = False
+
+    async def receive(self):
+        if self.tripped:
+            return {"type": "http.disconnect"}
+        message = await self._receive()
+        if message["type"] == "http.request":
+            self.received += len(message.get("body", b""))
+            if self.received > self.max_bytes:
+                self.tripped = True
+                if not self._response_started:
+                    response = too_large(self.max_bytes)
+                    await response(self.scope, self._receive, self._send)
+                return {"type": "http.disconnect"}
+        return message
+
+    async def send(self, message):
+        if self.tripped:
+            return
+        if message["type"] == "http.response.start":
+            self._response_started = True
+        await self._send(message)
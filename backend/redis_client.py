@@ -0,0 +1,28 @@
+from typing import Dict
+
+# One client, and so one connection pool, per URL for the whole process
+_clients: Dict[str, object] = {}
+
+
+def get_client(url: str, setting: str):
+    """The process's shared Redis client for ``url``.
+
+    ``setting`` names the option that selected Redis, for the error raised
+    when the 'redis' package is missing.
+    """
+    client = _clients.get(url)
+    if client is None:
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError(f"{setting}=redis requires the 'redis' package") from e
+        client = _clients[url] = redis.from_url(url)
+    return client
+
+
+async def close_clients():
+    """Close every shared client; called once at shutdown, after the backends using them have stopped"""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
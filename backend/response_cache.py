@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import orjson
+from fastapi import Response
+
+from metrics import RESPONSE_CACHE_REQUESTS
+from redis_client import get_client
+
+logger = logging.getLogger(__name__)
+
+# Response headers worth replaying from the cache (content-type and length are rebuilt)
+SKIP_HEADERS = {"content-length", "content-type"}
+
+
+class CachedResponse:
+    """A rendered response body with the headers it was served with"""
+
+    __slots__ = ("body", "headers", "media_type")
+
+    def __init__(self, body: bytes, headers: Dict[str, str], media_type: str):
+        self.body = body
+        self.headers = headers
+        self.media_type = media_type
+
+    @classmethod
+    def from_response(cls, response: Response) -> "CachedResponse":
+        headers = {k: v for k, v in response.headers.items() if k not in SKIP_HEADERS}
+        return cls(response.body, headers, response.media_type)
+
+    def to_response(self, outcome: str) -> Response:
+        return Response(self.body, media_type=self.media_type, headers={**self.headers, "X-Cache": outcome})
+
+    def pack(self, generation: int) -> bytes:
+        meta = orjson.dumps({"g": generation, "h": self.headers, "m": self.media_type})
+        return meta + b"\n" + self.body
+
+    @classmethod
+    def unpack(cls, data: bytes) -> Tuple[int, "CachedResponse"]:
+        meta, _, body = data.partition(b"\n")
+        meta = orjson.loads(meta)
+        return meta["g"], cls(body, meta["h"], meta["m"])
+
+
+class CacheBackend:
+    """Stores entries tagged with their namespace's generation.
+
+    Writers bump the generation instead of finding and deleting keys; an
+    entry whose tag no longer matches is a miss and ages out with its TTL.
+    """
+
+    async def lookup(self, namespace: str, key: str) -> Tuple[int, Optional[CachedResponse]]:
+        """Current generation of ``namespace`` and the entry for ``key`` if it is from that generation"""
+        raise NotImplementedError
+
+    async def store(self, namespace: str, key: str, generation: int, entry: CachedResponse, ttl: float):
+        raise NotImplementedError
+
+    async def bump(self, namespace: str):
+        raise NotImplementedError
+
+    async def stop(self):
+        pass
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """Per-process LRU; invalidation only reaches this process"""
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self.generations: Dict[str, int] = {}
+        self.entries: "OrderedDict[Tuple[str, str], Tuple[int, float, CachedResponse]]" = OrderedDict()
+
+    async def lookup(self, namespace, key):
+        generation = self.generations.get(namespace, 0)
+        item = self.entries.get((namespace, key))
+        if item is None:
+            return generation, None
+        entry_generation, expires_at, entry = item
+        if entry_generation != generation or expires_at < time.monotonic():
+            del self.entries[(namespace, key)]
+            return generation, None
+        self.entries.move_to_end((namespace, key))
+        return generation, entry
+
+    async def store(self, namespace, key, generation, entry, ttl):
+        self.entries[(namespace, key)] = (generation, time.monotonic() + ttl, entry)
+        self.entries.move_to_end((namespace, key))
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def bump(self, namespace):
+        self.generations[namespace] = self.generations.get(namespace, 0) + 1
+
+
+class RedisCacheBackend(CacheBackend):
+    """Shared by every worker and node, so a write anywhere invalidates everywhere"""
+
+    def __init__(self, url: str, prefix: str = "hotbeans:cache", client=None):
+        self.url = url
+        self.prefix = prefix
+        self._client = client
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = get_client(self.url, "RESPONSE_CACHE_BACKEND")
+        return self._client
+
+    def _generation_key(self, namespace: str) -> str:
+        return f"{self.prefix}:{namespace}:generation"
+
+    def _entry_key(self, namespace: str, key: str) -> str:
+        return f"{self.prefix}:{namespace}:{key}"
+
+    async def lookup(self, namespace, key):
+        # One round trip for both; the entry carries the generation it was built under
+        raw_generation, data = await self._get_client().mget(
+            self._generation_key(namespace), self._entry_key(namespace, key)
+        )
+        generation = int(raw_generation or 0)
+        if data is None:
+            return generation, None
+        entry_generation, entry = CachedResponse.unpack(data)
+        return generation, entry if entry_generation == generation else None
+
+    async def store(self, namespace, key, generation, entry, ttl):
+        await self._get_client().set(self._entry_key(namespace, key), entry.pack(generation), px=int(ttl * 1000))
+
+    async def bump(self, namespace):
+        await self._get_client().incr(self._generation_key(namespace))
+
+
+class ResponseCache:
+    """Caches rendered GET responses for up to ``ttl`` seconds.
+
+    Write handlers call ``invalidate`` with the namespace they changed. The
+    generation is read before the response is built, so a write that lands
+    while a miss is being computed leaves that result already stale rather
+    than cached as current. Concurrent misses for the same key and
+    generation share a single computation (per process). If the backend is
+    unreachable, requests are served uncached.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float = 60.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+        self._in_flight: Dict[Tuple[str, str, int], asyncio.Future] = {}
+
+    async def get(self, namespace: str, key: str, build: Callable[[], Awaitable[Response]]) -> Response:
+        """The cached response for ``key``, or ``build()``'s (cached if it is a 200)"""
+        try:
+            generation, entry = await self.backend.lookup(namespace, key)
+        except Exception as e:
+            self._backend_failed("lookup", e)
+            return await build()
+        if entry is not None:
+            self.hits += 1
+            RESPONSE_CACHE_REQUESTS.labels(namespace, "hit").inc()
+            return entry.to_response("HIT")
+
+        flight_key = (namespace, key, generation)
+        flight = self._in_flight.get(flight_key)
+        if flight is not None:
+            self.coalesced += 1
+            RESPONSE_CACHE_REQUESTS.labels(namespace, "coalesced").inc()
+            entry = await asyncio.shield(flight)
+            return entry.to_response("HIT") if entry is not None else await build()
+
+        self.misses += 1
+        RESPONSE_CACHE_REQUESTS.labels(namespace, "miss").inc()
+        flight = asyncio.get_running_loop().create_future()
+        self._in_flight[flight_key] = flight
+        try:
+            response = await build()
+            entry = CachedResponse.from_response(response) if response.status_code == 200 else None
+        except BaseException:
+            # Waiters build their own response rather than share the failure
+            flight.set_result(None)
+            raise
+        finally:
+            del self._in_flight[flight_key]
+        flight.set_result(entry)
+        if entry is None:
+            return response
+        try:
+            await self.backend.store(namespace, key, generation, entry, self.ttl)
+        except Exception as e:
+            self._backend_failed("store", e)
+        return entry.to_response("MISS")
+
+    async def invalidate(self, namespace: str):
+        try:
+            await self.backend.bump(namespace)
+        except Exception as e:
+            # Entries from before the write now live out their TTL
+            self._backend_failed("invalidate", e)
+
+    async def stop(self):
+        await self.backend.stop()
+
+    def _backend_failed(self, operation: str, error: Exception):
+        self.errors += 1
+        logger.warning("Response cache %s failed: %s", operation, error)
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "backend": type(self.backend).__name__,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else None,
+        }
+
+
+def create_response_cache(name: str, ttl: float, max_entries: int = 1000, redis_url: str = None) -> ResponseCache:
+    if name == "memory":
+        return ResponseCache(InMemoryCacheBackend(max_entries), ttl)
+    if name == "redis":
+        return ResponseCache(RedisCacheBackend(redis_url), ttl)
+    raise ValueError(f"Unknown response cache backend: {name!r}")
@@ -1,64 +1,302 @@
-from fastapi import FastAPI, APIRouter, WebSocket, WebSocketDisconnect, UploadFile, File, HTTPException
-from fastapi.staticfiles import StaticFiles
+from fastapi import (
+    FastAPI, APIRouter, WebSocket, WebSocketDisconnect, UploadFile, File, HTTPException, Request, Query
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
+from contextlib import asynccontextmanager
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 import uuid
 from datetime import datetime
 import json
+import hashlib
+import hmac
+import re
+import tempfile
+import asyncio
 import aiofiles
-from PIL import Image
-import io
+from PIL import UnidentifiedImageError
+from image_pipeline import (
+    DerivativeCache, FORMAT_MEDIA_TYPES, ImageTooLarge, convert_upload_to_jpeg, probe_image, render_derivative,
+    snap_width, supported_formats
+)
+from worker_pool import PoolRestarted, PoolSaturated, WorkerPool
+from blob_store import BlobStore
+from chat_broadcast import ConnectionManager, create_broadcast_backend
+from chat_protocol import negotiate, receive_frame
+from write_behind import WriteBehindBuffer
+from pagination import NEXT_CURSOR_HEADER, encode_cursor, ensure_indexes, fetch_page, mongo_datetime, naive_utc
+from fast_json import ORJSONRowsResponse, ReadModel, row_response, rows_response
+from bulk_ingest import BulkIngestSummary, ingest, read_records
+from chat_history import ChatHistoryCache
+from job_search import create_job_search, tokenize
+from cv_text import CvTextIndexer
+from job_queue import JobQueue, PermanentJobError, RetryLater
+from pymongo import ASCENDING, DESCENDING
+from rate_limit import ConcurrencyCap, Policy, RateLimitMiddleware, Rule, client_key, create_rate_limiter
+from response_cache import create_response_cache
+from static_files import CachedStaticFiles, ContentETags
+from metrics import (
+    BROADCAST_DURATION, UPLOAD_BYTES, WEBSOCKET_CONNECTIONS, MongoCommandTimer, MongoPoolMonitor,
+    PrometheusMiddleware, metrics_endpoint, observe_worker_job
+)
+from mongo_connection import MongoConnection, client_options_from_env
+from redis_client import close_clients
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# Create images and uploads directories
+# Images and uploads directories (created at startup)
 images_dir = ROOT_DIR / "images"
 uploads_dir = ROOT_DIR / "uploads"
-images_dir.mkdir(exist_ok=True)
-uploads_dir.mkdir(exist_ok=True)
+incoming_dir = ROOT_DIR / "cache" / "incoming"
+
+# Upload limits
+CV_MAX_BYTES = int(os.environ.get('CV_MAX_BYTES', 20 * 1024 * 1024))
+# Room for multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 1024 * 1024))
+
+# Image budgets, checked from the header before anything is decoded. A pool
+# worker needs about 10 bytes per pixel of IMAGE_MAX_PIXELS to convert an
+# image; stored JPEGs are scaled to fit IMAGE_MAX_DIMENSION on their long edge.
+IMAGE_MAX_BYTES = int(os.environ.get('IMAGE_MAX_BYTES', 20 * 1024 * 1024))
+IMAGE_MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS', 25_000_000))
+IMAGE_MAX_DIMENSION = int(os.environ.get('IMAGE_MAX_DIMENSION', 4096))
+
+# Bulk job-application imports
+BULK_MAX_RECORDS = int(os.environ.get('BULK_MAX_RECORDS', 50000))
+BULK_MAX_BYTES = int(os.environ.get('BULK_MAX_BYTES', 100 * 1024 * 1024))
+BULK_CHUNK_SIZE = int(os.environ.get('BULK_CHUNK_SIZE', 500))
+
+# Resized/re-encoded derivatives of /images, capped on disk with LRU eviction
+derivative_cache = DerivativeCache(
+    ROOT_DIR / "cache" / "images",
+    max_bytes=int(os.environ.get('IMAGE_CACHE_MAX_BYTES', 512 * 1024 * 1024)),
+    max_digests=int(os.environ.get('IMAGE_DIGEST_MEMO_SIZE', 4096)),
+)
+image_output_formats = supported_formats()
+
+# Pillow work runs in worker processes so it never blocks the event loop
+image_pool = WorkerPool(
+    "image",
+    max_workers=int(os.environ.get('IMAGE_POOL_WORKERS', min(4, os.cpu_count() or 1))),
+    max_queue=int(os.environ.get('IMAGE_POOL_MAX_QUEUE', 32)),
+    on_timing=observe_worker_job,
+    max_tasks_per_child=int(os.environ.get('IMAGE_POOL_MAX_TASKS_PER_CHILD', 100)) or None,
+)
+
+# Text extraction from uploaded CVs runs in its own small pool so a backlog
+# of PDFs never competes with image requests
+cv_text_pool = WorkerPool(
+    "cv-text",
+    max_workers=int(os.environ.get('CV_TEXT_WORKERS', 2)),
+    max_queue=int(os.environ.get('CV_TEXT_MAX_QUEUE', 8)),
+    on_timing=observe_worker_job,
+)
+
+# MongoDB connection, opened in the lifespan handler. Everything below that
+# holds a collection is pointed at the database by bind_database().
+mongo_pool_monitor = MongoPoolMonitor()
+mongo = MongoConnection(
+    os.environ['MONGO_URL'], os.environ['DB_NAME'], client_options_from_env(),
+    event_listeners=[MongoCommandTimer()], pool_monitor=mongo_pool_monitor,
+)
+db = None
+# Set once prepare_database() has built the indexes and loaded the caches
+database_prepared = False
+
+# Content-addressed storage: identical uploads share one file on disk
+cv_blobs = BlobStore(None, uploads_dir, kind="cv")
+image_blobs = BlobStore(None, images_dir, kind="image")
+
+# Chat messages are persisted in batches after they have been broadcast
+chat_writer = WriteBehindBuffer(
+    None,
+    max_batch=int(os.environ.get('CHAT_WRITE_BATCH_SIZE', 500)),
+    flush_interval=float(os.environ.get('CHAT_WRITE_FLUSH_INTERVAL', 0.25)),
+    max_buffer=int(os.environ.get('CHAT_WRITE_MAX_BUFFER', 10000)),
+)
+
+# Post-upload processing (image conversion, CV text extraction) runs as
+# durable background jobs so uploads return as soon as the bytes are stored
+job_queue = JobQueue(
+    None,
+    workers=int(os.environ.get('JOB_WORKERS', 4)),
+    visibility_timeout=float(os.environ.get('JOB_VISIBILITY_TIMEOUT', 60)),
+    max_attempts=int(os.environ.get('JOB_MAX_ATTEMPTS', 5)),
+    pin_timeout=float(os.environ.get('JOB_PIN_TIMEOUT', 600)),
+)
+cv_indexer = CvTextIndexer(None, None, cv_text_pool, job_queue)
+
+# Rendered responses of the admin list endpoints, invalidated by their write
+# handlers. Use the redis backend when running several workers so a write
+# in one invalidates all of them.
+response_cache = create_response_cache(
+    os.environ.get('RESPONSE_CACHE_BACKEND', 'memory'),
+    ttl=float(os.environ.get('RESPONSE_CACHE_TTL', 60)),
+    max_entries=int(os.environ.get('RESPONSE_CACHE_SIZE', 1000)),
+    redis_url=os.environ.get('REDIS_URL', 'redis://localhost:6379/0'),
+)
+# Per-client token buckets (keyed by IP): chat frames, upload bytes and API
+# reads each have their own budget
+rate_limiter = create_rate_limiter(
+    os.environ.get('RATE_LIMIT_BACKEND', 'memory'),
+    [
+        Policy("chat", rate=float(os.environ.get('RATE_LIMIT_CHAT_RATE', 5)),
+               burst=float(os.environ.get('RATE_LIMIT_CHAT_BURST', 20))),
+        Policy("upload", rate=float(os.environ.get('RATE_LIMIT_UPLOAD_BYTES_RATE', 1024 * 1024)),
+               burst=float(os.environ.get('RATE_LIMIT_UPLOAD_BYTES_BURST', 50 * 1024 * 1024))),
+        Policy("read", rate=float(os.environ.get('RATE_LIMIT_READ_RATE', 20)),
+               burst=float(os.environ.get('RATE_LIMIT_READ_BURST', 100))),
+    ],
+    redis_url=os.environ.get('REDIS_URL', 'redis://localhost:6379/0'),
+)
+# Uploads, imports and searches beyond this many at once (per process) wait briefly, then get 503
+expensive_requests = ConcurrencyCap(
+    max_concurrency=int(os.environ.get('EXPENSIVE_MAX_CONCURRENCY', 8)),
+    queue_timeout=float(os.environ.get('EXPENSIVE_QUEUE_TIMEOUT', 2.0)),
+)
+rate_limit_rules = [
+    Rule("GET", "/api/health", None),
+    Rule("GET", "/api/ready", None),
+    # Oversized uploads are refused from Content-Length, before the multipart body is spooled
+    Rule("POST", "/api/upload/cv", "upload", cost="content-length", expensive=True,
+         max_bytes=CV_MAX_BYTES + MULTIPART_OVERHEAD),
+    Rule("POST", "/api/upload/image", "upload", cost="content-length", expensive=True,
+         max_bytes=IMAGE_MAX_BYTES + MULTIPART_OVERHEAD),
+    Rule("POST", "/api/upload/", "upload", cost="content-length", expensive=True),
+    Rule("POST", "/api/job-applications/bulk", "upload", cost="content-length", expensive=True),
+    Rule("POST", "/api/chat/message", "chat"),
+    Rule("GET", "/api/job-applications/search", "read", expensive=True),
+    Rule("GET", "/api/uploads/search", "read", expensive=True),
+    Rule("GET", "/api/", "read"),
+]
+
+STATUS_CACHE, UPLOADS_CACHE, JOB_APPLICATIONS_CACHE = "status", "uploads", "job-applications"
+
+def page_cache_key(limit: int, cursor: Optional[str]) -> str:
+    return f"{limit}:{cursor or ''}"
+
+def bind_database(database):
+    """Point the app and its Mongo-backed helpers at ``database``.
+
+    Called from the lifespan handler; benchmarks call it before startup to
+    substitute their own database, and the lifespan then leaves it alone.
+    """
+    global db
+    db = database
+    cv_blobs.collection = database.blobs
+    image_blobs.collection = database.blobs
+    chat_writer.collection = database.chat_messages
+    cv_indexer.files = database.uploaded_files
+    cv_indexer.texts = database.cv_texts
+    job_queue.collection = database.jobs
+    job_search.collection = database.job_applications
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    for directory in (images_dir, uploads_dir, incoming_dir):
+        directory.mkdir(parents=True, exist_ok=True)
+    derivative_cache.load()
+    reachable = True
+    if db is None:
+        reachable = await mongo.connect(startup_timeout=float(os.environ.get('MONGO_STARTUP_TIMEOUT', 10)))
+        bind_database(mongo.db)
+    preparing = None
+    if reachable:
+        await prepare_database()
+    else:
+        # Serve degraded now rather than wait out a server selection timeout
+        # per index; the database is prepared once Mongo answers
+        preparing = asyncio.create_task(prepare_database_when_reachable())
+    await broadcaster.start()
+    await chat_writer.start()
+    try:
+        yield
+    finally:
+        if preparing is not None:
+            preparing.cancel()
+            await asyncio.gather(preparing, return_exceptions=True)
+        await broadcaster.stop()
+        await response_cache.stop()
+        await rate_limiter.stop()
+        await close_clients()
+        await chat_writer.close()
+        await cv_indexer.stop()
+        await job_queue.stop()
+        cv_text_pool.shutdown()
+        image_pool.shutdown()
+        mongo.close()
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
 # Mount static files
-app.mount("/images", StaticFiles(directory=str(images_dir)), name="images")
-app.mount("/uploads", StaticFiles(directory=str(uploads_dir)), name="uploads")
+# Content-addressed files (<sha256>.<ext>) are cached for a year; anything else
+# revalidates against its content ETag. CVs live under /uploads, so keep them
+# out of shared caches.
+static_etags = ContentETags()
+app.mount("/images", CachedStaticFiles(directory=str(images_dir), check_dir=False, etags=static_etags), name="images")
+app.mount("/uploads", CachedStaticFiles(directory=str(uploads_dir), check_dir=False, public=False,
+                                            etags=static_etags),
+          name="uploads")
 
 # WebSocket connection manager for real-time chat
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+manager = ConnectionManager(
+    max_queue=int(os.environ.get('CHAT_SEND_QUEUE_SIZE', 256)),
+    send_timeout=float(os.environ.get('CHAT_SEND_TIMEOUT', 5.0)),
+    flush_window=float(os.environ.get('CHAT_FLUSH_WINDOW', 0.01)),
+    max_batch=int(os.environ.get('CHAT_MAX_BATCH', 100)),
+)
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+# Chat rooms: /ws/chat joins the default room, /ws/chat/{room} any other. Admin
+# sockets (only when CHAT_ADMIN_TOKEN is set) can follow several rooms at once.
+DEFAULT_CHAT_ROOM = os.environ.get('CHAT_DEFAULT_ROOM', 'general')
+CHAT_ROOM_PATTERN = r"^[A-Za-z0-9_-]{1,64}$"
+CHAT_ADMIN_TOKEN = os.environ.get('CHAT_ADMIN_TOKEN')
+# Close code for a rejected socket (bad room name or admin token)
+POLICY_VIOLATION_CLOSE_CODE = 1008
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+def valid_chat_room(room) -> bool:
+    return isinstance(room, str) and re.fullmatch(CHAT_ROOM_PATTERN, room) is not None
 
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
+def chat_room_query(room: str) -> dict:
+    # Messages stored before rooms existed have no room and belong to the default one
+    if room == DEFAULT_CHAT_ROOM:
+        return {"room": {"$in": [room, None]}}
+    return {"room": room}
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
+# Recent chat messages served without a database round trip
+chat_history = ChatHistoryCache(
+    capacity=int(os.environ.get('CHAT_HISTORY_CACHE_SIZE', 1000)), default_room=DEFAULT_CHAT_ROOM
+)
 
-manager = ConnectionManager()
+async def deliver_chat_message(message: str):
+    """Hand a published chat message to the history cache and local sockets"""
+    try:
+        chat_message = ChatMessage.parse_raw(message).dict()
+        chat_history.add(chat_message)
+    except ValueError:
+        logger.warning("Ignoring malformed chat message from broadcast backend")
+        return
+    with BROADCAST_DURATION.time():
+        await manager.send_to_room(chat_message["room"], message)
+
+# Carries chat frames between workers/nodes; each one fans out to its own sockets
+broadcaster = create_broadcast_backend(
+    os.environ.get('CHAT_BROADCAST_BACKEND', 'memory'),
+    deliver_chat_message,
+    redis_url=os.environ.get('REDIS_URL', 'redis://localhost:6379/0'),
+)
 
 # Define Models
 class StatusCheck(BaseModel):
@@ -73,13 +311,16 @@ class ChatMessage(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_name: str
     message: str
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    # Stamped at Mongo's precision so sockets, the history cache and the DB agree
+    timestamp: datetime = Field(default_factory=lambda: mongo_datetime(datetime.utcnow()))
     message_type: str = "user"  # "user" or "admin"
+    room: str = Field(DEFAULT_CHAT_ROOM, pattern=CHAT_ROOM_PATTERN)
 
 class ChatMessageCreate(BaseModel):
     user_name: str
     message: str
     message_type: str = "user"
+    room: str = Field(DEFAULT_CHAT_ROOM, pattern=CHAT_ROOM_PATTERN)
 
 class UploadedFile(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -89,8 +330,30 @@ class UploadedFile(BaseModel):
     file_size: int
     file_type: str
     uploaded_by: str
+    sha256: Optional[str] = None
+    blob_id: Optional[str] = None
     upload_timestamp: datetime = Field(default_factory=datetime.utcnow)
 
+class Job(BaseModel):
+    id: str
+    type: str
+    status: str  # queued, running, done, failed
+    attempts: int
+    max_attempts: int
+    error: Optional[str] = None
+    result: Optional[dict] = None
+    created_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
+
+class CvText(BaseModel):
+    file_id: str
+    status: str  # pending, done, unsupported, failed
+    sha256: Optional[str] = None
+    text: str = ""
+    error: Optional[str] = None
+    extracted_at: Optional[datetime] = None
+
 class JobApplication(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     # Personal Information
@@ -121,23 +384,106 @@ class JobApplication(BaseModel):
     submitted_at: datetime = Field(default_factory=datetime.utcnow)
     status: str = "pending"  # pending, reviewing, approved, rejected
 
-# Chat WebSocket endpoint
-@app.websocket("/ws/chat")
-async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+# Read paths serve projected documents directly instead of rebuilding models
+status_check_reads = ReadModel(StatusCheck)
+chat_message_reads = ReadModel(ChatMessage)
+uploaded_file_reads = ReadModel(UploadedFile)
+job_application_reads = ReadModel(JobApplication)
+
+class FacetCount(BaseModel):
+    value: str
+    count: int
+
+class JobApplicationSearchResults(BaseModel):
+    results: List[JobApplication]
+    facets: Optional[Dict[str, List[FacetCount]]] = None
+
+# Job application search: Mongo text/compound indexes, or an in-process
+# inverted index where text search is unavailable (single worker only)
+job_search = create_job_search(
+    os.environ.get('JOB_SEARCH_BACKEND', 'mongo'), None, job_application_reads.projection
+)
+
+def page_headers(next_cursor: Optional[str]) -> dict:
+    return {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+
+# Chat WebSocket endpoints
+async def serve_chat_socket(websocket: WebSocket, rooms: List[str], admin: bool = False):
+    """Relay a socket's chat frames into its room until it disconnects.
+
+    A member socket always posts to the room it joined. An admin socket
+    names the room on each frame, which must be one it follows, and can send
+    ``{"action": "subscribe" | "unsubscribe", "room": ...}`` to change rooms.
+
+    Frames may be JSON text or MessagePack binary. Outbound framing is
+    negotiated per socket; see ``chat_protocol.negotiate``.
+    """
+    protocol, subprotocol = negotiate(websocket)
+    await manager.connect(websocket, rooms, protocol, subprotocol)
+    WEBSOCKET_CONNECTIONS.inc()
+    client_host = websocket.client.host if websocket.client else None
     try:
         while True:
-            data = await websocket.receive_text()
-            message_data = json.loads(data)
+            message_data = await receive_frame(websocket)
+            
+            if admin:
+                action = message_data.get("action")
+                room = message_data.get("room")
+                if action in ("subscribe", "unsubscribe"):
+                    if valid_chat_room(room):
+                        if action == "subscribe":
+                            manager.subscribe(websocket, room)
+                        else:
+                            manager.unsubscribe(websocket, room)
+                    await manager.send_personal_message(
+                        json.dumps({"rooms": sorted(manager.rooms_of(websocket))}), websocket
+                    )
+                    continue
+                if room not in manager.rooms_of(websocket):
+                    await manager.send_personal_message(
+                        json.dumps({"error": f"Not subscribed to room {room!r}"}), websocket
+                    )
+                    continue
+                message_data["message_type"] = "admin"
+            else:
+                message_data["room"] = rooms[0]
+            # The server stamps every message; client-chosen ids and times are ignored
+            message_data.pop("id", None)
+            message_data.pop("timestamp", None)
             
-            # Save message to database
             chat_message = ChatMessage(**message_data)
-            await db.chat_messages.insert_one(chat_message.dict())
+            # Over budget: stop reading this socket until the bucket refills
+            await rate_limiter.throttle("chat", client_key(client_host))
             
-            # Broadcast to all connected clients
-            await manager.broadcast(data)
+            # Deliver to the room's members on every worker
+            await broadcaster.publish(chat_message.json())
+            
+            # Save message to database
+            chat_writer.add(chat_message.dict())
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket)
+        WEBSOCKET_CONNECTIONS.dec()
+
+@app.websocket("/ws/chat")
+async def websocket_endpoint(websocket: WebSocket):
+    await serve_chat_socket(websocket, [DEFAULT_CHAT_ROOM])
+
+@app.websocket("/ws/chat/{room}")
+async def websocket_room_endpoint(websocket: WebSocket, room: str):
+    if not valid_chat_room(room):
+        await websocket.close(code=POLICY_VIOLATION_CLOSE_CODE)
+        return
+    await serve_chat_socket(websocket, [room])
+
+@app.websocket("/ws/admin/chat")
+async def websocket_admin_endpoint(websocket: WebSocket, token: str = "", room: List[str] = Query([])):
+    """Admin socket following every ``room`` given (repeat the parameter for several)"""
+    if not CHAT_ADMIN_TOKEN or not hmac.compare_digest(token.encode(), CHAT_ADMIN_TOKEN.encode()):
+        await websocket.close(code=POLICY_VIOLATION_CLOSE_CODE)
+        return
+    await serve_chat_socket(websocket, [r for r in room if valid_chat_room(r)], admin=True)
 
 # API Routes
 @api_router.get("/")
@@ -149,27 +495,97 @@ async def create_status_check(input: StatusCheckCreate):
     status_dict = input.dict()
     status_obj = StatusCheck(**status_dict)
     _ = await db.status_checks.insert_one(status_obj.dict())
+    await response_cache.invalidate(STATUS_CACHE)
     return status_obj
 
 @api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+async def get_status_checks(limit: int = Query(1000, ge=1, le=1000), cursor: Optional[str] = None):
+    async def build():
+        status_checks, next_cursor = await fetch_page(
+            db.status_checks, "timestamp", limit, cursor, projection=status_check_reads.projection
+        )
+        return rows_response(status_checks, status_check_reads, headers=page_headers(next_cursor))
+    return await response_cache.get(STATUS_CACHE, page_cache_key(limit, cursor), build)
 
 # Chat API endpoints
 @api_router.post("/chat/message", response_model=ChatMessage)
 async def create_chat_message(message: ChatMessageCreate):
     chat_message = ChatMessage(**message.dict())
-    await db.chat_messages.insert_one(chat_message.dict())
+    await broadcaster.publish(chat_message.json())
+    chat_writer.add(chat_message.dict())
     return chat_message
 
 @api_router.get("/chat/messages", response_model=List[ChatMessage])
-async def get_chat_messages(limit: int = 50):
-    messages = await db.chat_messages.find().sort("timestamp", -1).limit(limit).to_list(limit)
-    return [ChatMessage(**msg) for msg in reversed(messages)]
+async def get_chat_messages(limit: int = Query(50, ge=1, le=1000), before: Optional[str] = None,
+                            since: Optional[datetime] = None, after_id: Optional[str] = None,
+                            room: str = Query(DEFAULT_CHAT_ROOM, pattern=CHAT_ROOM_PATTERN)):
+    """Chat messages of one room in chronological order.
+
+    By default the latest ``limit`` messages; pass X-Next-Cursor as ``before``
+    for older ones. Reconnecting clients pass ``after_id`` (or ``since``) to get
+    only the messages they missed, oldest first.
+    """
+    room_query = chat_room_query(room)
+    if after_id:
+        messages = chat_history.after_id(after_id, limit, room)
+        if messages is None:
+            anchor = await db.chat_messages.find_one({"id": after_id}, {"_id": 0, "id": 1, "timestamp": 1})
+            if not anchor:
+                raise HTTPException(status_code=404, detail="Message not found")
+            messages, _ = await fetch_page(
+                db.chat_messages, "timestamp", limit, encode_cursor(anchor["timestamp"], anchor["id"]),
+                direction=ASCENDING, query=room_query, projection=chat_message_reads.projection
+            )
+        return rows_response(messages, chat_message_reads)
+
+    if since:
+        since = naive_utc(since)
+        messages = chat_history.since(since, limit, room)
+        if messages is None:
+            messages, _ = await fetch_page(
+                db.chat_messages, "timestamp", limit, direction=ASCENDING,
+                query={"timestamp": {"$gt": since}, **room_query}, projection=chat_message_reads.projection
+            )
+        return rows_response(messages, chat_message_reads)
+
+    if not before:
+        # One extra tells whether there are older messages to page to
+        messages = chat_history.latest(limit + 1, room)
+        if messages is not None:
+            next_cursor = None
+            if len(messages) > limit:
+                messages = messages[1:]
+                next_cursor = encode_cursor(messages[0]["timestamp"], messages[0]["id"])
+            return rows_response(messages, chat_message_reads, headers=page_headers(next_cursor))
+
+    messages, next_cursor = await fetch_page(
+        db.chat_messages, "timestamp", limit, before, query=room_query, projection=chat_message_reads.projection
+    )
+    return rows_response(reversed(messages), chat_message_reads, headers=page_headers(next_cursor))
 
 # File Upload API endpoints
-@api_router.post("/upload/cv")
+async def stream_upload_to_disk(file: UploadFile, file_path: Path, max_bytes: int):
+    """Copy an upload to disk in fixed-size chunks, returning (size, sha256)"""
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {max_bytes} bytes.")
+
+    sha256 = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(file_path, 'wb') as f:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {max_bytes} bytes.")
+                sha256.update(chunk)
+                await f.write(chunk)
+    except BaseException:
+        # Never leave a partial file behind
+        file_path.unlink(missing_ok=True)
+        raise
+    return size, sha256.hexdigest()
+
+@api_router.post("/upload/cv", status_code=202)
 async def upload_cv(file: UploadFile = File(...), uploaded_by: str = "anonymous"):
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file provided")
@@ -182,42 +598,93 @@ async def upload_cv(file: UploadFile = File(...), uploaded_by: str = "anonymous"
     if file.content_type not in allowed_types:
         raise HTTPException(status_code=400, detail="File type not allowed. Please upload PDF, DOC, DOCX, or TXT files.")
     
-    # Generate unique filename
-    file_extension = file.filename.split('.')[-1] if '.' in file.filename else 'txt'
-    unique_filename = f"{uuid.uuid4()}.{file_extension}"
-    file_path = uploads_dir / unique_filename
+    file_extension = file.filename.rsplit('.', 1)[-1].lower() if '.' in file.filename else 'txt'
+    if not file_extension.isalnum():
+        file_extension = 'txt'
     
-    # Save file
-    async with aiofiles.open(file_path, 'wb') as f:
-        content = await file.read()
-        await f.write(content)
+    # Stream file to a scratch name, then file it under its content hash
+    tmp_path = incoming_dir / f"{uuid.uuid4()}.part"
+    file_size, sha256 = await stream_upload_to_disk(file, tmp_path, CV_MAX_BYTES)
+    UPLOAD_BYTES.labels("cv").inc(file_size)
+    blob = await cv_blobs.adopt(tmp_path, sha256, file_extension, file.content_type)
     
     # Save file info to database
     uploaded_file = UploadedFile(
         original_name=file.filename,
-        saved_name=unique_filename,
-        file_path=str(file_path),
-        file_size=len(content),
+        saved_name=blob["saved_name"],
+        file_path=blob["file_path"],
+        file_size=file_size,
         file_type=file.content_type,
-        uploaded_by=uploaded_by
+        uploaded_by=uploaded_by,
+        sha256=sha256,
+        blob_id=blob["_id"]
     )
     
-    await db.uploaded_files.insert_one(uploaded_file.dict())
+    try:
+        await db.uploaded_files.insert_one(uploaded_file.dict())
+    except BaseException:
+        # Nothing points at the reference we just took; give it back
+        await cv_blobs.release(sha256)
+        raise
+    await response_cache.invalidate(UPLOADS_CACHE)
+    job = await cv_indexer.submit(uploaded_file.dict())
     
     return {
         "message": "CV uploaded successfully",
         "file_id": uploaded_file.id,
         "original_name": uploaded_file.original_name,
-        "file_size": uploaded_file.file_size
+        "file_size": uploaded_file.file_size,
+        "sha256": uploaded_file.sha256,
+        "job_id": job["id"],
+        "status_url": f"/api/jobs/{job['id']}"
     }
 
+@api_router.delete("/upload/cv/{file_id}")
+async def delete_uploaded_cv(file_id: str):
+    """Delete an uploaded CV; its bytes and text go once no other upload shares them"""
+    uploaded_file = await db.uploaded_files.find_one_and_delete({"id": file_id}, {"_id": 0, "sha256": 1})
+    if not uploaded_file:
+        raise HTTPException(status_code=404, detail="File not found")
+    await response_cache.invalidate(UPLOADS_CACHE)
+    sha256 = uploaded_file.get("sha256")
+    if sha256 and await cv_blobs.release(sha256):
+        await db.cv_texts.delete_one({"_id": sha256})
+    return {"message": "CV deleted", "file_id": file_id}
+
+@api_router.get("/uploads/search", response_model=List[UploadedFile])
+async def search_uploaded_cvs(q: str, limit: int = Query(50, ge=1, le=500)):
+    """Uploaded CVs whose extracted text contains every word of ``q``"""
+    words = tokenize(q)
+    if not words:
+        raise HTTPException(status_code=400, detail="Query has no searchable words")
+    texts = await db.cv_texts.find({"tokens": {"$all": words}, "status": "done"}, {"_id": 1}).to_list(limit)
+    files = await db.uploaded_files.find(
+        {"sha256": {"$in": [text["_id"] for text in texts]}}, uploaded_file_reads.projection
+    ).limit(limit).to_list(limit)
+    return rows_response(files, uploaded_file_reads)
+
+@api_router.get("/uploads/{file_id}/text", response_model=CvText)
+async def get_uploaded_cv_text(file_id: str):
+    """Text extracted from one uploaded CV"""
+    uploaded_file = await db.uploaded_files.find_one({"id": file_id}, {"_id": 0, "sha256": 1})
+    if not uploaded_file:
+        raise HTTPException(status_code=404, detail="File not found")
+    text = await db.cv_texts.find_one({"_id": uploaded_file.get("sha256")}, {"_id": 0, "tokens": 0})
+    if not text:
+        return CvText(file_id=file_id, status="pending")
+    return CvText(file_id=file_id, **text)
+
 @api_router.get("/uploads", response_model=List[UploadedFile])
-async def get_uploaded_files():
-    files = await db.uploaded_files.find().sort("upload_timestamp", -1).to_list(100)
-    return [UploadedFile(**file) for file in files]
+async def get_uploaded_files(limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = None):
+    async def build():
+        files, next_cursor = await fetch_page(
+            db.uploaded_files, "upload_timestamp", limit, cursor, projection=uploaded_file_reads.projection
+        )
+        return rows_response(files, uploaded_file_reads, headers=page_headers(next_cursor))
+    return await response_cache.get(UPLOADS_CACHE, page_cache_key(limit, cursor), build)
 
 @api_router.post("/upload/image")
-async def upload_image(file: UploadFile = File(...)):
+async def upload_image(file: UploadFile = File(...), uploaded_by: str = "anonymous"):
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file provided")
     
@@ -227,26 +694,215 @@ async def upload_image(file: UploadFile = File(...)):
     if file.content_type not in allowed_types:
         raise HTTPException(status_code=400, detail="File type not allowed. Please upload image files.")
     
-    # Read and process image
-    content = await file.read()
-    
-    # Convert to JPEG format
-    image = Image.open(io.BytesIO(content))
-    if image.mode in ("RGBA", "P"):
-        image = image.convert("RGB")
-    
-    # Generate unique filename
-    unique_filename = f"{uuid.uuid4()}.jpeg"
-    file_path = images_dir / unique_filename
+    # Stream the image to disk and check its header; decoding and re-encoding happen in a job
+    source_path = incoming_dir / f"{uuid.uuid4()}.src"
+    file_size, sha256 = await stream_upload_to_disk(file, source_path, IMAGE_MAX_BYTES)
+    UPLOAD_BYTES.labels("image").inc(file_size)
+    try:
+        probe_image(str(source_path), IMAGE_MAX_PIXELS)
+    except (UnidentifiedImageError, ImageTooLarge) as e:
+        source_path.unlink(missing_ok=True)
+        if isinstance(e, ImageTooLarge):
+            raise HTTPException(status_code=413, detail=str(e))
+        raise HTTPException(status_code=400, detail="Invalid image file")
+    uploaded_image = {"id": str(uuid.uuid4()), "original_name": file.filename, "uploaded_by": uploaded_by}
     
-    # Save as JPEG
-    image.save(file_path, "JPEG", quality=90, optimize=True)
+    # The JPEG is keyed by the source bytes, so a repeat upload skips re-encoding
+    blob = await image_blobs.acquire_existing(sha256)
+    if blob is not None:
+        source_path.unlink(missing_ok=True)
+        await record_uploaded_image(uploaded_image, sha256, blob)
+        return {
+            "message": "Image uploaded and converted to JPEG successfully",
+            "file_id": uploaded_image["id"],
+            "filename": blob["saved_name"],
+            "url": f"/images/{blob['saved_name']}"
+        }
     
-    return {
-        "message": "Image uploaded and converted to JPEG successfully",
-        "filename": unique_filename,
-        "url": f"/images/{unique_filename}"
+    # The source is on this node's disk, so the job is pinned to this node
+    job = await job_queue.enqueue("image.convert", {
+        "source_path": str(source_path), "sha256": sha256, "image": uploaded_image,
+    }, local=True)
+    saved_name = f"{sha256}.jpeg"
+    return JSONResponse(status_code=202, content={
+        "message": "Image uploaded, converting to JPEG",
+        "file_id": uploaded_image["id"],
+        "filename": saved_name,
+        "url": f"/images/{saved_name}",
+        "job_id": job["id"],
+        "status_url": f"/api/jobs/{job['id']}"
+    })
+
+@api_router.delete("/upload/image/{file_id}")
+async def delete_uploaded_image(file_id: str):
+    """Delete an uploaded image; the stored JPEG goes once no other upload shares it"""
+    uploaded_image = await db.uploaded_images.find_one_and_delete({"id": file_id}, {"_id": 0, "sha256": 1})
+    if not uploaded_image:
+        raise HTTPException(status_code=404, detail="Image not found")
+    if uploaded_image.get("sha256"):
+        await image_blobs.release(uploaded_image["sha256"])
+    return {"message": "Image deleted", "file_id": file_id}
+
+async def record_uploaded_image(image: dict, sha256: str, blob: dict):
+    """Record an upload that holds a reference on ``blob``, releasing it if not recorded"""
+    uploaded_image = UploadedFile(
+        **image,
+        saved_name=blob["saved_name"],
+        file_path=blob["file_path"],
+        file_size=blob["file_size"],
+        file_type="image/jpeg",
+        sha256=sha256,
+        blob_id=blob["_id"]
+    )
+    # Upsert by id so a retried job never records the same upload twice
+    try:
+        result = await db.uploaded_images.update_one(
+            {"id": uploaded_image.id}, {"$setOnInsert": uploaded_image.dict()}, upsert=True
+        )
+    except BaseException:
+        await image_blobs.release(sha256)
+        raise
+    if result.upserted_id is None:
+        # Recorded by an earlier attempt, which kept its own reference
+        await image_blobs.release(sha256)
+
+@job_queue.handler("image.convert")
+async def convert_uploaded_image(payload: dict):
+    """Convert an uploaded image to the stored JPEG and record the upload"""
+    sha256 = payload["sha256"]
+    source_path = Path(payload["source_path"])
+    blob = await image_blobs.acquire_existing(sha256)
+    if blob is None:
+        if not source_path.exists():
+            # E.g. claimed elsewhere after the node that received the upload went away
+            raise PermanentJobError(f"Uploaded source {source_path.name} is gone")
+        tmp_path = incoming_dir / f"{uuid.uuid4()}.part"
+        try:
+            await image_pool.run(convert_upload_to_jpeg, str(source_path), str(tmp_path), 90,
+                                 IMAGE_MAX_PIXELS, IMAGE_MAX_DIMENSION)
+        except PoolRestarted:
+            # The source itself may have killed the worker, so this uses up an attempt
+            tmp_path.unlink(missing_ok=True)
+            raise
+        except PoolSaturated as e:
+            raise RetryLater(e.retry_after)
+        except (UnidentifiedImageError, ImageTooLarge) as e:
+            source_path.unlink(missing_ok=True)
+            tmp_path.unlink(missing_ok=True)
+            raise PermanentJobError(str(e) if isinstance(e, ImageTooLarge) else "Invalid image file")
+        except Exception:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        blob = await image_blobs.adopt(tmp_path, sha256, "jpeg", "image/jpeg")
+    await record_uploaded_image(payload["image"], sha256, blob)
+    source_path.unlink(missing_ok=True)
+    return {"file_id": payload["image"]["id"], "url": f"/images/{blob['saved_name']}"}
+
+@api_router.get("/images/{filename}")
+async def get_image_derivative(request: Request, filename: str, w: Optional[int] = None,
+                               q: int = 80, format: Optional[str] = None):
+    """Serve a resized, re-encoded copy of an image from /images"""
+    source_path = (images_dir / filename).resolve()
+    if source_path.parent != images_dir.resolve() or not source_path.is_file():
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    if not 1 <= q <= 95:
+        raise HTTPException(status_code=400, detail="Quality must be between 1 and 95")
+    if w is not None and w <= 0:
+        raise HTTPException(status_code=400, detail="Width must be positive")
+
+    if format:
+        fmt = format.upper().replace("JPG", "JPEG")
+        if fmt not in image_output_formats:
+            raise HTTPException(status_code=400, detail=f"Unsupported image format: {format}")
+    else:
+        # Pick the smallest encoding the browser advertises
+        accept = request.headers.get("accept", "")
+        fmt = "JPEG"
+        for candidate in ("AVIF", "WEBP"):
+            if candidate in image_output_formats and FORMAT_MEDIA_TYPES[candidate] in accept:
+                fmt = candidate
+                break
+
+    width = snap_width(w) if w else None
+    try:
+        path = await derivative_cache.get_or_render(
+            source_path, width, q, fmt,
+            lambda *args: image_pool.run(render_derivative, *args, IMAGE_MAX_PIXELS),
+        )
+    except PoolSaturated as e:
+        raise HTTPException(status_code=503, detail="Image processing is busy, please retry",
+                            headers={"Retry-After": str(e.retry_after)})
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return FileResponse(
+        path,
+        media_type=FORMAT_MEDIA_TYPES[fmt],
+        headers={"Cache-Control": "public, max-age=86400", "Vary": "Accept"},
+    )
+
+def directory_writable(directory: Path) -> Optional[str]:
+    """None if a file can be created in ``directory``, else the reason it cannot"""
+    try:
+        with tempfile.NamedTemporaryFile(dir=directory, prefix=".ready-"):
+            return None
+    except OSError as e:
+        return str(e)
+
+@api_router.get("/health")
+async def health():
+    """Liveness: the process is up and serving requests"""
+    return {"status": "ok"}
+
+@api_router.get("/ready")
+async def readiness():
+    """Ready to serve: MongoDB answers a ping quickly, its startup work is
+    done and the storage directories are writable. Includes the Mongo pool state"""
+    mongo_health, *directory_errors = await asyncio.gather(
+        mongo.health(timeout=float(os.environ.get('MONGO_READY_TIMEOUT', 1.0))),
+        *(run_in_threadpool(directory_writable, d) for d in (images_dir, uploads_dir, incoming_dir)),
+    )
+    directories = {
+        name: {"ok": error is None, "error": error}
+        for name, error in zip(("images", "uploads", "incoming"), directory_errors)
     }
+    ready = mongo_health["ok"] and database_prepared and all(d["ok"] for d in directories.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "unavailable", "mongo": mongo_health,
+                 "database_prepared": database_prepared, "directories": directories},
+    )
+
+@api_router.get("/metrics/image-pool")
+async def get_image_pool_stats():
+    """Queue depth, queue wait and processing times for the image pool"""
+    return image_pool.stats()
+
+@api_router.get("/jobs/{job_id}", response_model=Job)
+async def get_job(job_id: str):
+    """Status of a background job, e.g. the conversion queued by an upload"""
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@api_router.get("/metrics/response-cache")
+async def get_response_cache_stats():
+    return response_cache.stats()
+
+@api_router.get("/metrics/rate-limits")
+async def get_rate_limit_stats():
+    return {**rate_limiter.stats(), "expensive_requests": expensive_requests.stats()}
+
+@api_router.get("/metrics/jobs")
+async def get_job_stats():
+    """Background job counts by status, and this worker's totals"""
+    return {"counts": await job_queue.counts(), **job_queue.stats()}
+
+@api_router.get("/metrics/cv-text")
+async def get_cv_text_stats():
+    """CV text extraction backlog and worker pool timings"""
+    return {**cv_indexer.stats(), "pool": cv_text_pool.stats()}
 
 # Job Application API endpoints
 @api_router.post("/job-applications", response_model=JobApplication)
@@ -254,31 +910,83 @@ async def submit_job_application(application: JobApplication):
     """Submit a new job application"""
     application_dict = application.dict()
     await db.job_applications.insert_one(application_dict)
+    await response_cache.invalidate(JOB_APPLICATIONS_CACHE)
+    job_search.add(application_dict)
     return application
 
+@api_router.post("/job-applications/bulk")
+async def submit_job_applications_bulk(request: Request):
+    """Import many job applications from a JSON array or an NDJSON stream.
+
+    Returns a per-record status (inserted, duplicate, invalid or failed) in
+    input order. Records are written unordered, so one bad record never
+    blocks the rest.
+    """
+    summary = BulkIngestSummary()
+    records = read_records(request, BULK_MAX_RECORDS, BULK_MAX_BYTES, summary)
+    await ingest(records, JobApplication, db.job_applications, summary, chunk_size=BULK_CHUNK_SIZE,
+                 on_insert=job_search.add)
+    if summary.counts["inserted"]:
+        await response_cache.invalidate(JOB_APPLICATIONS_CACHE)
+    return ORJSONRowsResponse(summary.as_dict())
+
 @api_router.get("/job-applications", response_model=List[JobApplication])
-async def get_job_applications():
-    """Get all job applications (admin endpoint)"""
-    applications = await db.job_applications.find().sort("submitted_at", -1).to_list(100)
-    return [JobApplication(**app) for app in applications]
+async def get_job_applications(limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = None):
+    """Get all job applications (admin endpoint), newest first, paged by cursor"""
+    async def build():
+        applications, next_cursor = await fetch_page(
+            db.job_applications, "submitted_at", limit, cursor, projection=job_application_reads.projection
+        )
+        return rows_response(applications, job_application_reads, headers=page_headers(next_cursor))
+    return await response_cache.get(JOB_APPLICATIONS_CACHE, page_cache_key(limit, cursor), build)
+
+@api_router.get("/job-applications/search", response_model=JobApplicationSearchResults)
+async def search_job_applications(
+    q: str = "",
+    position: List[str] = Query([]),
+    skill: List[str] = Query([]),
+    status: List[str] = Query([]),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    facets: bool = True,
+):
+    """Search applications by free text, position, skills and status, newest first.
+
+    Repeat a filter to match any of its values (``skill=React&skill=Vue``).
+    Facet counts cover the whole result set; pass ``facets=false`` when
+    fetching later pages.
+    """
+    applications, next_cursor, facet_counts = await job_search.search(
+        q, position, skill, status, limit=limit, cursor=cursor, facets=facets
+    )
+    return ORJSONRowsResponse(
+        {"results": [job_application_reads.fill(row) for row in applications], "facets": facet_counts},
+        headers=page_headers(next_cursor),
+    )
 
 @api_router.get("/job-applications/{application_id}", response_model=JobApplication)
 async def get_job_application(application_id: str):
     """Get a specific job application"""
-    application = await db.job_applications.find_one({"id": application_id})
+    application = await db.job_applications.find_one({"id": application_id}, job_application_reads.projection)
     if not application:
         raise HTTPException(status_code=404, detail="Application not found")
-    return JobApplication(**application)
+    return row_response(application, job_application_reads)
 
 # Include the router in the main app
 app.include_router(api_router)
 
+# Prometheus scrape endpoint (served on the backend port, not proxied under /api)
+app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter, rules=rate_limit_rules, cap=expensive_requests)
+app.add_middleware(PrometheusMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Configure logging
@@ -288,6 +996,38 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+async def create_indexes():
+    await ensure_indexes(db)
+    try:
+        # Per-room history pages
+        await db.chat_messages.create_index([("room", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)])
+    except Exception:
+        logger.exception("Could not create the chat room index")
+
+async def start_job_search():
+    try:
+        await job_search.start()
+    except Exception:
+        logger.exception("Could not build the job application search index")
+
+async def load_chat_history():
+    try:
+        await chat_history.load(db.chat_messages, chat_message_reads.projection)
+    except Exception:
+        logger.exception("Could not preload chat history; serving it from the database until it fills")
+
+async def prepare_database():
+    """Startup work that needs MongoDB: indexes, the search index, job
+    workers and the chat history preload"""
+    global database_prepared
+    await create_indexes()
+    await start_job_search()
+    await job_queue.start()
+    await cv_indexer.start()
+    await load_chat_history()
+    database_prepared = True
+
+async def prepare_database_when_reachable():
+    await mongo.wait_for_server()
+    logger.info("MongoDB is reachable, preparing the database")
+    await prepare_database()
@@ -0,0 +1,206 @@
+import calendar
+import hashlib
+import os
+import re
+from collections import OrderedDict
+from email.utils import formatdate, parsedate
+from mimetypes import guess_type
+from typing import Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+
+# Names produced by BlobStore: <sha256>.<ext>. Their bytes never change.
+CONTENT_ADDRESSED_NAME = re.compile(r"^[0-9a-f]{64}\.[A-Za-z0-9]+$")
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+class ContentETags:
+    """Strong ETags from file contents, hashed once per (path, mtime, size)"""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._etags: "OrderedDict[tuple, str]" = OrderedDict()
+
+    async def get(self, path: str, stat_result: os.stat_result) -> str:
+        name = os.path.basename(path)
+        if CONTENT_ADDRESSED_NAME.match(name):
+            # The name already is the content hash
+            return f'"{name.split(".", 1)[0]}"'
+
+        key = (path, stat_result.st_mtime_ns, stat_result.st_size)
+        etag = self._etags.get(key)
+        if etag is None:
+            etag = await anyio.to_thread.run_sync(self._hash, path)
+            self._etags[key] = etag
+            if len(self._etags) > self.max_entries:
+                self._etags.popitem(last=False)
+        else:
+            self._etags.move_to_end(key)
+        return etag
+
+    @staticmethod
+    def _hash(path: str) -> str:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(chunk)
+        return f'"{sha.hexdigest()[:32]}"'
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single ``bytes=`` range into inclusive (start, end).
+
+    Returns None when the header should be ignored (malformed or multiple
+    ranges; we serve the full file then), and (size, size) when the range
+    cannot be satisfied.
+    """
+    units, _, spec = header.partition("=")
+    if units.strip().lower() != "bytes" or "," in spec:
+        return None
+    start_text, _, end_text = spec.strip().partition("-")
+    try:
+        if not start_text:
+            suffix = int(end_text)
+            if suffix <= 0:
+                return (size, size)
+            return (max(size - suffix, 0), size - 1)
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        return (size, size)
+    if end < start:
+        return None
+    return (start, min(end, size - 1))
+
+
+def http_date_timestamp(value: str) -> Optional[int]:
+    """HTTP date to a POSIX timestamp, or None if it does not parse"""
+    parsed = parsedate(value)
+    if parsed is None:
+        return None
+    return calendar.timegm(parsed)
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison, as If-None-Match requires
+    return "*" in tags or etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+
+class CachedFileResponse(Response):
+    """File response with a content ETag, conditional GET and byte ranges"""
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, path: str, stat_result: os.stat_result, etags: ContentETags, cache_control: str):
+        self.path = path
+        self.stat_result = stat_result
+        self.etags = etags
+        self.cache_control = cache_control
+        self.status_code = 200
+        self.background = None
+        self.media_type = guess_type(path)[0] or "application/octet-stream"
+        self.init_headers()
+
+    async def __call__(self, scope, receive, send):
+        request_headers = Headers(scope=scope)
+        size = self.stat_result.st_size
+        last_modified = formatdate(self.stat_result.st_mtime, usegmt=True)
+        etag = await self.etags.get(self.path, self.stat_result)
+        headers = {
+            "etag": etag,
+            "last-modified": last_modified,
+            "cache-control": self.cache_control,
+            "accept-ranges": "bytes",
+        }
+
+        if self._not_modified(request_headers, etag):
+            await Response(status_code=304, headers=headers)(scope, receive, send)
+            return
+
+        byte_range = None
+        if "range" in request_headers and self._if_range_holds(request_headers, etag, last_modified):
+            byte_range = parse_range(request_headers["range"], size)
+
+        if byte_range is None:
+            await FileResponse(self.path, stat_result=self.stat_result, headers=headers,
+                               media_type=self.media_type)(scope, receive, send)
+            return
+
+        start, end = byte_range
+        if start >= size:
+            headers["content-range"] = f"bytes */{size}"
+            await Response(status_code=416, headers=headers)(scope, receive, send)
+            return
+
+        length = end - start + 1
+        headers.update({
+            "content-range": f"bytes {start}-{end}/{size}",
+            "content-length": str(length),
+            "content-type": self.media_type,
+        })
+        await send({
+            "type": "http.response.start",
+            "status": 206,
+            "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()],
+        })
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(start)
+            remaining = length
+            while remaining:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining:
+            # File shrank underneath us; end the body rather than hang the client
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    def _not_modified(self, request_headers: Headers, etag: str) -> bool:
+        # If-None-Match wins when both are sent
+        if "if-none-match" in request_headers:
+            return etag_matches(request_headers["if-none-match"], etag)
+        if "if-modified-since" in request_headers:
+            since = http_date_timestamp(request_headers["if-modified-since"])
+            return since is not None and int(self.stat_result.st_mtime) <= since
+        return False
+
+    @staticmethod
+    def _if_range_holds(request_headers: Headers, etag: str, last_modified: str) -> bool:
+        if_range = request_headers.get("if-range")
+        if if_range is None:
+            return True
+        if if_range.startswith('"'):
+            return if_range == etag
+        return if_range == last_modified
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles with strong content ETags, long-lived caching for
+    content-addressed names, 304s and Range support for resumable downloads.
+    """
+
+    def __init__(self, *args, public: bool = True, mutable_max_age: int = 3600, etags: ContentETags = None,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        scope = "public" if public else "private"
+        self.immutable_cache_control = f"{scope}, max-age={IMMUTABLE_MAX_AGE}, immutable"
+        self.mutable_cache_control = f"{scope}, max-age={mutable_max_age}, must-revalidate"
+        self.etags = etags or ContentETags()
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        if status_code != 200:
+            return super().file_response(full_path, stat_result, scope, status_code)
+        name = os.path.basename(full_path)
+        cache_control = (self.immutable_cache_control if CONTENT_ADDRESSED_NAME.match(name)
+                         else self.mutable_cache_control)
+        return CachedFileResponse(str(full_path), stat_result, self.etags, cache_control)
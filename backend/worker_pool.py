@@ -0,0 +1,158 @@
+import asyncio
+import math
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+
+class PoolSaturated(Exception):
+    """Raised when a worker pool already has as much work as it may queue"""
+
+    def __init__(self, pool: str, retry_after: int):
+        super().__init__(f"{pool} pool is saturated, retry after {retry_after}s")
+        self.pool = pool
+        self.retry_after = retry_after
+
+
+class PoolRestarted(PoolSaturated):
+    """Raised when a worker process died mid-job (e.g. OOM-killed on a large
+    decode); the pool is rebuilt on the next call"""
+
+    def __init__(self, pool: str, retry_after: int = 1):
+        super().__init__(pool, retry_after)
+        self.args = (f"{pool} pool lost a worker process, retry after {retry_after}s",)
+
+
+def _timed_call(fn, *args):
+    # Runs in the worker process; report when the job actually started so the
+    # parent can split queue wait from processing time.
+    started_at = time.time()
+    result = fn(*args)
+    return result, started_at, time.time()
+
+
+class TimingStats:
+    """Running count/total/max for one timing, in seconds"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        seconds = max(seconds, 0.0)
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def snapshot(self):
+        return {"count": self.count, "mean": round(self.mean, 6), "max": round(self.max, 6)}
+
+
+class WorkerPool:
+    """Bounded process pool for CPU-bound work with queue-depth backpressure.
+
+    ``name`` labels the pool in errors, stats and metrics.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, on_timing=None,
+                 max_tasks_per_child: Optional[int] = None):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        # Recycle workers after this many jobs so memory from large decodes goes back to the OS
+        self.max_tasks_per_child = max_tasks_per_child
+        # Optional callback(pool, operation, queue_wait, processing) for external metrics
+        self.on_timing = on_timing
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.restarts = 0
+        self.queue_wait = TimingStats()
+        self.processing = TimingStats()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Spawned workers only import what the job needs, never the app or its threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=self.max_tasks_per_child,
+            )
+        return self._executor
+
+    def retry_after(self) -> int:
+        """Rough seconds until a queue slot frees up"""
+        backlog = max(self.in_flight - self.max_workers + 1, 1)
+        return max(1, math.ceil(self.processing.mean * backlog / self.max_workers))
+
+    async def run(self, fn, *args):
+        """Run ``fn(*args)`` in a worker process, or raise PoolSaturated (or PoolRestarted)"""
+        if self.in_flight >= self.capacity:
+            self.rejected += 1
+            raise PoolSaturated(self.name, self.retry_after())
+
+        self.in_flight += 1
+        submitted_at = time.time()
+        executor = self._get_executor()
+        try:
+            loop = asyncio.get_running_loop()
+            result, started_at, finished_at = await loop.run_in_executor(
+                executor, _timed_call, fn, *args
+            )
+        except BrokenProcessPool:
+            self.failed += 1
+            self._discard(executor)
+            raise PoolRestarted(self.name)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+        self.completed += 1
+        queue_wait = max(started_at - submitted_at, 0.0)
+        processing = max(finished_at - started_at, 0.0)
+        self.queue_wait.observe(queue_wait)
+        self.processing.observe(processing)
+        if self.on_timing is not None:
+            self.on_timing(self.name, fn.__name__, queue_wait, processing)
+        return result
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "restarts": self.restarts,
+            "queue_wait_seconds": self.queue_wait.snapshot(),
+            "processing_seconds": self.processing.snapshot(),
+        }
+
+    def _discard(self, executor: ProcessPoolExecutor):
+        # Every job in flight on a broken executor fails; only the first replaces it
+        if self._executor is executor:
+            self.restarts += 1
+            self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+from collections import deque
+
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+
+class WriteBehindBuffer:
+    """Buffers documents and writes them with insert_many off the request path.
+
+    A batch is flushed once ``max_batch`` documents are waiting or every
+    ``flush_interval`` seconds. Failed batches are retried with backoff up to
+    ``max_retries`` times. At most ``max_buffer`` documents are held; past that
+    the oldest are dropped so a Mongo outage cannot exhaust memory.
+    """
+
+    def __init__(self, collection, max_batch: int = 500, flush_interval: float = 0.25,
+                 max_buffer: int = 10000, max_retries: int = 5):
+        self.collection = collection
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.max_retries = max_retries
+        self.written = 0
+        self.dropped = 0
+        self._buffer: deque = deque()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task = None
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def add(self, document: dict):
+        if len(self._buffer) >= self.max_buffer:
+            self._buffer.popleft()
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.error("Write-behind buffer for %s is full, %d documents dropped so far",
+                             self.collection.name, self.dropped)
+        self._buffer.append(document)
+        if len(self._buffer) >= self.max_batch:
+            self._wakeup.set()
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop the background flusher and write out whatever is left"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._buffer:
+            if not await self.flush():
+                logger.error("Discarding %d unwritten documents for %s at shutdown",
+                             len(self._buffer), self.collection.name)
+                self.dropped += len(self._buffer)
+                self._buffer.clear()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._buffer:
+                if not await self.flush():
+                    break
+                if len(self._buffer) < self.max_batch:
+                    break
+
+    async def flush(self) -> bool:
+        """Write one batch, retrying on failure. Returns False if it was given up on"""
+        batch = [self._buffer.popleft() for _ in range(min(self.max_batch, len(self._buffer)))]
+        if not batch:
+            return True
+
+        delay = 0.1
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                await self.collection.insert_many(batch, ordered=False)
+                self.written += len(batch)
+                return True
+            except BulkWriteError as e:
+                # insert_many stamps _id on each document, so rows that made it in
+                # on an earlier attempt come back as duplicate keys; skip those.
+                errors = e.details.get("writeErrors", [])
+                failed = {err["index"] for err in errors if err.get("code") != DUPLICATE_KEY}
+                self.written += len(batch) - len(failed)
+                if not failed:
+                    return True
+                batch = [doc for i, doc in enumerate(batch) if i in failed]
+                logger.warning("Write-behind insert into %s failed for %d documents (attempt %d)",
+                               self.collection.name, len(batch), attempt)
+            except PyMongoError:
+                logger.warning("Write-behind insert into %s failed (attempt %d)",
+                               self.collection.name, attempt, exc_info=True)
+            except asyncio.CancelledError:
+                # Shutting down mid-write: hand the batch back for close() to retry
+                self._buffer.extendleft(reversed(batch))
+                raise
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self._buffer.extendleft(reversed(batch))
+                raise
+            delay = min(delay * 2, 5.0)
+
+        logger.error("Giving up on %d documents for %s after %d attempts",
+                     len(batch), self.collection.name, self.max_retries)
+        self.dropped += len(batch)
+        return False
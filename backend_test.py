@@ -118,7 +118,7 @@ class HotBeansAPITester:
             "CV Upload",
             "POST",
             "api/upload/cv",
-            200,
+            202,
             data=data,
             files=files
         )
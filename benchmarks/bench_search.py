@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Time job-application search queries over a synthetic data set.
+
+By default this measures the in-process inverted index, with page documents
+served from a dict instead of Mongo. Pass --mongo-url to load the same data
+into a scratch database and time the Mongo text/facet backend instead:
+
+    python benchmarks/bench_search.py [--count 100000] [--mongo-url mongodb://localhost:27017]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from job_search import InMemoryJobSearch, MongoJobSearch  # noqa: E402
+
+POSITIONS = ["Web Developer", "Junior Web Developer", "UI/UX Designer", "Backend Developer",
+             "Frontend Developer", "Project Manager", "QA Engineer", "DevOps Engineer"]
+SKILLS = ["JavaScript", "React", "Vue", "Python", "FastAPI", "Django", "Node.js", "CSS", "Figma",
+          "Docker", "Kubernetes", "MongoDB", "PostgreSQL", "Go", "C#", "TypeScript"]
+WORDS = ("team coffee remote agile mentoring startup design accessibility performance testing "
+         "ecommerce cloud mobile open source community learning frontend backend data").split()
+STATUSES = ["pending", "reviewing", "approved", "rejected"]
+
+QUERIES = {
+    "latest": {},
+    "status": {"statuses": ["pending"]},
+    "position+skill": {"positions": ["Web Developer"], "skills": ["React", "Vue"]},
+    "text": {"q": "remote mentoring"},
+    "text+filters": {"q": "coffee", "skills": ["Python"], "statuses": ["approved"]},
+    "no matches": {"q": "zzzz"},
+}
+
+
+def make_documents(count: int):
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1)
+    return [{
+        "id": str(uuid.uuid4()),
+        "firstName": "Test",
+        "lastName": f"User {i}",
+        "position": rng.choice(POSITIONS),
+        "skills": rng.sample(SKILLS, rng.randint(2, 6)),
+        "motivation": " ".join(rng.choices(WORDS, k=20)),
+        "projects": " ".join(rng.choices(WORDS, k=10)),
+        "status": rng.choice(STATUSES),
+        "submitted_at": start + timedelta(seconds=i * 37),
+    } for i in range(count)]
+
+
+class DictCollection:
+    """Just enough of a collection for InMemoryJobSearch's page lookup"""
+
+    name = "job_applications"
+
+    def __init__(self, documents):
+        self.by_id = {doc["id"]: doc for doc in documents}
+
+    def find(self, query, projection=None):
+        ids = query["id"]["$in"]
+
+        async def rows():
+            for doc_id in ids:
+                yield self.by_id[doc_id]
+        return rows()
+
+
+async def time_queries(search, repeat: int):
+    results = {}
+    for name, params in QUERIES.items():
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await search.search(limit=20, **params)
+            timings.append((time.perf_counter() - started) * 1000)
+        results[name] = (statistics.median(timings), max(timings))
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--mongo-url", help="time the Mongo backend against this server")
+    args = parser.parse_args()
+
+    documents = make_documents(args.count)
+    if args.mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(args.mongo_url)
+        db = client[f"bench_search_{uuid.uuid4().hex[:8]}"]
+        try:
+            for i in range(0, len(documents), 10000):
+                await db.job_applications.insert_many(documents[i:i + 10000])
+            search = MongoJobSearch(db.job_applications, {"_id": 0})
+            await search.start()
+            results = await time_queries(search, args.repeat)
+        finally:
+            await client.drop_database(db.name)
+    else:
+        search = InMemoryJobSearch(DictCollection(documents), {"_id": 0})
+        started = time.perf_counter()
+        for document in documents:
+            search.add(document)
+        await search.search(limit=1)  # folds the buffered additions into the bitmaps
+        print(f"Indexed {args.count} applications in {time.perf_counter() - started:.2f}s")
+        results = await time_queries(search, args.repeat)
+
+    print(f"{'query':<16}{'median ms':>12}{'max ms':>10}")
+    for name, (median, worst) in results.items():
+        print(f"{name:<16}{median:>12.2f}{worst:>10.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Compare the model-rebuilding read path with the orjson fast path.
+
+The old path builds a Pydantic model per row and lets FastAPI validate and
+serialize the list again against ``response_model``; the fast path dumps the
+projected Mongo documents with orjson. Run from the repository root:
+
+    python benchmarks/bench_serialization.py [--json results.json]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from pydantic import TypeAdapter  # noqa: E402
+
+from fast_json import ReadModel, rows_response  # noqa: E402
+
+
+def load_models():
+    # server.py needs these to import; nothing here talks to Mongo
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "benchmark")
+    import server
+    return server.JobApplication
+
+
+def make_documents(count: int) -> List[dict]:
+    start = datetime(2025, 1, 1)
+    return [{
+        "id": str(uuid.uuid4()),
+        "firstName": "Test",
+        "lastName": f"User {i}",
+        "email": f"user{i}@example.com",
+        "phone": "01234567890",
+        "address": "123 Test Street, Milton Keynes, UK",
+        "position": "Web Developer",
+        "experience": "3 years",
+        "availability": "Immediate",
+        "salary": "£40,000",
+        "skills": ["JavaScript", "React", "Python", "FastAPI"],
+        "portfolio": "https://example.com",
+        "github": "https://github.com/testuser",
+        "linkedin": "https://linkedin.com/in/testuser",
+        "motivation": "I want to join Hot Beans Web because of the great team and projects.",
+        "projects": "Built several web applications using React and FastAPI",
+        "references": "Available upon request",
+        "submitted_at": start + timedelta(seconds=i, milliseconds=i % 1000),
+        "status": "pending",
+    } for i in range(count)]
+
+
+def model_path(model, adapter, documents) -> bytes:
+    # What FastAPI did per request: build models, validate against
+    # response_model, dump to JSON-able data, json.dumps it.
+    models = [model(**doc) for doc in documents]
+    validated = adapter.validate_python(models)
+    content = adapter.dump_python(validated, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+def fast_path(read_model, documents) -> bytes:
+    return rows_response(documents, read_model).body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", dest="json_path", help="write results to this file")
+    args = parser.parse_args()
+
+    model = load_models()
+    adapter = TypeAdapter(List[model])
+    read_model = ReadModel(model)
+
+    results = []
+    print(f"{'rows':>7} {'model path ms':>14} {'fast path ms':>13} {'speedup':>8}")
+    for size in args.sizes:
+        documents = make_documents(size)
+        assert json.loads(model_path(model, adapter, documents)) == json.loads(fast_path(read_model, documents))
+        number = max(1, 2000 // size)
+        slow = min(timeit.repeat(lambda: model_path(model, adapter, documents),
+                                 number=number, repeat=args.repeat)) / number
+        fast = min(timeit.repeat(lambda: fast_path(read_model, documents),
+                                 number=number, repeat=args.repeat)) / number
+        results.append({"rows": size, "model_path_ms": slow * 1000, "fast_path_ms": fast * 1000,
+                        "speedup": slow / fast})
+        print(f"{size:>7} {slow * 1000:>14.2f} {fast * 1000:>13.2f} {slow / fast:>7.1f}x")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"benchmark": "serialization", "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
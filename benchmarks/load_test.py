@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""Load test the Hot Beans API, uploads and websocket chat fan-out.
+
+By default the FastAPI app is started in-process under uvicorn on a free
+local port, backed by mongomock-motor (or a real mongod with --mongo-url),
+with uploads written to a temporary directory. Point --base-url at a running
+deployment to benchmark that instead. Run from the repository root:
+
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/load_test.py --output results.json
+    python benchmarks/load_test.py --compare results.json
+
+Every scenario reports throughput and p50/p95/p99 latency; --compare exits
+non-zero when a scenario regressed by more than --threshold.
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import platform
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+JOB_APPLICATION = {
+    "firstName": "Test",
+    "lastName": "User",
+    "email": "test@example.com",
+    "phone": "01234567890",
+    "address": "123 Test Street, Milton Keynes, UK",
+    "position": "Web Developer",
+    "experience": "3 years",
+    "availability": "Immediate",
+    "salary": "£40,000",
+    "skills": ["JavaScript", "React", "Python", "FastAPI"],
+    "portfolio": "https://example.com",
+    "github": "https://github.com/testuser",
+    "linkedin": "https://linkedin.com/in/testuser",
+    "motivation": "I want to join Hot Beans Web because of the great team and projects.",
+    "projects": "Built several web applications using React and FastAPI",
+    "references": "Available upon request",
+}
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(name, latencies, wall_seconds, errors, payload_bytes=0):
+    latencies = sorted(latencies)
+    result = {
+        "name": name,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / wall_seconds if wall_seconds else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000 if latencies else None,
+        "p95_ms": percentile(latencies, 95) * 1000 if latencies else None,
+        "p99_ms": percentile(latencies, 99) * 1000 if latencies else None,
+    }
+    if payload_bytes:
+        result["throughput_mb_s"] = payload_bytes / wall_seconds / (1024 * 1024)
+    return result
+
+
+def print_result(result):
+    p50, p95, p99 = (result[k] for k in ("p50_ms", "p95_ms", "p99_ms"))
+    line = (f"{result['name']:<32} {result['throughput_rps']:>9.1f} req/s  "
+            f"p50 {p50 or 0:>8.2f}  p95 {p95 or 0:>8.2f}  p99 {p99 or 0:>8.2f} ms  "
+            f"errors {result['errors']}")
+    if "throughput_mb_s" in result:
+        line += f"  {result['throughput_mb_s']:.2f} MB/s"
+    if "delivered" in result:
+        line += f"  delivered {result['delivered']:.1%}"
+    print(line)
+
+
+async def run_http(client, name, make_request, total, concurrency):
+    """Fire ``total`` requests from ``concurrency`` workers.
+
+    ``make_request(i)`` returns (method, path, kwargs, payload_bytes).
+    """
+    latencies = []
+    errors = 0
+    payload_bytes = 0
+    next_index = 0
+
+    async def worker():
+        nonlocal errors, payload_bytes, next_index
+        while next_index < total:
+            i = next_index
+            next_index += 1
+            method, path, kwargs, size = make_request(i)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - started)
+            payload_bytes += size
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(name, latencies, time.perf_counter() - started, errors, payload_bytes)
+
+
+async def http_scenarios(client, args):
+    response = await client.post("/api/job-applications", json=JOB_APPLICATION)
+    response.raise_for_status()
+    application_id = response.json()["id"]
+
+    scenarios = [
+        ("GET /api/", lambda i: ("GET", "/api/", {}, 0)),
+        ("POST /api/status", lambda i: ("POST", "/api/status", {"json": {"client_name": f"bench-{i}"}}, 0)),
+        ("GET /api/status", lambda i: ("GET", "/api/status?limit=100", {}, 0)),
+        ("POST /api/chat/message", lambda i: ("POST", "/api/chat/message",
+                                              {"json": {"user_name": "bench", "message": f"message {i}"}}, 0)),
+        ("GET /api/chat/messages", lambda i: ("GET", "/api/chat/messages", {}, 0)),
+        ("POST /api/job-applications", lambda i: ("POST", "/api/job-applications",
+                                                  {"json": dict(JOB_APPLICATION, lastName=f"User {i}")}, 0)),
+        ("GET /api/job-applications", lambda i: ("GET", "/api/job-applications", {}, 0)),
+        ("GET /api/job-applications/{id}", lambda i: ("GET", f"/api/job-applications/{application_id}", {}, 0)),
+        ("GET /api/uploads", lambda i: ("GET", "/api/uploads", {}, 0)),
+    ]
+    results = []
+    for name, make_request in scenarios:
+        result = await run_http(client, name, make_request, args.requests, args.concurrency)
+        print_result(result)
+        results.append(result)
+    return results
+
+
+def make_images(count, size):
+    from PIL import Image
+
+    base = Image.linear_gradient("L").resize(size).convert("RGB")
+    images = []
+    for i in range(count):
+        image = base.copy()
+        # Make every payload unique so content-addressed storage cannot skip the work
+        image.putpixel((i % size[0], (i // size[0]) % size[1]), (255, 0, 0))
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+
+async def upload_scenarios(client, args):
+    cv_bytes = args.cv_kb * 1024
+    run_id = uuid.uuid4().hex
+
+    def cv_request(i):
+        header = f"CV {run_id} {i}\n".encode()
+        content = header + b"x" * (cv_bytes - len(header))
+        files = {"file": (f"cv-{i}.txt", content, "text/plain")}
+        return "POST", "/api/upload/cv", {"files": files}, len(content)
+
+    images = make_images(args.upload_requests, tuple(args.image_size))
+
+    def image_request(i):
+        content = images[i]
+        files = {"file": (f"image-{i}.jpeg", content, "image/jpeg")}
+        return "POST", "/api/upload/image", {"files": files}, len(content)
+
+    results = []
+    for name, make_request in (("POST /api/upload/cv", cv_request), ("POST /api/upload/image", image_request)):
+        result = await run_http(client, name, make_request, args.upload_requests, args.upload_concurrency)
+        print_result(result)
+        results.append(result)
+    return results
+
+
+def decode_chat_frame(frame, protocol):
+    """Messages in one received frame under a chat wire protocol"""
+    if protocol == "msgpack-batch":
+        import msgpack
+        return msgpack.unpackb(frame)
+    messages = json.loads(frame)
+    return messages if protocol == "json-batch" else [messages]
+
+
+async def websocket_fanout(ws_url, clients, messages, interval, protocol="json", compression="deflate"):
+    import websockets
+
+    sent_at = {}
+    latencies = []
+    expected = clients * messages
+    done = asyncio.Event()
+
+    async def receive(connection):
+        async for frame in connection:
+            received_at = time.perf_counter()
+            for message in decode_chat_frame(frame, protocol):
+                marker = message.get("message")
+                if marker in sent_at:
+                    latencies.append(received_at - sent_at[marker])
+                    if len(latencies) >= expected:
+                        done.set()
+
+    connections = [
+        await websockets.connect(ws_url, max_queue=None, subprotocols=[f"chat.{protocol}"],
+                                 compression=None if compression == "none" else compression)
+        for _ in range(clients)
+    ]
+    receivers = [asyncio.create_task(receive(c)) for c in connections]
+    sender = connections[0]
+    try:
+        started = time.perf_counter()
+        for i in range(messages):
+            marker = f"fanout-{uuid.uuid4().hex}"
+            sent_at[marker] = time.perf_counter()
+            await sender.send(json.dumps({"user_name": "bench", "message": marker}))
+            await asyncio.sleep(interval)
+        try:
+            await asyncio.wait_for(done.wait(), timeout=30)
+        except asyncio.TimeoutError:
+            pass
+        wall = time.perf_counter() - started
+    finally:
+        for task in receivers:
+            task.cancel()
+        await asyncio.gather(*(c.close() for c in connections), return_exceptions=True)
+
+    name = f"WS fan-out x{clients}" if protocol == "json" else f"WS fan-out x{clients} ({protocol})"
+    result = summarize(name, latencies, wall, expected - len(latencies))
+    result["clients"] = clients
+    result["delivered"] = len(latencies) / expected if expected else 1.0
+    return result
+
+
+async def websocket_scenarios(base_url, args):
+    ws_url = base_url.replace("http", "ws", 1) + "/ws/chat"
+    results = []
+    for clients in args.ws_clients:
+        result = await websocket_fanout(ws_url, clients, args.ws_messages, args.ws_interval,
+                                        args.ws_protocol, args.ws_compression)
+        print_result(result)
+        results.append(result)
+    return results
+
+
+class LocalServer:
+    """The app under uvicorn in a background thread, with throwaway storage"""
+
+    def __init__(self, mongo_url=None):
+        os.environ.setdefault("MONGO_URL", mongo_url or "mongodb://localhost:27017")
+        os.environ.setdefault("DB_NAME", "hotbeans_benchmark")
+        # Every request comes from one client here; per-client rate limits would
+        # measure the limiter rather than the app
+        for policy in ("CHAT", "READ", "UPLOAD_BYTES"):
+            os.environ.setdefault(f"RATE_LIMIT_{policy}_RATE", "1e9")
+            os.environ.setdefault(f"RATE_LIMIT_{policy}_BURST", "1e9")
+        sys.path.insert(0, str(BACKEND_DIR))
+        import server
+        import uvicorn
+
+        self.storage = Path(tempfile.mkdtemp(prefix="hotbeans-bench-"))
+        server.incoming_dir = self.storage / "incoming"
+        server.cv_blobs.directory = self.storage / "uploads"
+        server.image_blobs.directory = self.storage / "images"
+        for directory in (server.incoming_dir, server.cv_blobs.directory, server.image_blobs.directory):
+            directory.mkdir()
+
+        database_name = f"hotbeans_benchmark_{uuid.uuid4().hex[:8]}"
+        if mongo_url:
+            from motor.motor_asyncio import AsyncIOMotorClient
+            mongo = AsyncIOMotorClient(mongo_url)
+        else:
+            from mongomock_motor import AsyncMongoMockClient
+            mongo = AsyncMongoMockClient()
+        self.mongo_url = mongo_url
+        self.database_name = database_name
+        server.bind_database(mongo[database_name])
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        config = uvicorn.Config(server.app, host="127.0.0.1", port=self.port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self):
+        self.thread.start()
+        deadline = time.time() + 30
+        while not self.server.started:
+            if time.time() > deadline or not self.thread.is_alive():
+                raise RuntimeError("Local server did not start")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=30)
+        if self.mongo_url:
+            from pymongo import MongoClient
+            with MongoClient(self.mongo_url) as mongo:
+                mongo.drop_database(self.database_name)
+        shutil.rmtree(self.storage, ignore_errors=True)
+
+
+async def run_all(base_url, args):
+    limits = httpx.Limits(max_connections=max(args.concurrency, args.upload_concurrency) + 4)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        report = {"http": [], "uploads": [], "websocket": []}
+        if "http" in args.suites:
+            print("\nHTTP endpoints")
+            report["http"] = await http_scenarios(client, args)
+        if "uploads" in args.suites:
+            print("\nUploads")
+            report["uploads"] = await upload_scenarios(client, args)
+    if "websocket" in args.suites:
+        print("\nWebsocket fan-out")
+        report["websocket"] = await websocket_scenarios(base_url, args)
+    return report
+
+
+def compare(report, baseline_path, threshold):
+    """Print per-scenario deltas against a previous run; True if nothing regressed"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {r["name"]: r for suite in ("http", "uploads", "websocket") for r in baseline.get(suite, [])}
+    ok = True
+    print(f"\nComparison with {baseline_path} (threshold {threshold:.0%})")
+    for suite in ("http", "uploads", "websocket"):
+        for result in report[suite]:
+            before = previous.get(result["name"])
+            if not before or not before.get("p95_ms") or not result.get("p95_ms"):
+                continue
+            p95_change = result["p95_ms"] / before["p95_ms"] - 1
+            rps_change = result["throughput_rps"] / before["throughput_rps"] - 1 if before["throughput_rps"] else 0
+            regressed = p95_change > threshold or rps_change < -threshold
+            ok = ok and not regressed
+            print(f"{'REGRESSED' if regressed else 'ok':<10} {result['name']:<32} "
+                  f"p95 {p95_change:+.1%}  throughput {rps_change:+.1%}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Hot Beans API and websocket chat")
+    parser.add_argument("--base-url", help="benchmark a running server instead of starting one")
+    parser.add_argument("--mongo-url", help="back the local server with this mongod instead of mongomock")
+    parser.add_argument("--suites", nargs="+", default=["http", "uploads", "websocket"],
+                        choices=["http", "uploads", "websocket"])
+    parser.add_argument("--requests", type=int, default=500, help="requests per HTTP scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--upload-requests", type=int, default=50)
+    parser.add_argument("--upload-concurrency", type=int, default=8)
+    parser.add_argument("--cv-kb", type=int, default=256, help="size of each CV payload")
+    parser.add_argument("--image-size", type=int, nargs=2, default=[1600, 1200], metavar=("W", "H"))
+    parser.add_argument("--ws-clients", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--ws-messages", type=int, default=20)
+    parser.add_argument("--ws-interval", type=float, default=0.05, help="seconds between fan-out messages")
+    parser.add_argument("--ws-protocol", default="json", choices=["json", "json-batch", "msgpack-batch"],
+                        help="chat wire protocol the fan-out clients negotiate")
+    parser.add_argument("--ws-compression", default="deflate", choices=["deflate", "none"],
+                        help="offer permessage-deflate from the fan-out clients")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="previous JSON results to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+    # server.py configures INFO logging on import; per-request client logs would drown the report
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    meta = {
+        "started_at": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "args": vars(args),
+    }
+    if args.base_url:
+        report = asyncio.run(run_all(args.base_url.rstrip("/"), args))
+    else:
+        with LocalServer(args.mongo_url) as local:
+            report = asyncio.run(run_all(local.base_url, args))
+    report["meta"] = meta
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
+    if args.compare and not compare(report, args.compare, args.threshold):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
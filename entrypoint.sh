@@ -6,16 +6,33 @@ cd /backend || { echo "Backend directory not found"; exit 1; }
 
 echo "Starting FastAPI backend"
 # Start Uvicorn with proper host binding
-uvicorn server:app --host 0.0.0.0 --port 8001 &
+# permessage-deflate compresses chat frames; batched frames compress best
+uvicorn server:app --host 0.0.0.0 --port 8001 --ws websockets \
+    --ws-per-message-deflate "${WS_PER_MESSAGE_DEFLATE:-true}" &
 BACKEND_PID=$!
 
-echo "Waiting for backend to start..."
-sleep 30
-
-if ! kill -0 $BACKEND_PID 2>/dev/null; then
-    echo "Backend failed to start at initialization, exiting"
-    exit 1
-fi
+# Poll the readiness check instead of sleeping a fixed time: start nginx as
+# soon as the backend is ready, or after BACKEND_READY_TIMEOUT seconds if it
+# is up but degraded (e.g. MongoDB unreachable; /api/ready reports why)
+echo "Waiting for backend to become ready..."
+READY_DEADLINE=$(( $(date +%s) + ${BACKEND_READY_TIMEOUT:-60} ))
+DELAY=0.1
+until wget -q -O /dev/null http://127.0.0.1:8001/api/ready 2>/dev/null; do
+    if ! kill -0 $BACKEND_PID 2>/dev/null; then
+        echo "Backend failed to start at initialization, exiting"
+        exit 1
+    fi
+    if [ "$(date +%s)" -ge "$READY_DEADLINE" ]; then
+        echo "Backend not ready after ${BACKEND_READY_TIMEOUT:-60}s, starting nginx anyway"
+        break
+    fi
+    sleep $DELAY
+    case $DELAY in
+        0.1) DELAY=0.2 ;;
+        0.2) DELAY=0.5 ;;
+        *) DELAY=1 ;;
+    esac
+done
 
 # Start Nginx
 nginx -g 'daemon off;' &
@@ -0,0 +1,58 @@
+import asyncio
+import hashlib
+
+from mongomock_motor import AsyncMongoMockClient
+
+from blob_store import BlobStore
+
+
+def write(path, content: bytes) -> str:
+    path.write_bytes(content)
+    return hashlib.sha256(content).hexdigest()
+
+
+def test_same_bytes_under_another_extension_share_one_file(tmp_path):
+    async def scenario():
+        store = BlobStore(AsyncMongoMockClient()["test"].blobs, tmp_path, kind="cv")
+        sha256 = write(tmp_path / "a.part", b"resume")
+        first = await store.adopt(tmp_path / "a.part", sha256, "txt", "text/plain")
+        write(tmp_path / "b.part", b"resume")
+        second = await store.adopt(tmp_path / "b.part", sha256, "md", "text/plain")
+        assert second["saved_name"] == first["saved_name"] == f"{sha256}.txt"
+        assert second["refcount"] == 2
+        assert sorted(p.name for p in tmp_path.iterdir()) == [f"{sha256}.txt"]
+
+    asyncio.run(scenario())
+
+
+def test_release_deletes_the_bytes_with_the_last_reference(tmp_path):
+    async def scenario():
+        store = BlobStore(AsyncMongoMockClient()["test"].blobs, tmp_path, kind="image")
+        sha256 = write(tmp_path / "a.part", b"jpeg")
+        await store.adopt(tmp_path / "a.part", sha256, "jpeg", "image/jpeg")
+        assert (await store.acquire_existing(sha256))["refcount"] == 2
+
+        assert await store.release(sha256) is False
+        assert (tmp_path / f"{sha256}.jpeg").exists()
+        assert await store.release(sha256) is True
+        assert not (tmp_path / f"{sha256}.jpeg").exists()
+        assert await store.acquire_existing(sha256) is None
+        assert await store.release(sha256) is False
+
+    asyncio.run(scenario())
+
+
+def test_missing_bytes_are_restored_under_the_stored_name(tmp_path):
+    async def scenario():
+        store = BlobStore(AsyncMongoMockClient()["test"].blobs, tmp_path, kind="cv")
+        sha256 = write(tmp_path / "a.part", b"resume")
+        await store.adopt(tmp_path / "a.part", sha256, "pdf", "application/pdf")
+        (tmp_path / f"{sha256}.pdf").unlink()
+
+        assert await store.acquire_existing(sha256) is None
+        write(tmp_path / "b.part", b"resume")
+        blob = await store.adopt(tmp_path / "b.part", sha256, "txt", "text/plain")
+        assert blob["saved_name"] == f"{sha256}.pdf" and blob["refcount"] == 2
+        assert (tmp_path / f"{sha256}.pdf").exists()
+
+    asyncio.run(scenario())
@@ -0,0 +1,47 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+from pydantic import BaseModel
+
+from bulk_ingest import BulkIngestSummary, ingest
+
+
+class Row(BaseModel):
+    id: str
+    count: int
+
+
+async def records(items):
+    for index, item in enumerate(items):
+        if isinstance(item, str):
+            yield index, None, item
+        else:
+            yield index, item, None
+
+
+def test_each_record_gets_its_own_status_in_input_order():
+    async def scenario():
+        collection = AsyncMongoMockClient()["test"].rows
+        await collection.create_index("id", unique=True)
+        await collection.insert_one({"id": "taken", "count": 0})
+        inserted = []
+        summary = await ingest(
+            records([
+                {"id": "a", "count": 1},
+                "Invalid JSON: unexpected character",
+                {"id": "b", "count": "many"},
+                {"id": "taken", "count": 2},
+                {"id": "c", "count": 3},
+            ]),
+            Row, collection, BulkIngestSummary(), chunk_size=2, on_insert=inserted.append,
+        )
+        result = summary.as_dict()
+        assert [(r["index"], r["status"]) for r in result["results"]] == [
+            (0, "inserted"), (1, "invalid"), (2, "invalid"), (3, "duplicate"), (4, "inserted"),
+        ]
+        assert result["results"][2]["id"] == "b" and result["results"][2]["errors"][0]["loc"] == ["count"]
+        assert result["inserted"] == 2 and result["invalid"] == 2 and result["duplicate"] == 1
+        assert [document["id"] for document in inserted] == ["a", "c"]
+        assert await collection.count_documents({}) == 3
+
+    asyncio.run(scenario())
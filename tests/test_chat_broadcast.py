@@ -0,0 +1,105 @@
+import asyncio
+
+from chat_broadcast import SLOW_CONSUMER_CLOSE_CODE, ConnectionManager
+
+
+class FakeWebSocket:
+    """Records frames; a ``stalled`` one never finishes a send, like a client that stopped reading"""
+
+    def __init__(self, stalled: bool = False):
+        self.stalled = stalled
+        self.sent = []
+        self.close_code = None
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, data):
+        if self.stalled:
+            await asyncio.Event().wait()
+        self.sent.append(data)
+
+    send_bytes = send_text
+
+    async def close(self, code: int = 1000):
+        self.close_code = code
+
+
+def test_a_full_outbound_queue_evicts_the_client():
+    async def scenario():
+        manager = ConnectionManager(max_queue=2, send_timeout=10)
+        slow, fast = FakeWebSocket(stalled=True), FakeWebSocket()
+        await manager.connect(slow)
+        await manager.connect(fast)
+        # The writer takes the first message and stalls on it; two more fill the queue
+        for n in range(4):
+            await manager.broadcast(f"m{n}")
+            # Long enough for a client that keeps up to drain its queue
+            await asyncio.sleep(0.01)
+        assert slow not in manager.active_connections and manager.evicted == 1
+        assert slow.close_code == SLOW_CONSUMER_CLOSE_CODE
+        assert fast.sent == ["m0", "m1", "m2", "m3"] and fast.close_code is None
+        manager.disconnect(fast)
+
+    asyncio.run(scenario())
+
+
+def test_a_send_that_times_out_evicts_the_client():
+    async def scenario():
+        manager = ConnectionManager(send_timeout=0.05)
+        slow = FakeWebSocket(stalled=True)
+        await manager.connect(slow)
+        await manager.broadcast("hello")
+        await asyncio.sleep(0.1)
+        assert slow not in manager.active_connections and manager.evicted == 1
+        assert slow.close_code == SLOW_CONSUMER_CLOSE_CODE
+
+    asyncio.run(scenario())
+
+
+def test_disconnect_cancels_the_writer():
+    async def scenario():
+        manager = ConnectionManager()
+        websocket = FakeWebSocket()
+        await manager.connect(websocket)
+        writer = manager.active_connections[websocket].task
+        manager.disconnect(websocket)
+        await asyncio.gather(writer, return_exceptions=True)
+        assert writer.cancelled() and not manager.active_connections
+        # Nothing is delivered after the client has gone
+        await manager.broadcast("late")
+        assert websocket.sent == []
+
+    asyncio.run(scenario())
+
+
+def test_room_messages_reach_only_that_rooms_subscribers():
+    async def scenario():
+        manager = ConnectionManager()
+        general, jobs, both = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        await manager.connect(general, ["general"])
+        await manager.connect(jobs, ["jobs"])
+        await manager.connect(both, ["general", "jobs"])
+        await manager.send_to_room("jobs", "hiring")
+        await manager.send_to_room("empty", "nobody")
+        await asyncio.sleep(0.01)
+        assert general.sent == [] and jobs.sent == ["hiring"] and both.sent == ["hiring"]
+        for websocket in (general, jobs, both):
+            manager.disconnect(websocket)
+
+    asyncio.run(scenario())
+
+
+def test_empty_rooms_are_removed():
+    async def scenario():
+        manager = ConnectionManager()
+        first, second = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(first, ["jobs"])
+        await manager.connect(second, ["jobs", "general"])
+        manager.unsubscribe(first, "jobs")
+        assert set(manager.rooms) == {"jobs", "general"}
+        manager.disconnect(second)
+        assert manager.rooms == {} and manager.rooms_of(first) == set()
+        manager.disconnect(first)
+
+    asyncio.run(scenario())
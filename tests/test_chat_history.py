@@ -0,0 +1,73 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from mongomock_motor import AsyncMongoMockClient
+
+from chat_history import ChatHistoryCache
+from pagination import encode_cursor, fetch_page
+
+START = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def message(n: int, room: str = "general", **fields) -> dict:
+    return {"id": f"m{n}", "user_name": "u", "message": str(n), "timestamp": START + timedelta(seconds=n),
+            "room": room, **fields}
+
+
+def filled(count: int, capacity: int = 10, complete: bool = True) -> ChatHistoryCache:
+    cache = ChatHistoryCache(capacity)
+    for n in range(count):
+        cache.add(message(n))
+    cache.complete = complete
+    return cache
+
+
+def test_since_returns_later_messages_of_the_room():
+    cache = filled(5)
+    cache.add(message(5, room="other"))
+    assert [m["id"] for m in cache.since(START + timedelta(seconds=2), 10, "general")] == ["m3", "m4"]
+    assert [m["id"] for m in cache.since(START, 10, "other")] == ["m5"]
+    assert [m["id"] for m in cache.since(START, 2, "general")] == ["m1", "m2"]
+
+
+def test_since_before_the_buffer_falls_back_unless_complete():
+    cache = filled(12, capacity=10, complete=False)
+    assert cache.since(START, 50, "general") is None
+    assert len(cache.since(START + timedelta(seconds=5), 50, "general")) == 6
+
+
+def test_timezone_aware_timestamps_are_stored_as_naive_utc():
+    cache = filled(3)
+    aware = START.replace(tzinfo=timezone(timedelta(hours=2))) + timedelta(hours=2, seconds=10)
+    cache.add(message(10, timestamp=aware))
+    assert cache.latest(1, "general")[0]["timestamp"] == START + timedelta(seconds=10)
+    assert [m["id"] for m in cache.since(START + timedelta(seconds=2), 10, "general")] == ["m10"]
+
+
+def test_after_id_and_latest():
+    cache = filled(6)
+    assert [m["id"] for m in cache.after_id("m3", 10, "general")] == ["m4", "m5"]
+    assert cache.after_id("unknown", 10, "general") is None
+    assert [m["id"] for m in cache.latest(2, "general")] == ["m4", "m5"]
+    # Not everything is buffered, so a longer history has to come from Mongo
+    cache.complete = False
+    assert cache.latest(10, "general") is None
+
+
+def test_a_cursor_from_the_cache_pages_on_from_mongo():
+    async def scenario():
+        collection = AsyncMongoMockClient()["test"].chat_messages
+        cache = ChatHistoryCache(10)
+        for n in range(4):
+            stamped = message(n, timestamp=START + timedelta(seconds=n, microseconds=123456))
+            await collection.insert_one(dict(stamped))
+            cache.add(stamped)
+        cache.complete = True
+        # As get_chat_messages builds the cursor for a page served from the buffer
+        newest = cache.latest(3, "general")[1:]
+        cursor = encode_cursor(newest[0]["timestamp"], newest[0]["id"])
+        older, _ = await fetch_page(collection, "timestamp", 10, cursor, projection={"_id": 0})
+        assert [m["id"] for m in older] == ["m1", "m0"]
+        assert newest[0]["timestamp"] == (await collection.find_one({"id": "m2"}))["timestamp"]
+
+    asyncio.run(scenario())
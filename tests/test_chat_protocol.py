@@ -0,0 +1,79 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import msgpack
+import pytest
+
+from chat_broadcast import ConnectionManager, Subscriber
+from chat_protocol import PROTOCOLS, OutboundMessage, negotiate
+
+
+def socket(subprotocols=(), **query):
+    return SimpleNamespace(scope={"subprotocols": list(subprotocols)}, query_params=query)
+
+
+def test_negotiate_picks_the_first_supported_subprotocol():
+    protocol, accepted = negotiate(socket(["chat.unknown", "chat.msgpack-batch", "chat.json-batch"]))
+    assert protocol.name == "msgpack-batch" and accepted == "chat.msgpack-batch"
+
+
+def test_negotiate_falls_back_to_the_query_then_plain_json():
+    assert negotiate(socket(["graphql-ws"], protocol="json-batch")) == (PROTOCOLS["json-batch"], None)
+    assert negotiate(socket(protocol="bogus")) == (PROTOCOLS["json"], None)
+    assert negotiate(socket()) == (PROTOCOLS["json"], None)
+
+
+def messages(count):
+    return [OutboundMessage(json.dumps({"id": f"m{n}", "message": "é" * (n % 5)})) for n in range(count)]
+
+
+@pytest.mark.parametrize("count", [1, 15, 16, 70000])
+def test_batches_round_trip(count):
+    batch = messages(count)
+    expected = [json.loads(message.text) for message in batch]
+    assert json.loads(PROTOCOLS["json-batch"].encode(batch)) == expected
+    assert msgpack.unpackb(PROTOCOLS["msgpack-batch"].encode(batch)) == expected
+
+
+def queued(protocol_name, count):
+    subscriber = Subscriber(None, 1000, PROTOCOLS[protocol_name])
+    for message in messages(count):
+        subscriber.queue.put_nowait(message)
+    return subscriber
+
+
+def test_next_batch_is_capped_at_max_batch():
+    async def scenario():
+        manager = ConnectionManager(flush_window=0, max_batch=4)
+        subscriber = queued("json-batch", 6)
+        assert len(await manager._next_batch(subscriber)) == 4
+        assert len(await manager._next_batch(subscriber)) == 2
+
+    asyncio.run(scenario())
+
+
+def test_plain_json_sends_one_message_per_frame():
+    async def scenario():
+        manager = ConnectionManager(flush_window=0.05)
+        subscriber = queued("json", 3)
+        assert len(await manager._next_batch(subscriber)) == 1
+
+    asyncio.run(scenario())
+
+
+def test_next_batch_waits_out_the_flush_window_for_a_burst():
+    async def scenario():
+        manager = ConnectionManager(flush_window=0.05)
+        subscriber = queued("json-batch", 1)
+
+        async def late_arrivals():
+            await asyncio.sleep(0.01)
+            for message in messages(2):
+                subscriber.queue.put_nowait(message)
+
+        arriving = asyncio.create_task(late_arrivals())
+        assert len(await manager._next_batch(subscriber)) == 3
+        await arriving
+
+    asyncio.run(scenario())
@@ -0,0 +1,57 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from starlette.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import server
+
+
+@pytest.fixture
+def client(monkeypatch):
+    database = AsyncMongoMockClient()["test"]
+    monkeypatch.setattr(server, "db", None)
+    server.bind_database(database)
+    monkeypatch.setattr(server, "chat_history", server.ChatHistoryCache(default_room=server.DEFAULT_CHAT_ROOM))
+    # No lifespan: nothing is started, and nothing needs to be for these routes
+    return TestClient(server.app), database
+
+
+def test_member_sockets_cannot_join_other_rooms(client):
+    test_client, _ = client
+    with test_client.websocket_connect("/ws/chat/jobs") as websocket:
+        websocket.send_json({"action": "subscribe", "room": "admin", "user_name": "eve", "message": "hi"})
+        # A member's frame is always a message to the room it joined
+        reply = websocket.receive_json()
+        assert reply["room"] == "jobs" and reply["message"] == "hi"
+        assert all("admin" not in rooms for rooms in map(server.manager.rooms_of, server.manager.active_connections))
+
+
+def test_admin_socket_needs_the_token(client, monkeypatch):
+    test_client, _ = client
+    monkeypatch.setattr(server, "CHAT_ADMIN_TOKEN", "secret")
+    with pytest.raises(WebSocketDisconnect) as raised:
+        with test_client.websocket_connect("/ws/admin/chat?token=guess&room=admin") as websocket:
+            websocket.receive_json()
+    assert raised.value.code == server.POLICY_VIOLATION_CLOSE_CODE
+    with test_client.websocket_connect("/ws/admin/chat?token=secret&room=jobs") as websocket:
+        websocket.send_json({"action": "subscribe", "room": "admin"})
+        assert websocket.receive_json() == {"rooms": ["admin", "jobs"]}
+
+
+def test_message_history_is_scoped_to_the_room(client):
+    test_client, database = client
+    start = datetime(2026, 1, 1)
+    asyncio.run(database.chat_messages.insert_many([
+        {"id": "legacy", "user_name": "u", "message": "before rooms", "timestamp": start},
+        {"id": "g1", "user_name": "u", "message": "hello", "timestamp": start + timedelta(seconds=1), "room": "general"},
+        {"id": "j1", "user_name": "u", "message": "hiring", "timestamp": start + timedelta(seconds=2), "room": "jobs"},
+    ]))
+    ids = lambda response: [message["id"] for message in response.json()]
+    assert ids(test_client.get("/api/chat/messages", params={"room": "jobs"})) == ["j1"]
+    # Messages from before rooms existed belong to the default room
+    assert ids(test_client.get("/api/chat/messages")) == ["legacy", "g1"]
+    assert ids(test_client.get("/api/chat/messages", params={"room": "jobs", "since": start.isoformat()})) == ["j1"]
+    assert test_client.get("/api/chat/messages", params={"room": "no rooms!"}).status_code == 422
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from cv_text import DOCX_TYPE, EXTRACTOR_VERSION, CvTextIndexer
+from job_queue import JobQueue
+
+
+class InlinePool:
+    """Runs jobs in-process, as the worker pool would in a worker"""
+
+    async def run(self, fn, *args):
+        return fn(*args)
+
+
+def make_indexer():
+    database = AsyncMongoMockClient()["test"]
+    jobs = JobQueue(database.jobs, workers=0, node="node-a")
+    return database, CvTextIndexer(database.uploaded_files, database.cv_texts, InlinePool(), jobs)
+
+
+def test_scan_queues_only_uploads_without_current_text(tmp_path):
+    async def scenario():
+        database, indexer = make_indexer()
+        for name in ("doc-current", "doc-stale", "new"):
+            (tmp_path / name).write_bytes(b"cv")
+        await database.uploaded_files.insert_many([
+            {"id": name, "sha256": name, "file_path": str(tmp_path / name), "file_type": "application/msword"}
+            for name in ("doc-current", "doc-stale", "new", "elsewhere")
+        ])
+        await database.cv_texts.insert_many([
+            {"_id": "doc-current", "status": "unsupported", "version": EXTRACTOR_VERSION},
+            {"_id": "doc-stale", "status": "unsupported", "version": EXTRACTOR_VERSION - 1},
+        ])
+
+        await indexer.start()
+        await indexer._scan
+        queued = await database.jobs.find({}, {"payload.sha256": 1, "node": 1}).to_list(None)
+        # "elsewhere" has no file on this node, so another node queues it
+        assert sorted(job["payload"]["sha256"] for job in queued) == ["doc-stale", "new"]
+        assert {job["node"] for job in queued} == {"node-a"}
+        await indexer.stop()
+
+    asyncio.run(scenario())
+
+
+def test_corrupt_documents_are_recorded_as_failed(tmp_path):
+    async def scenario():
+        database, indexer = make_indexer()
+        path = tmp_path / "cv.docx"
+        path.write_bytes(b"not a zip")
+        result = await indexer.process({"sha256": "bad", "file_path": str(path), "file_type": DOCX_TYPE})
+        assert result["status"] == "failed"
+        entry = await database.cv_texts.find_one({"_id": "bad"})
+        assert entry["version"] == EXTRACTOR_VERSION and entry["error"].startswith("BadZipFile")
+
+    asyncio.run(scenario())
+
+
+def test_missing_files_are_retried_not_recorded(tmp_path):
+    async def scenario():
+        database, indexer = make_indexer()
+        with pytest.raises(FileNotFoundError):
+            await indexer.process({"sha256": "gone", "file_path": str(tmp_path / "cv.txt"), "file_type": "text/plain"})
+        assert await database.cv_texts.count_documents({}) == 0
+
+    asyncio.run(scenario())
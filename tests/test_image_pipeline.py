@@ -0,0 +1,52 @@
+import asyncio
+import hashlib
+
+from image_pipeline import DerivativeCache
+
+
+def test_source_digests_are_memoised_and_bounded(tmp_path):
+    cache = DerivativeCache(tmp_path / "cache", max_bytes=1024, max_digests=2)
+    sources = []
+    for i in range(3):
+        path = tmp_path / f"{i}.jpg"
+        path.write_bytes(f"image {i}".encode())
+        sources.append(path)
+
+    async def scenario():
+        digests = [await cache.source_digest(path) for path in sources]
+        assert digests == [hashlib.sha256(f"image {i}".encode()).hexdigest() for i in range(3)]
+        # Only the two most recently used sources are remembered
+        assert [key[0] for key in cache._source_digests] == [str(sources[1]), str(sources[2])]
+        await cache.source_digest(sources[1])
+        assert [key[0] for key in cache._source_digests] == [str(sources[2]), str(sources[1])]
+
+    asyncio.run(scenario())
+
+
+def test_lookups_refresh_recency_and_stores_evict_the_oldest(tmp_path):
+    cache = DerivativeCache(tmp_path / "cache", max_bytes=10, max_digests=8)
+    rendered = []
+
+    async def render(source, output, width, quality, fmt):
+        rendered.append(width)
+        with open(output, "wb") as f:
+            f.write(b"12345")
+
+    async def scenario():
+        source = tmp_path / "a.jpg"
+        source.write_bytes(b"image")
+        first = await cache.get_or_render(source, 320, 80, "JPEG", render)
+        second = await cache.get_or_render(source, 640, 80, "JPEG", render)
+        # A hit makes 320 the most recent, so storing 960 evicts 640
+        assert await cache.get_or_render(source, 320, 80, "JPEG", render) == first
+        await cache.get_or_render(source, 960, 80, "JPEG", render)
+        assert rendered == [320, 640, 960]
+        assert first.exists() and not second.exists()
+        assert cache.total_bytes == 10
+
+        # A derivative deleted underneath the cache is rendered again
+        first.unlink()
+        assert await cache.get_or_render(source, 320, 80, "JPEG", render) == first
+        assert rendered == [320, 640, 960, 320] and first.exists()
+
+    asyncio.run(scenario())
@@ -0,0 +1,115 @@
+import asyncio
+from datetime import timedelta
+
+from mongomock_motor import AsyncMongoMockClient
+
+from job_queue import DONE, FAILED, QUEUED, RUNNING, JobQueue, PermanentJobError
+
+
+def make_queue(**options):
+    return JobQueue(AsyncMongoMockClient()["test"].jobs, workers=0, **options)
+
+
+def test_keyless_jobs_get_distinct_ids():
+    async def scenario():
+        queue = make_queue()
+        await queue.start()
+        first = await queue.enqueue("image.convert", {"n": 1})
+        second = await queue.enqueue("image.convert", {"n": 2})
+        assert first["id"] != second["id"]
+        assert await queue.collection.count_documents({"active": True}) == 2
+
+    asyncio.run(scenario())
+
+
+def test_dedupe_key_returns_the_active_job():
+    async def scenario():
+        queue = make_queue()
+        await queue.start()
+        first = await queue.enqueue("cv.extract_text", {"n": 1}, dedupe_key="cv:abc")
+        second = await queue.enqueue("cv.extract_text", {"n": 2}, dedupe_key="cv:abc")
+        assert second["id"] == first["id"]
+        other = await queue.enqueue("cv.extract_text", {"n": 3}, dedupe_key="cv:def")
+        assert other["id"] != first["id"]
+
+    asyncio.run(scenario())
+
+
+def test_dedupe_key_is_free_again_once_the_job_finishes():
+    async def scenario():
+        queue = make_queue()
+        queue.handler("noop")(lambda payload: asyncio.sleep(0))
+        await queue.start()
+        first = await queue.enqueue("noop", {}, dedupe_key="once")
+        await queue.run(await queue.claim())
+        assert (await queue.get(first["id"]))["status"] == DONE
+        second = await queue.enqueue("noop", {}, dedupe_key="once")
+        assert second["id"] != first["id"]
+
+    asyncio.run(scenario())
+
+
+def test_claim_leases_due_jobs_only():
+    async def scenario():
+        queue = make_queue()
+        queue.handler("noop")(lambda payload: asyncio.sleep(0))
+        await queue.start()
+        await queue.enqueue("noop", {}, delay=60)
+        assert await queue.claim() is None
+        due = await queue.enqueue("noop", {})
+        claimed = await queue.claim()
+        assert claimed["id"] == due["id"]
+        assert claimed["status"] == RUNNING and claimed["attempts"] == 1
+        # Leased, so no other worker gets it
+        assert await queue.claim() is None
+
+    asyncio.run(scenario())
+
+
+def test_failures_are_retried_then_failed():
+    async def scenario():
+        queue = make_queue(max_attempts=2)
+
+        @queue.handler("flaky")
+        async def flaky(payload):
+            raise RuntimeError("boom")
+
+        @queue.handler("broken")
+        async def broken(payload):
+            raise PermanentJobError("corrupt")
+
+        await queue.start()
+        job = await queue.enqueue("flaky", {})
+        await queue.run(await queue.claim())
+        retried = await queue.get(job["id"])
+        assert retried["status"] == QUEUED and retried["error"] == "RuntimeError: boom"
+
+        await queue.collection.update_one({"_id": job["id"]}, {"$set": {"available_at": retried["created_at"]}})
+        await queue.run(await queue.claim())
+        assert (await queue.get(job["id"]))["status"] == FAILED
+
+        job = await queue.enqueue("broken", {})
+        await queue.run(await queue.claim())
+        failed = await queue.get(job["id"])
+        assert failed["status"] == FAILED and failed["attempts"] == 1 and failed["error"] == "corrupt"
+
+    asyncio.run(scenario())
+
+
+def test_local_jobs_stay_on_their_node_until_the_pin_times_out():
+    async def scenario():
+        collection = AsyncMongoMockClient()["test"].jobs
+        here = JobQueue(collection, workers=0, node="node-a")
+        there = JobQueue(collection, workers=0, node="node-b", pin_timeout=60)
+        for queue in (here, there):
+            queue.handler("noop")(lambda payload: asyncio.sleep(0))
+        await here.start()
+        job = await here.enqueue("noop", {}, local=True)
+        assert await there.claim() is None
+
+        await collection.update_one(
+            {"_id": job["id"]}, {"$set": {"created_at": job["created_at"] - timedelta(seconds=61)}}
+        )
+        assert (await there.claim())["id"] == job["id"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,84 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from mongomock_motor import AsyncMongoMockClient
+
+from job_search import InMemoryJobSearch, MongoJobSearch
+
+START = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def application(n: int, submitted_at: datetime, **fields) -> dict:
+    return {"id": f"a{n}", "submitted_at": submitted_at, "position": "Web Developer", "skills": ["React"],
+            "status": "pending", "motivation": "", "projects": "", **fields}
+
+
+def test_aware_and_naive_submitted_at_share_one_order():
+    async def scenario():
+        collection = AsyncMongoMockClient()["test"].job_applications
+        await collection.insert_many([application(n, START + timedelta(minutes=n)) for n in range(3)])
+        search = InMemoryJobSearch(collection, {"_id": 0})
+        await search.start()
+
+        # Two hours ahead of UTC, so 30 minutes after a2 in UTC terms
+        aware = application(3, (START + timedelta(hours=2, minutes=32)).replace(tzinfo=timezone(timedelta(hours=2))))
+        await collection.insert_one(dict(aware))
+        search.add(aware)
+
+        documents, next_cursor, _ = await search.search(limit=2)
+        assert [d["id"] for d in documents] == ["a3", "a2"]
+        documents, next_cursor, _ = await search.search(limit=2, cursor=next_cursor)
+        assert [d["id"] for d in documents] == ["a1", "a0"]
+        assert next_cursor is None
+
+    asyncio.run(scenario())
+
+
+def test_filters_and_facets():
+    async def scenario():
+        collection = AsyncMongoMockClient()["test"].job_applications
+        await collection.insert_many([
+            application(0, START, skills=["React", "Python"], motivation="loves coffee"),
+            application(1, START + timedelta(minutes=1), skills=["Vue"], status="reviewing"),
+            application(2, START + timedelta(minutes=2), skills=["Python"], position="Designer"),
+        ])
+        search = InMemoryJobSearch(collection, {"_id": 0})
+        await search.start()
+
+        documents, _, facets = await search.search(skills=["Python"])
+        assert [d["id"] for d in documents] == ["a2", "a0"]
+        assert {"value": "Designer", "count": 1} in facets["position"]
+        documents, _, _ = await search.search(q="coffee", positions=["Web Developer"])
+        assert [d["id"] for d in documents] == ["a0"]
+
+    asyncio.run(scenario())
+
+
+def test_mongo_facets_cover_matches_and_cache_collection_totals():
+    async def scenario():
+        collection = AsyncMongoMockClient()["test"].job_applications
+        await collection.insert_many([
+            application(0, START, skills=["React", "Python"]),
+            application(1, START + timedelta(minutes=1), skills=["Vue"], status="reviewing"),
+        ])
+        search = MongoJobSearch(collection, {"_id": 0})
+
+        _, _, facets = await search.search(statuses=["reviewing"])
+        assert facets["skills"] == [{"value": "Vue", "count": 1}]
+
+        _, _, facets = await search.search()
+        assert {"value": "pending", "count": 1} in facets["status"]
+
+        # Unfiltered counts are cached: add() updates them, a direct insert waits for the TTL
+        added = application(2, START + timedelta(minutes=2), skills=["Python"])
+        await collection.insert_many([dict(added), application(3, START + timedelta(minutes=3))])
+        search.add(added)
+        _, _, facets = await search.search()
+        assert facets["skills"][0] == {"value": "Python", "count": 2}
+        assert {"value": "pending", "count": 2} in facets["status"]
+
+        search._total_facets_expires = 0
+        _, _, facets = await search.search()
+        assert {"value": "pending", "count": 3} in facets["status"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,49 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from mongomock_motor import AsyncMongoMockClient
+
+from pagination import decode_cursor, encode_cursor, fetch_page
+
+
+def test_cursor_round_trips_as_naive_utc():
+    aware = datetime(2026, 1, 2, 13, 0, tzinfo=timezone(timedelta(hours=1)))
+    assert decode_cursor(encode_cursor(aware, "abc")) == (datetime(2026, 1, 2, 12, 0), "abc")
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "e30", encode_cursor(datetime(2026, 1, 1), "x")[:-4]])
+def test_malformed_cursors_are_a_bad_request(cursor):
+    with pytest.raises(HTTPException) as raised:
+        decode_cursor(cursor)
+    assert raised.value.status_code == 400
+
+
+def test_pages_cover_every_row_once_across_timestamp_ties():
+    async def scenario():
+        collection = AsyncMongoMockClient()["test"].rows
+        base = datetime(2026, 1, 1)
+        # Pairs of rows share a timestamp, so pages must break ties on id
+        await collection.insert_many([
+            {"id": f"row-{i:02d}", "timestamp": base + timedelta(minutes=i // 2)} for i in range(7)
+        ])
+        seen, cursor = [], None
+        while True:
+            rows, cursor = await fetch_page(collection, "timestamp", 2, cursor)
+            seen += [row["id"] for row in rows]
+            if cursor is None:
+                break
+        assert seen == [f"row-{i:02d}" for i in reversed(range(7))]
+
+    asyncio.run(scenario())
+
+
+def test_last_full_page_has_no_next_cursor():
+    async def scenario():
+        collection = AsyncMongoMockClient()["test"].rows
+        await collection.insert_many([{"id": str(i), "timestamp": datetime(2026, 1, 1, i)} for i in range(2)])
+        rows, cursor = await fetch_page(collection, "timestamp", 2)
+        assert len(rows) == 2 and cursor is None
+
+    asyncio.run(scenario())
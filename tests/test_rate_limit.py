@@ -0,0 +1,91 @@
+import asyncio
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from rate_limit import (
+    ConcurrencyCap, InMemoryRateLimitBackend, Policy, RateLimiter, RateLimitMiddleware, Rule, client_key
+)
+
+
+async def read_body(request: Request):
+    return JSONResponse({"received": len(await request.body())})
+
+
+def make_client(upload_rate=1000.0, upload_burst=1000.0, read_burst=2.0):
+    limiter = RateLimiter(InMemoryRateLimitBackend(), [
+        Policy("upload", rate=upload_rate, burst=upload_burst),
+        Policy("read", rate=0.001, burst=read_burst),
+    ])
+    app = Starlette(routes=[
+        Route("/upload", read_body, methods=["POST"]),
+        Route("/limited", read_body, methods=["POST"]),
+        Route("/read", read_body),
+    ])
+    app.add_middleware(RateLimitMiddleware, limiter=limiter, cap=ConcurrencyCap(), rules=[
+        Rule("POST", "/limited", "upload", cost="content-length", max_bytes=100),
+        Rule("POST", "/upload", "upload", cost="content-length"),
+        Rule("GET", "/read", "read"),
+    ])
+    return TestClient(app), limiter
+
+
+def test_requests_over_budget_get_429_with_retry_after():
+    client, _ = make_client(read_burst=2)
+    assert [client.get("/read").status_code for _ in range(3)] == [200, 200, 429]
+    assert int(client.get("/read").headers["Retry-After"]) > 0
+
+
+def test_upload_budget_is_charged_in_bytes():
+    client, _ = make_client(upload_rate=0.001, upload_burst=1000)
+    assert client.post("/upload", content=b"x" * 600).status_code == 200
+    assert client.post("/upload", content=b"x" * 600).status_code == 429
+
+
+def test_streamed_bodies_are_charged_as_they_are_read():
+    client, limiter = make_client(upload_rate=0.001, upload_burst=1000)
+
+    def chunks():
+        yield b"x" * 400
+        yield b"x" * 400
+
+    response = client.post("/upload", content=chunks())
+    assert response.status_code == 200 and response.json() == {"received": 800}
+    # 1 up front plus the 800 bytes read, out of 1000
+    wait = asyncio.run(limiter.take("upload", client_key("testclient"), 200))
+    assert wait > 0
+
+
+def test_malformed_content_length_is_a_bad_request():
+    client, _ = make_client()
+    response = client.post("/upload", content=b"abc", headers={"Content-Length": "lots"})
+    assert response.status_code == 400
+
+
+def test_policies_have_separate_buckets():
+    client, _ = make_client(upload_rate=0.001, upload_burst=10, read_burst=1)
+    assert client.post("/upload", content=b"x" * 10).status_code == 200
+    assert client.get("/read").status_code == 200
+
+
+def test_oversized_bodies_are_refused_from_content_length():
+    client, limiter = make_client(upload_rate=0.001, upload_burst=1000)
+    assert client.post("/limited", content=b"x" * 100).status_code == 200
+    assert client.post("/limited", content=b"x" * 101).status_code == 413
+    # Refused before charging: 100 of the 1000 bytes are spent
+    assert asyncio.run(limiter.take("upload", client_key("testclient"), 899)) == 0
+
+
+def test_oversized_streamed_bodies_are_cut_off():
+    client, _ = make_client()
+
+    def chunks():
+        for _ in range(5):
+            yield b"x" * 40
+
+    response = client.post("/limited", content=chunks())
+    assert response.status_code == 413
+    assert "100 bytes" in response.json()["detail"]
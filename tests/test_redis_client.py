@@ -0,0 +1,21 @@
+import asyncio
+
+from chat_broadcast import RedisBroadcastBackend
+from rate_limit import RedisRateLimitBackend
+from redis_client import _clients, close_clients, get_client
+from response_cache import RedisCacheBackend
+
+URL = "redis://localhost:6379/0"
+
+
+def test_backends_share_one_client_per_url():
+    try:
+        broadcast = RedisBroadcastBackend(None, URL)
+        cache = RedisCacheBackend(URL)
+        limiter = RedisRateLimitBackend(URL)
+        limiter._get_script()
+        assert broadcast._get_client() is cache._get_client() is limiter._client is get_client(URL, "TEST")
+        assert get_client("redis://localhost:6379/1", "TEST") is not get_client(URL, "TEST")
+    finally:
+        asyncio.run(close_clients())
+    assert not _clients
@@ -0,0 +1,61 @@
+import asyncio
+
+from fastapi.responses import JSONResponse
+
+from response_cache import InMemoryCacheBackend, ResponseCache
+
+
+def test_hits_until_the_namespace_is_invalidated():
+    async def scenario():
+        cache = ResponseCache(InMemoryCacheBackend(), ttl=60)
+        builds = []
+
+        async def build():
+            builds.append(1)
+            return JSONResponse({"version": len(builds)})
+
+        first = await cache.get("uploads", "page", build)
+        second = await cache.get("uploads", "page", build)
+        assert first.headers["X-Cache"] == "MISS" and second.headers["X-Cache"] == "HIT"
+        assert second.body == first.body and len(builds) == 1
+
+        await cache.invalidate("uploads")
+        third = await cache.get("uploads", "page", build)
+        assert third.headers["X-Cache"] == "MISS" and b'"version":2' in third.body
+        # Other namespaces are untouched
+        await cache.get("status", "page", build)
+        await cache.invalidate("uploads")
+        assert (await cache.get("status", "page", build)).headers["X-Cache"] == "HIT"
+
+    asyncio.run(scenario())
+
+
+def test_errors_are_not_cached():
+    async def scenario():
+        cache = ResponseCache(InMemoryCacheBackend(), ttl=60)
+
+        async def build():
+            return JSONResponse({"detail": "boom"}, status_code=500)
+
+        await cache.get("uploads", "page", build)
+        await cache.get("uploads", "page", build)
+        assert cache.misses == 2 and cache.hits == 0
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_misses_share_one_build():
+    async def scenario():
+        cache = ResponseCache(InMemoryCacheBackend(), ttl=60)
+        builds = []
+
+        async def build():
+            builds.append(1)
+            await asyncio.sleep(0.01)
+            return JSONResponse({"ok": True})
+
+        responses = await asyncio.gather(*(cache.get("uploads", "page", build) for _ in range(5)))
+        assert len(builds) == 1 and cache.coalesced == 4
+        assert all(response.status_code == 200 for response in responses)
+
+    asyncio.run(scenario())
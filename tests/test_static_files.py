@@ -0,0 +1,75 @@
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+
+from static_files import CachedStaticFiles, etag_matches, parse_range
+
+BODY = b"0123456789"
+
+
+@pytest.mark.parametrize("header,expected", [
+    ("bytes=2-5", (2, 5)),
+    ("bytes=-4", (6, 9)),
+    ("bytes=-400", (0, 9)),
+    ("bytes=7-", (7, 9)),
+    ("bytes=5-400", (5, 9)),
+    ("bytes=0-1,4-5", None),
+    ("bytes=5-2", None),
+    ("lines=0-1", None),
+    ("bytes=a-b", None),
+    ("bytes=10-", (10, 10)),
+    ("bytes=-0", (10, 10)),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, len(BODY)) == expected
+
+
+@pytest.mark.parametrize("header,matches", [
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"x", W/"abc"', True),
+    ("*", True),
+    ('"x"', False),
+    ('W/"abcd"', False),
+])
+def test_etag_matches(header, matches):
+    assert etag_matches(header, '"abc"') is matches
+
+
+@pytest.fixture
+def client(tmp_path):
+    (tmp_path / "cv.txt").write_bytes(BODY)
+    (tmp_path / f"{'a' * 64}.jpeg").write_bytes(BODY)
+    app = Starlette(routes=[Mount("/files", CachedStaticFiles(directory=str(tmp_path)))])
+    return TestClient(app)
+
+
+def test_full_then_not_modified(client):
+    response = client.get("/files/cv.txt")
+    assert response.status_code == 200 and response.content == BODY
+    assert "must-revalidate" in response.headers["cache-control"]
+    etag = response.headers["etag"]
+    assert client.get("/files/cv.txt", headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+    assert client.get("/files/cv.txt", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_content_addressed_names_are_immutable(client):
+    response = client.get(f"/files/{'a' * 64}.jpeg")
+    assert response.headers["etag"] == f'"{"a" * 64}"' and "immutable" in response.headers["cache-control"]
+
+
+def test_partial_and_unsatisfiable_ranges(client):
+    response = client.get("/files/cv.txt", headers={"Range": "bytes=2-5"})
+    assert response.status_code == 206 and response.content == b"2345"
+    assert response.headers["content-range"] == "bytes 2-5/10"
+    response = client.get("/files/cv.txt", headers={"Range": "bytes=40-"})
+    assert response.status_code == 416 and response.headers["content-range"] == "bytes */10"
+
+
+def test_if_range_with_a_stale_etag_sends_the_whole_file(client):
+    etag = client.get("/files/cv.txt").headers["etag"]
+    response = client.get("/files/cv.txt", headers={"Range": "bytes=2-5", "If-Range": '"stale"'})
+    assert response.status_code == 200 and response.content == BODY
+    response = client.get("/files/cv.txt", headers={"Range": "bytes=2-5", "If-Range": etag})
+    assert response.status_code == 206 and response.content == b"2345"
@@ -0,0 +1,56 @@
+import asyncio
+import hashlib
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from starlette.testclient import TestClient
+
+import server
+from blob_store import BlobStore
+
+
+@pytest.fixture
+def database(monkeypatch, tmp_path):
+    database = AsyncMongoMockClient()["test"]
+    monkeypatch.setattr(server, "db", None)
+    monkeypatch.setattr(server, "incoming_dir", tmp_path)
+    monkeypatch.setattr(server, "cv_blobs", BlobStore(None, tmp_path, kind="cv"))
+    monkeypatch.setattr(server, "image_blobs", BlobStore(None, tmp_path, kind="image"))
+    server.bind_database(database)
+    return database
+
+
+def test_failed_cv_insert_releases_the_blob(database, tmp_path):
+    content = b"resume"
+    sha256 = hashlib.sha256(content).hexdigest()
+
+    async def prepare():
+        # A unique index the insert trips over, standing in for any insert failure
+        await database.uploaded_files.create_index("sha256", unique=True)
+        await database.uploaded_files.insert_one({"id": "other", "sha256": sha256})
+    asyncio.run(prepare())
+
+    client = TestClient(server.app, raise_server_exceptions=False)
+    response = client.post("/api/upload/cv", files={"file": ("cv.txt", content, "text/plain")})
+    assert response.status_code == 500
+
+    blob = asyncio.run(database.blobs.find_one({"_id": f"cv:{sha256}"}))
+    assert blob is None
+    assert not (tmp_path / f"{sha256}.txt").exists()
+
+
+def test_recording_an_image_twice_keeps_one_reference(database, tmp_path):
+    async def scenario():
+        (tmp_path / "a.part").write_bytes(b"jpeg")
+        sha256 = hashlib.sha256(b"jpeg").hexdigest()
+        image = {"id": "img-1", "original_name": "a.png", "uploaded_by": "anonymous"}
+        blob = await server.image_blobs.adopt(tmp_path / "a.part", sha256, "jpeg", "image/jpeg")
+        await server.record_uploaded_image(image, sha256, blob)
+        # A retried job acquires again before finding the upload already recorded
+        blob = await server.image_blobs.acquire_existing(sha256)
+        await server.record_uploaded_image(image, sha256, blob)
+
+        assert await database.uploaded_images.count_documents({}) == 1
+        assert (await database.blobs.find_one({"_id": f"image:{sha256}"}))["refcount"] == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,47 @@
+import asyncio
+import os
+
+import pytest
+
+from image_pipeline import snap_width
+from worker_pool import PoolRestarted, PoolSaturated, WorkerPool
+
+
+def test_jobs_are_timed_under_the_pool_name():
+    timings = []
+    pool = WorkerPool("thumbs", max_workers=1, max_queue=0, on_timing=lambda *args: timings.append(args[:2]))
+
+    async def scenario():
+        try:
+            assert await pool.run(snap_width, 500) == 640
+        finally:
+            pool.shutdown()
+
+    asyncio.run(scenario())
+    assert timings == [("thumbs", "snap_width")]
+    assert pool.stats()["name"] == "thumbs" and pool.stats()["completed"] == 1
+
+
+def test_a_full_pool_names_itself_when_saturated():
+    pool = WorkerPool("cv-text", max_workers=1, max_queue=0)
+    pool.in_flight = 1
+    with pytest.raises(PoolSaturated, match="cv-text pool is saturated") as raised:
+        asyncio.run(pool.run(snap_width, 500))
+    assert raised.value.pool == "cv-text" and pool.rejected == 1
+
+
+def test_a_dead_worker_is_replaced_on_the_next_run():
+    pool = WorkerPool("image", max_workers=1, max_queue=0)
+
+    async def scenario():
+        try:
+            # As if the OOM killer took the worker mid-decode
+            with pytest.raises(PoolRestarted) as raised:
+                await pool.run(os._exit, 1)
+            assert raised.value.retry_after >= 1
+            assert await pool.run(snap_width, 500) == 640
+        finally:
+            pool.shutdown()
+
+    asyncio.run(scenario())
+    assert pool.stats()["restarts"] == 1 and pool.failed == 1 and pool.completed == 1
@@ -0,0 +1,77 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from write_behind import DUPLICATE_KEY, WriteBehindBuffer
+
+
+class FlakyCollection:
+    """Loses the connection after writing part of the first batch, as a failover can"""
+
+    name = "chat_messages"
+
+    def __init__(self):
+        self.calls = []
+        self.stored = {}
+        self.rejected_once = {"m3"}
+
+    async def insert_many(self, documents, ordered=True):
+        self.calls.append([document["id"] for document in documents])
+        if len(self.calls) == 1:
+            for document in documents[:2]:
+                self.stored[document["id"]] = document
+            raise AutoReconnect("connection reset")
+        errors = []
+        for index, document in enumerate(documents):
+            if document["id"] in self.stored:
+                errors.append({"index": index, "code": DUPLICATE_KEY, "errmsg": "duplicate key"})
+            elif document["id"] in self.rejected_once:
+                self.rejected_once.discard(document["id"])
+                errors.append({"index": index, "code": 91, "errmsg": "shutdown in progress"})
+            else:
+                self.stored[document["id"]] = document
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+
+def docs(count):
+    return [{"id": f"m{n}"} for n in range(count)]
+
+
+def test_retries_skip_documents_an_earlier_attempt_wrote():
+    async def scenario():
+        collection = FlakyCollection()
+        buffer = WriteBehindBuffer(collection)
+        for document in docs(4):
+            buffer.add(document)
+        assert await buffer.flush()
+        # Retry 1 resends everything; m0 and m1 come back as duplicates. Retry 2 is only m3.
+        assert collection.calls == [["m0", "m1", "m2", "m3"], ["m0", "m1", "m2", "m3"], ["m3"]]
+        assert sorted(collection.stored) == ["m0", "m1", "m2", "m3"]
+        assert buffer.written == 4 and buffer.dropped == 0 and len(buffer) == 0
+
+    asyncio.run(scenario())
+
+
+def test_the_oldest_documents_are_dropped_past_max_buffer():
+    buffer = WriteBehindBuffer(FlakyCollection(), max_buffer=3)
+    for document in docs(5):
+        buffer.add(document)
+    assert len(buffer) == 3 and buffer.dropped == 2
+    assert [document["id"] for document in buffer._buffer] == ["m2", "m3", "m4"]
+
+
+def test_close_writes_out_what_is_still_buffered():
+    async def scenario():
+        collection = AsyncMongoMockClient()["test"].chat_messages
+        buffer = WriteBehindBuffer(collection, max_batch=2, flush_interval=60)
+        await buffer.start()
+        buffer.add(docs(1)[0])
+        await buffer.close()
+        for document in docs(5)[1:]:
+            buffer.add(document)
+        await buffer.close()
+        assert await collection.count_documents({}) == 5 and buffer.written == 5 and len(buffer) == 0
+
+    asyncio.run(scenario())